@@ -12,16 +12,16 @@ logger = logging.getLogger("security_agents")
 
 # 导入工具函数
 from tools.security_tools import (
-    get_process_details, get_services, get_windows_logs,
-    compare_with_baseline, terminate_process, block_ip,
-    add_to_whitelist, check_whitelist, add_suggestion_note,
+    get_process_details, get_services, get_windows_logs, read_new_log_events,
+    compare_with_baseline, build_process_tree, terminate_process, block_ip,
+    add_to_whitelist, check_whitelist, check_whitelist_batch, add_suggestion_note,
     get_suggestion_notes, log_agent_report, load_process_history,
     load_log_history, load_service_history, load_network_history,
-    load_all_department_history, save_process_analysis, save_log_analysis,
+    load_all_department_history, query_department_history, save_process_analysis, save_log_analysis,
     save_service_analysis, save_network_analysis, filter_processes_by_time,
     filter_logs_by_time, filter_services_by_time, filter_connections_by_time,
     get_network_connections, analyze_network_traffic, detect_suspicious_connections,
-    analyze_service_security, check_service_integrity
+    lookup_threat_indicators, match_detection_rules, analyze_service_security, check_service_integrity
 )
 
 def create_tools():
@@ -31,11 +31,14 @@ def create_tools():
         "GetProcessDetails": get_process_details,
         "GetServices": get_services,
         "GetWindowsLogs": get_windows_logs,
+        "ReadNewLogEvents": read_new_log_events,
         "CompareWithBaseline": compare_with_baseline,
+        "BuildProcessTree": build_process_tree,
         "TerminateProcess": terminate_process,
         "BlockIP": block_ip,
         "AddToWhitelist": add_to_whitelist,
         "CheckWhitelist": check_whitelist,
+        "CheckWhitelistBatch": check_whitelist_batch,
         "AddSuggestionNote": add_suggestion_note,
         "GetSuggestionNotes": get_suggestion_notes,
         "LogAgentReport": log_agent_report,
@@ -46,6 +49,7 @@ def create_tools():
         "LoadServiceHistory": load_service_history,
         "LoadNetworkHistory": load_network_history,
         "LoadAllDepartmentHistory": load_all_department_history,
+        "QueryDepartmentHistory": query_department_history,
         "SaveProcessAnalysis": save_process_analysis,
         "SaveLogAnalysis": save_log_analysis,
         "SaveServiceAnalysis": save_service_analysis,
@@ -61,6 +65,8 @@ def create_tools():
         "GetNetworkConnections": get_network_connections,
         "AnalyzeNetworkTraffic": analyze_network_traffic,
         "DetectSuspiciousConnections": detect_suspicious_connections,
+        "LookupThreatIndicators": lookup_threat_indicators,
+        "MatchDetectionRules": match_detection_rules,
         
         # 服务分析工具
         "AnalyzeServiceSecurity": analyze_service_security,
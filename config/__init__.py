@@ -46,11 +46,65 @@ except ImportError as e:
     WHITELIST_FILE = os.path.join(JSON_CONFIG_DIR, "whitelist.json")
     BASELINE_PROCESSES_FILE = os.path.join(JSON_CONFIG_DIR, "baseline_processes.json")
     SUGGESTION_NOTES_FILE = os.path.join(JSON_CONFIG_DIR, "suggestion_notes.json")
+    IP_LISTS_FILE = os.path.join(JSON_CONFIG_DIR, "ip_lists.json")
+    DETECTION_RULES_FILE = os.path.join(JSON_CONFIG_DIR, "detection_rules.json")
+    LLM_CACHE_FILE = os.path.join(BASE_DIR, "config", "cache", "llm_cache.sqlite")
+    PROCESS_SNAPSHOT_FILE = os.path.join(BASE_DIR, "config", "cache", "process_snapshot.json")
+    SERVICE_SNAPSHOT_FILE = os.path.join(BASE_DIR, "config", "cache", "service_snapshot.json")
+    TRIAGE_STATE_FILE = os.path.join(BASE_DIR, "config", "cache", "triage_state.json")
+    DEPARTMENT_HISTORY_DIR = os.path.join(BASE_DIR, "data", "department_history")
+    DEPARTMENT_HISTORY_DB = os.path.join(DEPARTMENT_HISTORY_DIR, "history.sqlite")
+    LOG_CURSOR_FILE = os.path.join(BASE_DIR, "config", "cache", "log_cursors.json")
+    THREAT_INTEL_FEED_DIR = os.path.join(BASE_DIR, "data", "threat_intel")
+    THREAT_INTEL_INDEX_FILE = os.path.join(BASE_DIR, "config", "cache", "threat_intel.idx")
     
     # 时间间隔配置（秒）
     MONITORING_INTERVAL = 600  # 10分钟
     ERROR_RETRY_INTERVAL = 60  # 1分钟
     DECISION_TIMEOUT = 300  # 5分钟
+    THREAT_INTEL_CHECK_INTERVAL = 30  # 威胁情报源文件变化的检查间隔
+    
+    # 并发配置
+    WORKFLOW_MAX_WORKERS = 4
+    PARALLEL_DEPARTMENTS = True
+    DEPARTMENT_MAX_WORKERS = 4
+    
+    # LLM响应缓存配置
+    LLM_CACHE_ENABLED = True
+    LLM_CACHE_TTL = 3600
+    LLM_CACHE_MAX_ENTRIES = 2000
+    
+    # 预分诊配置
+    PRE_TRIAGE_ENABLED = True
+    PRE_TRIAGE_MAX_AGE = 86400
+    
+    # 基线比较配置
+    BASELINE_REPORT_MAX_ITEMS = 50
+    BASELINE_REPORT_MAX_PIDS = 5
+    BASELINE_REPORT_MAX_CMDLINE = 200
+    
+    # 部门历史配置
+    DEPARTMENT_HISTORY_MAX_RECORDS = 1000
+    DEPARTMENT_HISTORY_SEGMENT_SIZE = 100
+    DEPARTMENT_HISTORY_PAGE_SIZE = 100
+    HISTORY_SUMMARY_ITEMS = 3
+    HISTORY_SUMMARY_CONTENT_CHARS = 500
+    
+    # 系统数据收集器配置
+    COLLECTOR_BACKEND = "auto"
+    FAST_PROC_SCANNER = True
+    
+    # 增量日志读取配置
+    LOG_INGEST_SOURCES = [
+        {"name": "syslog", "path": "/var/log/syslog", "format": "syslog"},
+        {"name": "messages", "path": "/var/log/messages", "format": "syslog"},
+        {"name": "auth", "path": "/var/log/auth.log", "format": "syslog"},
+        {"name": "secure", "path": "/var/log/secure", "format": "syslog"},
+    ]
+    LOG_INGEST_MAX_EVENTS = 200
+    
+    # 工具输出编码配置
+    TOOL_OUTPUT_SETTINGS = {}
     
     # 默认模型类型
     DEFAULT_MODEL_TYPE = "deepseek-chat"
\ No newline at end of file
@@ -7,6 +7,7 @@ import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 JSON_CONFIG_DIR = os.path.join(BASE_DIR, "config", "json")
 LOG_CONFIG_DIR = os.path.join(BASE_DIR, "config", "log")
+CACHE_CONFIG_DIR = os.path.join(BASE_DIR, "config", "cache")
 
 # 确保配置目录存在
 os.makedirs(JSON_CONFIG_DIR, exist_ok=True)
@@ -15,6 +16,17 @@ os.makedirs(LOG_CONFIG_DIR, exist_ok=True)
 # 配置文件路径
 WHITELIST_FILE = os.path.join(JSON_CONFIG_DIR, "whitelist.json")
 BASELINE_PROCESSES_FILE = os.path.join(JSON_CONFIG_DIR, "baseline_processes.json")
+IP_LISTS_FILE = os.path.join(JSON_CONFIG_DIR, "ip_lists.json")  # 网络分析的 CIDR 允许/拒绝列表
+DETECTION_RULES_FILE = os.path.join(JSON_CONFIG_DIR, "detection_rules.json")  # 进程/服务/连接的检测规则
+LLM_CACHE_FILE = os.path.join(CACHE_CONFIG_DIR, "llm_cache.sqlite")
+PROCESS_SNAPSHOT_FILE = os.path.join(CACHE_CONFIG_DIR, "process_snapshot.json")
+SERVICE_SNAPSHOT_FILE = os.path.join(CACHE_CONFIG_DIR, "service_snapshot.json")
+TRIAGE_STATE_FILE = os.path.join(CACHE_CONFIG_DIR, "triage_state.json")
+DEPARTMENT_HISTORY_DIR = os.path.join(BASE_DIR, "data", "department_history")
+DEPARTMENT_HISTORY_DB = os.path.join(DEPARTMENT_HISTORY_DIR, "history.sqlite")
+LOG_CURSOR_FILE = os.path.join(CACHE_CONFIG_DIR, "log_cursors.json")
+THREAT_INTEL_FEED_DIR = os.path.join(BASE_DIR, "data", "threat_intel")  # 离线威胁情报源（*.csv / STIX-lite *.json）
+THREAT_INTEL_INDEX_FILE = os.path.join(CACHE_CONFIG_DIR, "threat_intel.idx")
 
 # API密钥配置
 OPENAI_API_KEY = "NULL"
@@ -25,6 +37,53 @@ DEEPSEEK_API_BASE = "https://api.deepseek.com/v1"
 MONITORING_INTERVAL = 600  # 10分钟
 ERROR_RETRY_INTERVAL = 60  # 1分钟
 DECISION_TIMEOUT = 300  # 5分钟
+THREAT_INTEL_CHECK_INTERVAL = 30  # 威胁情报源文件变化的检查间隔
+
+# 并发配置
+WORKFLOW_MAX_WORKERS = 4  # 工作流依赖图中可同时执行的模块数
+PARALLEL_DEPARTMENTS = True  # 进程/日志/服务/网络部门是否并发执行
+DEPARTMENT_MAX_WORKERS = 4  # 部门并发执行的线程数
+
+# LLM响应缓存配置（秘书执行前/执行后报告）
+LLM_CACHE_ENABLED = True
+LLM_CACHE_TTL = 3600  # 1小时
+LLM_CACHE_MAX_ENTRIES = 2000
+
+# 预分诊配置：部门数据与上一次已分析的数据相同时，跳过分析员和秘书报告，沿用上一次的分析结果
+PRE_TRIAGE_ENABLED = True
+PRE_TRIAGE_MAX_AGE = 86400  # 分析结果最长沿用1天，超过后重新分析（0表示不限）
+
+# 基线比较配置
+BASELINE_REPORT_MAX_ITEMS = 50  # CompareWithBaseline 报告中每一类最多列出的进程名数量
+BASELINE_REPORT_MAX_PIDS = 5  # 报告中每个进程名最多列出的PID数量
+BASELINE_REPORT_MAX_CMDLINE = 200  # 命令行在报告中的最大长度
+
+# 部门历史配置
+DEPARTMENT_HISTORY_MAX_RECORDS = 1000  # 每个部门保留的历史记录数
+DEPARTMENT_HISTORY_SEGMENT_SIZE = 100  # 每个分段文件的记录数，旧记录按整段删除
+DEPARTMENT_HISTORY_PAGE_SIZE = 100  # Load*History 工具默认每页返回的记录数
+HISTORY_SUMMARY_ITEMS = 3  # LoadAllDepartmentHistory 摘要中每个部门的最近记录数
+HISTORY_SUMMARY_CONTENT_CHARS = 500  # LoadAllDepartmentHistory 摘要中单条内容的最大长度
+
+# 系统数据收集器: "auto"（按当前系统选择）、"windows"（调用 sc/netstat/PowerShell 等命令）、
+# "linux"（psutil、/proc、systemd 文件和 journal，不启动子进程）
+COLLECTOR_BACKEND = "auto"
+FAST_PROC_SCANNER = True  # Linux 上直接扫描 /proc 获取进程（比 psutil 逐进程查询快），关闭时使用 psutil
+
+# 增量日志读取来源（按游标只读取新增条目）
+# format 可选 "syslog"（syslog文本）、"journal"（journalctl -o json 导出）、"evtx_json"（Windows事件日志JSON导出）
+LOG_INGEST_SOURCES = [
+    {"name": "syslog", "path": "/var/log/syslog", "format": "syslog"},
+    {"name": "messages", "path": "/var/log/messages", "format": "syslog"},
+    {"name": "auth", "path": "/var/log/auth.log", "format": "syslog"},
+    {"name": "secure", "path": "/var/log/secure", "format": "syslog"},
+]
+LOG_INGEST_MAX_EVENTS = 200  # ReadNewLogEvents 默认最多返回的事件数
+
+# 工具输出编码配置（按工具名启用，未配置的工具保持缩进JSON输出）
+# format 可选 "json"/"compact"/"columnar"/"csv"；token_budget > 0 时按预算截断并标注省略行数
+# 例如: {"GetProcessDetails": {"format": "csv", "token_budget": 4000}}
+TOOL_OUTPUT_SETTINGS = {}
 
 # 默认模型类型
 DEFAULT_MODEL_TYPE = "deepseek-chat"  # 可选: "openai", "deepseek-chat", "deepseek-reasoner", "openai-4o"
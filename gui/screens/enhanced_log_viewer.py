@@ -12,6 +12,11 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from tools.log_storage import INDEX_SUFFIX, IndexedLogStore, iter_log_records
+
+# 结构化日志文件的扩展名（旧的 .json 数组文件、.jsonl 追加文件和指向主段的 .idx 索引文件）
+LOG_FILE_SUFFIXES = (".json", ".jsonl", INDEX_SUFFIX)
+
 class EnhancedLogViewer(ttk.Frame):
     """
     增强日志查看器
@@ -25,6 +30,7 @@ class EnhancedLogViewer(ttk.Frame):
         # 初始化日志目录
         self.base_log_dir = self._get_log_directory()
         self.enhanced_log_dir = self.base_log_dir / "enhanced"
+        self.indexed_store = IndexedLogStore(self.enhanced_log_dir)
         
         # 创建界面
         self._create_widgets()
@@ -199,6 +205,28 @@ class EnhancedLogViewer(ttk.Frame):
         except Exception as e:
             messagebox.showerror("错误", f"加载初始数据失败: {str(e)}")
     
+    def _iter_log_files(self, path: Path, date: str = None):
+        """
+        遍历目录下的结构化日志文件（.json、.jsonl，以及角色组/角色/类型视图的 .idx 偏移索引文件）
+        主段文件（segments/<日期>.jsonl）只通过索引文件读取，不单独返回，避免记录重复
+        
+        Args:
+            path: 搜索目录
+            date: 只返回文件名以该日期结尾的文件
+        """
+        segment_dir = self.indexed_store.segment_dir.resolve()
+        for suffix in LOG_FILE_SUFFIXES:
+            pattern = f"*{date}{suffix}" if date else f"*{suffix}"
+            for log_file in path.rglob(pattern):
+                if log_file.is_file() and segment_dir not in log_file.resolve().parents:
+                    yield log_file
+    
+    def _iter_file_records(self, log_file: Path):
+        """读取日志文件中的记录，索引文件通过主段解析"""
+        if log_file.suffix == INDEX_SUFFIX:
+            return self.indexed_store.iter_index_file(log_file)
+        return iter_log_records(log_file)
+    
     def _load_groups(self):
         """
         加载角色组列表
@@ -224,9 +252,9 @@ class EnhancedLogViewer(ttk.Frame):
         
         # 从增强日志中获取日期
         if self.enhanced_log_dir.exists():
-            for log_file in self.enhanced_log_dir.rglob("*.json"):
+            for log_file in self._iter_log_files(self.enhanced_log_dir):
                 # 从文件名中提取日期
-                filename = log_file.name
+                filename = log_file.stem
                 if "_" in filename:
                     parts = filename.split("_")
                     for part in parts:
@@ -277,14 +305,12 @@ class EnhancedLogViewer(ttk.Frame):
             group_dir = self.enhanced_log_dir / "groups" / group_id
             if group_dir.exists():
                 # 从日志文件中提取角色信息
-                for log_file in group_dir.rglob("*.json"):
+                for log_file in self._iter_log_files(group_dir):
                     try:
-                        with open(log_file, 'r', encoding='utf-8') as f:
-                            records = json.load(f)
-                            for record in records:
-                                role_name = record.get('role_name')
-                                if role_name and role_name not in roles:
-                                    roles.append(role_name)
+                        for record in self._iter_file_records(log_file):
+                            role_name = record.get('role_name')
+                            if role_name and role_name not in roles:
+                                roles.append(role_name)
                     except Exception:
                         continue
         
@@ -399,29 +425,21 @@ class EnhancedLogViewer(ttk.Frame):
         
         try:
             # 查找匹配的日志文件
-            pattern = f"*{date}.json" if date else "*.json"
-            
-            for log_file in path.rglob(pattern):
-                if not log_file.is_file():
-                    continue
-                
+            for log_file in self._iter_log_files(path, date):
                 try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        records = json.load(f)
+                    for record in self._iter_file_records(log_file):
+                        # 应用筛选条件
+                        if not self._match_filters(record, role_name, log_type, search_text):
+                            continue
+                        
+                        # 添加显示信息
+                        display_record = record.copy()
+                        display_record['display_type'] = self._get_display_type(record)
+                        display_record['summary'] = self._get_summary(record)
+                        display_record['record_type'] = record.get('report_type', record.get('operation_type', 'unknown'))
+                        
+                        logs.append(display_record)
                         
-                        for record in records:
-                            # 应用筛选条件
-                            if not self._match_filters(record, role_name, log_type, search_text):
-                                continue
-                            
-                            # 添加显示信息
-                            display_record = record.copy()
-                            display_record['display_type'] = self._get_display_type(record)
-                            display_record['summary'] = self._get_summary(record)
-                            display_record['record_type'] = record.get('report_type', record.get('operation_type', 'unknown'))
-                            
-                            logs.append(display_record)
-                            
                 except Exception as e:
                     print(f"读取日志文件失败 {log_file}: {e}")
                     continue
@@ -523,16 +541,14 @@ class EnhancedLogViewer(ttk.Frame):
             # 搜索所有可能的日志文件
             search_paths = []
             if self.enhanced_log_dir.exists():
-                search_paths.extend(self.enhanced_log_dir.rglob(f"*{date}.json"))
+                search_paths.extend(self._iter_log_files(self.enhanced_log_dir, date))
             
             for log_file in search_paths:
                 try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        records = json.load(f)
-                        for record in records:
-                            if (record.get('timestamp') == timestamp and 
-                                record.get('role_name') == role_name):
-                                return record
+                    for record in self._iter_file_records(log_file):
+                        if (record.get('timestamp') == timestamp and 
+                            record.get('role_name') == role_name):
+                            return record
                 except Exception:
                     continue
         
@@ -11,7 +11,9 @@ import sys
 import json
 import time
 import logging
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional, Callable
 
 # 确保当前目录在路径中
@@ -23,7 +25,7 @@ if current_dir not in sys.path:
 try:
     from config.constants import (
         DEFAULT_MODEL_TYPE, DECISION_TIMEOUT, ERROR_RETRY_INTERVAL,
-        MONITORING_INTERVAL
+        MONITORING_INTERVAL, PARALLEL_DEPARTMENTS, DEPARTMENT_MAX_WORKERS, PRE_TRIAGE_ENABLED
     )
 except ImportError as e:
     # 设置默认值
@@ -31,12 +33,18 @@ except ImportError as e:
     DECISION_TIMEOUT = 300
     ERROR_RETRY_INTERVAL = 60
     MONITORING_INTERVAL = 600
+    PARALLEL_DEPARTMENTS = True
+    DEPARTMENT_MAX_WORKERS = 4
+    PRE_TRIAGE_ENABLED = True
     logging.warning(f"无法导入配置常量，使用默认值: {str(e)}")
 
 # 导入其他模块
 from models import setup_llm
 from agents.security_agents import create_agents
 from agents.tasks import create_tasks
+from tools.llm_cache import llm_cache
+from tools.pre_triage import pre_triage
+from tools.service_snapshot import service_tracker
 
 # 设置日志
 logger = logging.getLogger("main")
@@ -83,7 +91,9 @@ try:
         MONITORING_INTERVAL, 
         ERROR_RETRY_INTERVAL, 
         DEFAULT_MODEL_TYPE,
-        DECISION_TIMEOUT
+        DECISION_TIMEOUT,
+        PARALLEL_DEPARTMENTS,
+        DEPARTMENT_MAX_WORKERS
     )
 except ImportError as e:
     # 如果导入失败，定义默认值
@@ -92,6 +102,8 @@ except ImportError as e:
     ERROR_RETRY_INTERVAL = 60  # 1分钟
     DEFAULT_MODEL_TYPE = "deepseek-chat"
     DECISION_TIMEOUT = 300  # 5分钟
+    PARALLEL_DEPARTMENTS = True  # 四个部门并发执行
+    DEPARTMENT_MAX_WORKERS = 4
 
 # 其他导入
 from models import setup_llm
@@ -255,8 +267,36 @@ def process_decision(decision, llm, secretary_agent, last_report, stage="执行
         
         return {"approved": True, "report": last_report, "auto_approved": True}
 
-def execute_agent_with_approval(agent, task_description, llm, secretary_agent, previous_report=None, raw_data=None, get_decision_func=None):
-    """执行单个Agent的任务，包含执行前和执行后的审批流程"""
+def invoke_llm(llm, prompt):
+    """直接调用LLM并返回文本内容"""
+    try:
+        # 尝试使用 HumanMessage
+        messages = [HumanMessage(content=prompt)]
+        return llm.invoke(messages).content
+    except (NameError, AttributeError):
+        # 如果 HumanMessage 不可用，尝试直接使用字典
+        try:
+            messages = [{"role": "user", "content": prompt}]
+            return llm.invoke(messages).content
+        except:
+            # 最后的备选方案
+            return llm(prompt)
+
+def invoke_llm_cached(llm, prompt, use_cache=True):
+    """
+    调用LLM生成秘书报告，相同模型、温度和提示词的响应从本地缓存返回
+    
+    Args:
+        use_cache: 为False时跳过缓存读取，直接调用LLM并刷新缓存
+    """
+    return llm_cache.get_or_call(llm, prompt, lambda text: invoke_llm(llm, text), bypass=not use_cache)
+
+def execute_agent_with_approval(agent, task_description, llm, secretary_agent, previous_report=None, raw_data=None, get_decision_func=None, use_cache=True):
+    """
+    执行单个Agent的任务，包含执行前和执行后的审批流程
+    
+    执行前/执行后报告通过LLM响应缓存生成，use_cache=False 时强制重新生成
+    """
     # 这个函数基本保持不变，因为它是核心执行逻辑
     # 如果没有提供自定义的get_user_decision函数，则使用默认的
     if get_decision_func is None:
@@ -337,18 +377,7 @@ def execute_agent_with_approval(agent, task_description, llm, secretary_agent, p
     """
     
     # 修改这里：直接使用llm而不是secretary_agent.llm
-    try:
-        # 尝试使用 HumanMessage
-        messages = [HumanMessage(content=pre_execution_prompt)]
-        pre_report = llm.invoke(messages).content
-    except (NameError, AttributeError):
-        # 如果 HumanMessage 不可用，尝试直接使用字典
-        try:
-            messages = [{"role": "user", "content": pre_execution_prompt}]
-            pre_report = llm.invoke(messages).content
-        except:
-            # 最后的备选方案
-            pre_report = llm(pre_execution_prompt)
+    pre_report = invoke_llm_cached(llm, pre_execution_prompt, use_cache)
     
     # 2. 获取执行前的审批
     pre_decision = get_decision_func(pre_report, "执行前", agent_name)
@@ -443,8 +472,7 @@ def execute_agent_with_approval(agent, task_description, llm, secretary_agent, p
     """
     
     # 修改这里：直接使用llm
-    messages = [HumanMessage(content=post_execution_prompt)]
-    post_report = llm.invoke(messages).content
+    post_report = invoke_llm_cached(llm, post_execution_prompt, use_cache)
     
     # 5. 获取执行后的审批
     post_decision = get_decision_func(post_report, "执行后", agent_name)
@@ -499,120 +527,198 @@ def main(group_name="default_group"):
         logger.error(f"未知的角色组: {group_name}")
         return
 
+# 部门流水线配置：数据收集 -> 安全分析，各部门之间互不依赖
+DEPARTMENT_PIPELINES = [
+    {
+        "key": "process",
+        "name": "进程部门",
+        "collector": "process_data_collector",
+        "collect_task": "收集系统进程信息，并根据历史记录过滤已分析的进程",
+        "analyst": "process_security_analyst",
+        "analysis_task": "分析进程安全状况，识别可疑进程和威胁",
+    },
+    {
+        "key": "log",
+        "name": "日志部门",
+        "collector": "log_data_collector",
+        "collect_task": "收集系统日志信息，并根据历史记录过滤已分析的日志",
+        "analyst": "log_security_analyst",
+        "analysis_task": "分析日志安全状况，识别异常事件和威胁",
+    },
+    {
+        "key": "service",
+        "name": "服务部门",
+        "collector": "service_data_collector",
+        "collect_task": "收集系统服务变化（GetServices 使用 delta 模式，只返回新增、删除和属性变化的服务），并根据历史记录过滤已分析的服务",
+        "analyst": "service_security_analyst",
+        "analysis_task": "分析服务安全状况，识别异常服务和威胁",
+        # 分析完成后才推进 delta 的比较基准，分析未完成时下一轮仍报告这些变化
+        "on_analyzed": service_tracker.commit,
+    },
+    {
+        "key": "network",
+        "name": "网络部门",
+        "collector": "network_data_collector",
+        "collect_task": "收集网络连接信息，并根据历史记录过滤已分析的连接",
+        "analyst": "network_security_analyst",
+        "analysis_task": "分析网络安全状况，识别可疑连接和威胁",
+    },
+]
+
+# 并发执行的部门共用一个决策入口，审批需要逐个进行
+_decision_lock = threading.Lock()
+
+def serialized_decision_func(get_decision_func=None):
+    """包装决策函数，保证并发执行时同一时间只有一个审批请求"""
+    if get_decision_func is None:
+        get_decision_func = get_user_decision
+    
+    def decision_func(report, stage, agent_name):
+        with _decision_lock:
+            return get_decision_func(report, stage, agent_name)
+    
+    return decision_func
+
+def _department_pipeline(key):
+    for pipeline in DEPARTMENT_PIPELINES:
+        if pipeline["key"] == key:
+            return pipeline
+    return None
+
+def triage_department(key, collected):
+    """
+    预分诊：部门数据与上一次已分析的数据相同时沿用上一次的分析结果
+    
+    参数:
+        key: 部门key（process/log/service/network）
+        collected: 数据收集员的输出
+    
+    返回:
+        (digest, analysis_result)，analysis_result 不为None时不需要再调用分析员（已调用部门的 on_analyzed 回调）；
+        未启用预分诊时 digest 为None
+    """
+    if not PRE_TRIAGE_ENABLED:
+        return None, None
+    digest = pre_triage.digest(key, collected)
+    cached = pre_triage.cached(key, digest)
+    if cached is None:
+        return digest, None
+    analyzed_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(cached["analyzed_at"]))
+    logger.info(f"{key} 部门数据与上一次分析时相同，沿用 {analyzed_at} 的分析结果")
+    pipeline = _department_pipeline(key)
+    if pipeline and pipeline.get("on_analyzed"):
+        pipeline["on_analyzed"]()
+    return digest, {
+        "status": "completed",
+        "result": f"（数据与 {analyzed_at} 分析时相同，未重新分析）\n{cached['result']}",
+        "triaged": True,
+    }
+
+def record_department_analysis(key, digest, analysis_result):
+    """部门分析完成后记录预分诊摘要，并调用部门的 on_analyzed 回调"""
+    if analysis_result["status"] != "completed":
+        return
+    if digest is not None:
+        pre_triage.record(key, digest, analysis_result["result"])
+    pipeline = _department_pipeline(key)
+    if pipeline and pipeline.get("on_analyzed"):
+        pipeline["on_analyzed"]()
+
+def run_department_pipeline(pipeline, agents, llm_for_direct, secretary_agent, get_decision_func=None):
+    """
+    执行单个部门的数据收集 + 分析流水线
+    
+    返回:
+        {"department": 部门名, "status": 状态, "analysis": 分析结果或None}
+        数据与上一次已分析的数据相同时状态为 "unchanged"，analysis 为沿用的上一次分析结果
+        分析完成（或沿用上一次结果）后调用部门的 on_analyzed 回调
+        任何异常都被限制在本部门内，不影响其他部门
+    """
+    department = pipeline["name"]
+    logger.info(f"=== {department}工作开始 ===")
+    try:
+        # 数据收集
+        data_result = execute_agent_with_approval(
+            agents[pipeline["collector"]], 
+            pipeline["collect_task"], 
+            llm_for_direct, 
+            secretary_agent,
+            get_decision_func=get_decision_func
+        )
+        if data_result["status"] != "completed":
+            logger.warning(f"{department}数据收集任务未获批准，跳过{department}任务")
+            return {"department": department, "status": "skipped", "analysis": None}
+        
+        # 预分诊：数据与上一次已分析的数据相同时，不调用分析员，也不生成秘书报告
+        digest, analysis_result = triage_department(pipeline["key"], data_result["result"])
+        if analysis_result is not None:
+            return {"department": department, "status": "unchanged", "analysis": analysis_result}
+        
+        # 安全分析
+        analysis_result = execute_agent_with_approval(
+            agents[pipeline["analyst"]], 
+            pipeline["analysis_task"], 
+            llm_for_direct,
+            secretary_agent,
+            raw_data=data_result["result"],
+            get_decision_func=get_decision_func
+        )
+        record_department_analysis(pipeline["key"], digest, analysis_result)
+        return {"department": department, "status": analysis_result["status"], "analysis": analysis_result}
+    except Exception as e:
+        logger.error(f"{department}执行过程中发生错误: {str(e)}")
+        logger.error(traceback.format_exc())
+        return {"department": department, "status": "error", "analysis": None, "error": str(e)}
+
+def run_department_pipelines(agents, llm_for_direct, secretary_agent, parallel=None):
+    """
+    执行所有部门的流水线
+    
+    参数:
+        parallel: 是否并发执行，默认使用 PARALLEL_DEPARTMENTS 配置
+    
+    返回:
+        {部门key: 流水线结果}，所有部门完成后才返回
+    """
+    if parallel is None:
+        parallel = PARALLEL_DEPARTMENTS
+    
+    decision_func = serialized_decision_func()
+    
+    def run(pipeline):
+        return run_department_pipeline(pipeline, agents, llm_for_direct, secretary_agent, decision_func)
+    
+    if parallel:
+        with ThreadPoolExecutor(max_workers=DEPARTMENT_MAX_WORKERS, thread_name_prefix="department") as executor:
+            results = list(executor.map(run, DEPARTMENT_PIPELINES))
+    else:
+        results = [run(pipeline) for pipeline in DEPARTMENT_PIPELINES]
+    
+    return {pipeline["key"]: result for pipeline, result in zip(DEPARTMENT_PIPELINES, results)}
+
+def collect_analysis_results(department_results):
+    """按部门顺序汇总已完成的分析结果"""
+    all_analysis_results = ""
+    for pipeline in DEPARTMENT_PIPELINES:
+        result = department_results.get(pipeline["key"], {})
+        analysis = result.get("analysis")
+        if analysis and analysis["status"] == "completed":
+            all_analysis_results += f"{pipeline['name']}分析结果：\n{analysis['result']}\n\n"
+    return all_analysis_results
+
 def run_default_workflow(agents, tasks, llm_for_direct, secretary_agent):
     """运行默认工作流程 - 部门化架构"""
     logger.info("开始安全监控 (部门化工作流程)...")
     while True:
         try:
-            # 1. 进程部门：数据收集 + 分析
-            logger.info("=== 进程部门工作开始 ===")
-            
-            # 1.1 进程数据收集
-            process_data_result = execute_agent_with_approval(
-                agents["process_data_collector"], 
-                "收集系统进程信息，并根据历史记录过滤已分析的进程", 
-                llm_for_direct, 
-                secretary_agent
-            )
-            if process_data_result["status"] != "completed":
-                logger.warning("进程数据收集任务未获批准，跳过进程部门任务")
-                time.sleep(MONITORING_INTERVAL)
-                continue
-            
-            # 1.2 进程安全分析
-            process_analysis_result = execute_agent_with_approval(
-                agents["process_security_analyst"], 
-                "分析进程安全状况，识别可疑进程和威胁", 
-                llm_for_direct,
-                secretary_agent,
-                raw_data=process_data_result["result"]
-            )
-            
-            # 2. 日志部门：数据收集 + 分析
-            logger.info("=== 日志部门工作开始 ===")
-            
-            # 2.1 日志数据收集
-            log_data_result = execute_agent_with_approval(
-                agents["log_data_collector"], 
-                "收集系统日志信息，并根据历史记录过滤已分析的日志", 
-                llm_for_direct, 
-                secretary_agent
-            )
-            if log_data_result["status"] != "completed":
-                logger.warning("日志数据收集任务未获批准，跳过日志部门任务")
-                time.sleep(MONITORING_INTERVAL)
-                continue
-            
-            # 2.2 日志安全分析
-            log_analysis_result = execute_agent_with_approval(
-                agents["log_security_analyst"], 
-                "分析日志安全状况，识别异常事件和威胁", 
-                llm_for_direct,
-                secretary_agent,
-                raw_data=log_data_result["result"]
-            )
-            
-            # 3. 服务部门：数据收集 + 分析
-            logger.info("=== 服务部门工作开始 ===")
-            
-            # 3.1 服务数据收集
-            service_data_result = execute_agent_with_approval(
-                agents["service_data_collector"], 
-                "收集系统服务信息，并根据历史记录过滤已分析的服务", 
-                llm_for_direct, 
-                secretary_agent
-            )
-            if service_data_result["status"] != "completed":
-                logger.warning("服务数据收集任务未获批准，跳过服务部门任务")
-                time.sleep(MONITORING_INTERVAL)
-                continue
-            
-            # 3.2 服务安全分析
-            service_analysis_result = execute_agent_with_approval(
-                agents["service_security_analyst"], 
-                "分析服务安全状况，识别异常服务和威胁", 
-                llm_for_direct,
-                secretary_agent,
-                raw_data=service_data_result["result"]
-            )
-            
-            # 4. 网络部门：数据收集 + 分析
-            logger.info("=== 网络部门工作开始 ===")
-            
-            # 4.1 网络数据收集
-            network_data_result = execute_agent_with_approval(
-                agents["network_data_collector"], 
-                "收集网络连接信息，并根据历史记录过滤已分析的连接", 
-                llm_for_direct, 
-                secretary_agent
-            )
-            if network_data_result["status"] != "completed":
-                logger.warning("网络数据收集任务未获批准，跳过网络部门任务")
-                time.sleep(MONITORING_INTERVAL)
-                continue
-            
-            # 4.2 网络安全分析
-            network_analysis_result = execute_agent_with_approval(
-                agents["network_security_analyst"], 
-                "分析网络安全状况，识别可疑连接和威胁", 
-                llm_for_direct,
-                secretary_agent,
-                raw_data=network_data_result["result"]
-            )
+            # 1-4. 进程、日志、服务、网络部门：数据收集 + 分析（可并发执行）
+            department_results = run_department_pipelines(agents, llm_for_direct, secretary_agent)
             
             # 5. 威胁整合（秘书）
             logger.info("=== 威胁整合阶段 ===")
             
             # 收集所有部门的分析结果
-            all_analysis_results = ""
-            if process_analysis_result["status"] == "completed":
-                all_analysis_results += f"进程部门分析结果：\n{process_analysis_result['result']}\n\n"
-            if log_analysis_result["status"] == "completed":
-                all_analysis_results += f"日志部门分析结果：\n{log_analysis_result['result']}\n\n"
-            if service_analysis_result["status"] == "completed":
-                all_analysis_results += f"服务部门分析结果：\n{service_analysis_result['result']}\n\n"
-            if network_analysis_result["status"] == "completed":
-                all_analysis_results += f"网络部门分析结果：\n{network_analysis_result['result']}\n\n"
+            all_analysis_results = collect_analysis_results(department_results)
             
             threat_integration_result = execute_agent_with_approval(
                 agents["secretary"], 
@@ -648,115 +754,14 @@ def run_custom_workflow(agents, tasks, llm_for_direct, secretary_agent):
     logger.info("开始安全监控 (自定义部门化工作流程)...")
     while True:
         try:
-            # 1. 进程部门：数据收集 + 分析
-            logger.info("=== 进程部门工作开始 ===")
-            
-            # 1.1 进程数据收集
-            process_data_result = execute_agent_with_approval(
-                agents["process_data_collector"], 
-                "收集系统进程信息，并根据历史记录过滤已分析的进程", 
-                llm_for_direct, 
-                secretary_agent
-            )
-            if process_data_result["status"] != "completed":
-                logger.warning("进程数据收集任务未获批准，跳过进程部门任务")
-                time.sleep(MONITORING_INTERVAL)
-                continue
-            
-            # 1.2 进程安全分析
-            process_analysis_result = execute_agent_with_approval(
-                agents["process_security_analyst"], 
-                "分析进程安全状况，识别可疑进程和威胁", 
-                llm_for_direct,
-                secretary_agent,
-                raw_data=process_data_result["result"]
-            )
-            
-            # 2. 日志部门：数据收集 + 分析
-            logger.info("=== 日志部门工作开始 ===")
-            
-            # 2.1 日志数据收集
-            log_data_result = execute_agent_with_approval(
-                agents["log_data_collector"], 
-                "收集系统日志信息，并根据历史记录过滤已分析的日志", 
-                llm_for_direct, 
-                secretary_agent
-            )
-            if log_data_result["status"] != "completed":
-                logger.warning("日志数据收集任务未获批准，跳过日志部门任务")
-                time.sleep(MONITORING_INTERVAL)
-                continue
-            
-            # 2.2 日志安全分析
-            log_analysis_result = execute_agent_with_approval(
-                agents["log_security_analyst"], 
-                "分析日志安全状况，识别异常事件和威胁", 
-                llm_for_direct,
-                secretary_agent,
-                raw_data=log_data_result["result"]
-            )
-            
-            # 3. 服务部门：数据收集 + 分析
-            logger.info("=== 服务部门工作开始 ===")
-            
-            # 3.1 服务数据收集
-            service_data_result = execute_agent_with_approval(
-                agents["service_data_collector"], 
-                "收集系统服务信息，并根据历史记录过滤已分析的服务", 
-                llm_for_direct, 
-                secretary_agent
-            )
-            if service_data_result["status"] != "completed":
-                logger.warning("服务数据收集任务未获批准，跳过服务部门任务")
-                time.sleep(MONITORING_INTERVAL)
-                continue
-            
-            # 3.2 服务安全分析
-            service_analysis_result = execute_agent_with_approval(
-                agents["service_security_analyst"], 
-                "分析服务安全状况，识别异常服务和威胁", 
-                llm_for_direct,
-                secretary_agent,
-                raw_data=service_data_result["result"]
-            )
-            
-            # 4. 网络部门：数据收集 + 分析
-            logger.info("=== 网络部门工作开始 ===")
-            
-            # 4.1 网络数据收集
-            network_data_result = execute_agent_with_approval(
-                agents["network_data_collector"], 
-                "收集网络连接信息，并根据历史记录过滤已分析的连接", 
-                llm_for_direct, 
-                secretary_agent
-            )
-            if network_data_result["status"] != "completed":
-                logger.warning("网络数据收集任务未获批准，跳过网络部门任务")
-                time.sleep(MONITORING_INTERVAL)
-                continue
-            
-            # 4.2 网络安全分析
-            network_analysis_result = execute_agent_with_approval(
-                agents["network_security_analyst"], 
-                "分析网络安全状况，识别可疑连接和威胁", 
-                llm_for_direct,
-                secretary_agent,
-                raw_data=network_data_result["result"]
-            )
+            # 1-4. 进程、日志、服务、网络部门：数据收集 + 分析（可并发执行）
+            department_results = run_department_pipelines(agents, llm_for_direct, secretary_agent)
             
             # 5. 安全分析（综合分析师）
             logger.info("=== 综合安全分析阶段 ===")
             
             # 收集所有部门的分析结果
-            all_analysis_results = ""
-            if process_analysis_result["status"] == "completed":
-                all_analysis_results += f"进程部门分析结果：\n{process_analysis_result['result']}\n\n"
-            if log_analysis_result["status"] == "completed":
-                all_analysis_results += f"日志部门分析结果：\n{log_analysis_result['result']}\n\n"
-            if service_analysis_result["status"] == "completed":
-                all_analysis_results += f"服务部门分析结果：\n{service_analysis_result['result']}\n\n"
-            if network_analysis_result["status"] == "completed":
-                all_analysis_results += f"网络部门分析结果：\n{network_analysis_result['result']}\n\n"
+            all_analysis_results = collect_analysis_results(department_results)
             
             security_analysis_result = execute_agent_with_approval(
                 agents["security_analyst"], 
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+系统收集器测试
+验证收集器接口必须实现服务、安全事件和响应操作，Linux 收集器从 /proc 读取进程，
+以及在没有 psutil 时从 /proc/net 解析连接并通过 socket inode 找到所属进程
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.collectors import LinuxCollector, SystemCollector, WindowsCollector, create_collector
+
+_TCP_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _fake_proc(root):
+    """构造包含一个 sshd 进程、一个监听端口和一个已建立连接的 /proc"""
+    _write(os.path.join(root, "stat"), "cpu 0 0 0 0\nbtime 1700000000\n")
+    _write(os.path.join(root, "self", "stat"), "1 (self) S 0\n")
+    _write(os.path.join(root, "100", "stat"), "100 (sshd) S 1 " + "0 " * 17 + "500 0\n")
+    _write(os.path.join(root, "100", "status"), "Name:\tsshd\nUid:\t0\t0\t0\t0\n")
+    _write(os.path.join(root, "100", "cmdline"), "/usr/sbin/sshd\0-D\0")
+    os.makedirs(os.path.join(root, "100", "fd"))
+    os.symlink("socket:[12345]", os.path.join(root, "100", "fd", "3"))
+    os.symlink("/dev/null", os.path.join(root, "100", "fd", "0"))
+
+    little = sys.byteorder == "little"
+    loopback = "0100007F" if little else "7F000001"
+    remote = "0A01A8C0" if little else "C0A8010A"
+    _write(os.path.join(root, "net", "tcp"), _TCP_HEADER +
+           f"   0: {loopback}:0016 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 12345 1\n"
+           f"   1: {loopback}:0016 {remote}:D431 01 00000000:00000000 00:00000000 00000000     0        0 67890 1\n")
+    ipv6_loopback = "00000000000000000000000001000000" if little else "00000000000000000000000000000001"
+    _write(os.path.join(root, "net", "tcp6"), _TCP_HEADER +
+           f"   0: {ipv6_loopback}:1F90 {'0' * 32}:0000 0A 00000000:00000000 00:00000000 00000000     0        0 11111 1\n")
+
+
+def test_interface():
+    """测试收集器接口不能直接实例化，create_collector 按名称选择实现"""
+    print("=== 收集器接口测试 ===")
+    try:
+        SystemCollector()
+        assert False, "SystemCollector 是抽象类"
+    except TypeError:
+        pass
+
+    class PartialCollector(SystemCollector):
+        def services(self):
+            return []
+
+    try:
+        PartialCollector()
+        assert False, "缺少安全事件和响应操作的收集器不能实例化"
+    except TypeError:
+        pass
+
+    assert isinstance(create_collector("windows"), WindowsCollector)
+    assert isinstance(create_collector("linux"), LinuxCollector)
+    try:
+        create_collector("bsd")
+        assert False, "不支持的收集器应抛出 ValueError"
+    except ValueError:
+        pass
+    print("✓ 未实现的平台方法在实例化时报错")
+
+
+def test_linux_proc():
+    """测试从 /proc 读取进程，以及解析 /proc/net 中的 IPv4/IPv6 连接和所属进程"""
+    print("\n=== Linux /proc 测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        _fake_proc(temp_dir)
+        collector = LinuxCollector(proc_root=temp_dir)
+
+        processes = collector.processes()
+        assert [(p["pid"], p["ppid"], p["name"], p["cmdline"]) for p in processes] == \
+            [(100, 1, "sshd", ["/usr/sbin/sshd", "-D"])]
+        assert processes[0]["create_time"] == 1700000000 + 500 / collector.scanner._ticks
+        assert collector.snapshot().record(0)["name"] == "sshd"
+        print("✓ 从 /proc 读取进程")
+
+        connections = sorted(collector._proc_connections(), key=lambda c: (c["family"], c["status"]))
+        assert [(c["family"], c["local_ip"], c["local_port"], c["remote_ip"], c["remote_port"], c["status"], c["pid"])
+                for c in connections] == [
+            ("AF_INET", "127.0.0.1", 22, "192.168.1.10", 54321, "ESTABLISHED", None),
+            ("AF_INET", "127.0.0.1", 22, None, None, "LISTEN", 100),
+            ("AF_INET6", "::1", 8080, None, None, "LISTEN", None),
+        ]
+        print("✓ 解析 IPv4/IPv6 连接，按 socket inode 找到所属进程")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_interface()
+    test_linux_proc()
+    print("\n=== 测试完成 ===")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络连接表测试
+验证连接聚合、IPv6 地址解析，以及网络分析工具能读取 GetNetworkConnections 的每种输出格式
+"""
+
+import os
+import sys
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.connection_table import (
+    aggregate_connections, format_address, load_connection_groups, split_address, summarize_groups
+)
+from tools.detection_rules import RuleSet
+from tools.output_encoder import OUTPUT_FORMATS, encode_output
+
+CONNECTIONS = [
+    {"pid": 10, "type": "tcp", "local_ip": "10.0.0.2", "local_port": 50000 + i,
+     "remote_ip": "203.0.113.7", "remote_port": 4444, "status": "ESTABLISHED"}
+    for i in range(3)
+] + [
+    {"pid": 11, "type": "tcp6", "local_ip": "::", "local_port": 22,
+     "remote_ip": None, "remote_port": None, "status": "LISTEN"},
+]
+
+
+def test_aggregate_and_addresses():
+    """测试按 (pid, 远程地址, 远程端口, 状态) 聚合，以及 IPv6 地址的格式化和解析"""
+    print("=== 连接聚合测试 ===")
+    groups = aggregate_connections(CONNECTIONS)
+    assert groups[0]["count"] == 3
+    assert groups[0]["local_ports"] == [50000, 50001, 50002]
+    assert summarize_groups(groups) == {"connections": 4, "groups": 2,
+                                        "by_status": {"ESTABLISHED": 3, "LISTEN": 1}}
+
+    assert format_address("2001:db8::1", 443) == "[2001:db8::1]:443"
+    assert split_address("[2001:db8::1]:443") == ("2001:db8::1", 443)
+    assert split_address("2001:db8::1:443") == ("2001:db8::1", 443)
+    assert split_address("N/A") == (None, None)
+    print(f"✓ {len(CONNECTIONS)} 个连接聚合为 {len(groups)} 组")
+
+
+def test_load_every_output_format():
+    """测试每种输出格式的连接组都能读取，且可疑端口规则能命中"""
+    print("\n=== 输出格式读取测试 ===")
+    groups = aggregate_connections(CONNECTIONS)
+    output = {"summary": summarize_groups(groups), "groups": groups}
+    rules = RuleSet([{"id": "NET-PORT-001", "fields": ["connection.remote_port"], "regex": ["^4444$"]}])
+    for fmt in OUTPUT_FORMATS:
+        loaded = load_connection_groups(encode_output(output, fmt))
+        assert loaded == groups, fmt
+        assert load_connection_groups(encode_output(CONNECTIONS, fmt)) == groups, fmt
+        assert rules.scan(connections=loaded)["summary"]["rule_hits"] == {"NET-PORT-001": 1}, fmt
+        print(f"✓ {fmt} 格式读取到 {len(loaded)} 组，4444 端口连接被标记")
+
+
+def test_unrecognized_input():
+    """测试无法识别的输入抛出错误，而不是当作没有连接"""
+    print("\n=== 无法识别的输入测试 ===")
+    for data in ("获取网络连接失败: 权限不足", '{"summary": {}}', "[1, 2]", '[{"pid": 1}]'):
+        try:
+            load_connection_groups(data)
+            raise AssertionError(f"未识别的输入没有报错: {data}")
+        except ValueError as e:
+            print(f"✓ {data[:20]}: {e}")
+    assert load_connection_groups('{"summary": {}, "groups": []}') == []
+
+
+if __name__ == "__main__":
+    test_aggregate_and_addresses()
+    test_load_every_output_format()
+    test_unrecognized_input()
+    print("\n=== 测试完成 ===")
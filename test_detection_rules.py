@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检测规则引擎测试
+验证 Aho–Corasick 关键词匹配（重叠、大小写不敏感）、合并正则预筛、无效规则被忽略，
+以及规则文件缺失、无效或没有规则时使用 DEFAULT_RULES，修复后重新加载
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from config.constants import DETECTION_RULES_FILE
+from tools.detection_rules import DEFAULT_RULES, DetectionRuleEngine, RuleSet
+
+RULES = [
+    {"id": "P-1", "fields": ["process.name", "process.cmdline"], "keywords": ["mimikatz", "he"]},
+    {"id": "P-2", "fields": ["process.cmdline"], "keywords": ["she", "hers"], "severity": "high"},
+    {"id": "P-3", "fields": ["process.cmdline"], "regex": [r"-enc(odedcommand)?\s+[a-z0-9+/=]{8,}"]},
+    {"id": "P-4", "fields": ["process.cmdline"], "regex": [r"(?i)nc\s+-e"]},
+    {"id": "C-1", "fields": ["connection.remote_port"], "regex": ["^4444$"]},
+    {"fields": ["process.name"], "keywords": ["没有ID"]},
+    {"id": "BAD-FIELD", "fields": ["process.unknown"], "keywords": ["x"]},
+    {"id": "BAD-REGEX", "fields": ["process.name"], "regex": ["("], "keywords": ["badregex"]},
+]
+
+
+def _rules(matches):
+    return {match["item"]["pid"]: match["rules"] for match in matches}
+
+
+def test_ruleset_matching():
+    """测试重叠关键词、大小写、正则预筛、无法合并的正则和无效规则"""
+    print("=== 规则匹配测试 ===")
+    ruleset = RuleSet(RULES)
+    assert set(ruleset.rules) == {"P-1", "P-2", "P-3", "P-4", "C-1", "BAD-REGEX"}
+    processes = [
+        {"pid": 1, "name": "Mimikatz.exe", "cmdline": ["ushers"]},
+        {"pid": 2, "name": "pwsh.exe", "cmdline": "pwsh -EncodedCommand SQBFAFgAKABO"},
+        {"pid": 3, "name": "nc", "cmdline": "NC -e /bin/sh"},
+        {"pid": 4, "name": "bash", "cmdline": "ls"},
+        {"pid": 5, "name": "bash", "cmdline": "ushers"},
+    ]
+    assert _rules(ruleset.match_records("process", processes)) == {
+        1: ["P-1", "P-2"], 2: ["P-3"], 3: ["P-4"], 5: ["P-1", "P-2"],
+    }
+    print("✓ 重叠关键词、大小写不敏感和正则匹配正确")
+
+    memo = {}
+    ruleset.match_records("process", processes, memo)
+    assert memo[("process", "cmdline", "ushers")] == {"P-1", "P-2"}
+    result = ruleset.scan(processes=processes, connections=[{"pid": 9, "remote_ip": "1.2.3.4", "remote_port": 4444}])
+    assert result["summary"]["rule_hits"] == {"P-1": 2, "P-2": 2, "P-3": 1, "P-4": 1, "C-1": 1}
+    assert [rule["id"] for rule in result["rules"]] == ["C-1", "P-1", "P-2", "P-3", "P-4"]
+    print("✓ 相同文本只匹配一次，scan 汇总命中的规则")
+
+
+def test_default_rules_fallback():
+    """测试规则文件缺失、无效、没有有效规则时使用默认规则，修复后重新加载"""
+    print("\n=== 默认规则测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        rules_file = os.path.join(temp_dir, "detection_rules.json")
+        engine = DetectionRuleEngine(rules_file)
+        default_ids = {rule["id"] for rule in DEFAULT_RULES}
+        assert set(engine.ruleset().rules) == default_ids and engine.using_defaults
+        print("✓ 规则文件缺失时使用默认规则")
+
+        services = [{"name": "updater", "state": "RUNNING", "binary_path": "C:\\Users\\Public\\upd.exe"}]
+        for content in ("{无效的JSON", json.dumps({"rules": [{"id": "X", "fields": ["bad.field"]}]})):
+            with open(rules_file, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.utime(rules_file, (time.time() + len(content), time.time() + len(content)))
+            assert set(engine.ruleset().rules) == default_ids and engine.using_defaults
+            assert engine.scan(services=services)["matches"][0]["rules"] == ["SVC-PATH-001"]
+        print("✓ 规则文件无效或没有有效规则时使用默认规则")
+
+        with open(rules_file, "w", encoding="utf-8") as f:
+            json.dump({"rules": RULES}, f)
+        os.utime(rules_file, (time.time() + 100, time.time() + 100))
+        assert "P-1" in engine.ruleset().rules and not engine.using_defaults
+        print("✓ 规则文件修复后重新加载")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_shipped_rules():
+    """测试随程序发布的规则文件可以加载，并包含默认规则"""
+    print("\n=== 发布规则测试 ===")
+    engine = DetectionRuleEngine(DETECTION_RULES_FILE)
+    rules = engine.ruleset().rules
+    assert not engine.using_defaults
+    assert {rule["id"] for rule in DEFAULT_RULES} <= set(rules)
+    print(f"✓ 加载 {len(rules)} 条规则")
+
+
+if __name__ == "__main__":
+    test_ruleset_matching()
+    test_default_rules_fallback()
+    test_shipped_rules()
+    print("\n=== 测试完成 ===")
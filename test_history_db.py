@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+部门历史查询库测试
+验证按部门、时间范围、类型和关键字查询，保留条数上限，以及从分段存储同步
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.history_db import HistoryDatabase, parse_epoch_bound, parse_time_bound
+
+
+def _record(analysis_id, days_ago, content, record_type="process_analysis"):
+    timestamp = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    return {"analysis_id": analysis_id, "timestamp": timestamp, "type": record_type, "content": content}
+
+
+def test_time_bounds():
+    """测试相对时间、绝对时间和epoch秒的解析"""
+    print("=== 时间参数测试 ===")
+    assert parse_time_bound(None) is None
+    assert parse_time_bound("2025-01-02") == "2025-01-02T00:00:00"
+    assert parse_time_bound("2d") < parse_time_bound("1h") < datetime.now().isoformat()
+    assert parse_epoch_bound(1700000000) == 1700000000.0
+    assert parse_epoch_bound("1700000000") == 1700000000.0
+    assert parse_epoch_bound("2025-01-02 00:00:00") == datetime(2025, 1, 2).timestamp()
+    try:
+        parse_time_bound("昨天")
+        assert False, "无法解析的时间应抛出 ValueError"
+    except ValueError:
+        pass
+    print("✓ 时间参数解析正确")
+
+
+def test_query():
+    """测试按部门、时间范围、类型和关键字（包括中文子串）查询"""
+    print("\n=== 查询测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        db = HistoryDatabase(os.path.join(temp_dir, "history.sqlite"), max_records=3)
+        db.insert_many("process", [
+            _record("p1", 10, "发现可疑进程 nc.exe"),
+            _record("p2", 1, "进程正常"),
+            _record("p3", 0, "发现挖矿进程 xmrig", "process_alert"),
+        ])
+        db.insert("network", _record("n1", 0, "发现可疑连接"))
+        db.insert("network", _record("n1", 0, "重复的 analysis_id 被忽略"))
+
+        assert [r["analysis_id"] for r in db.query("process")] == ["p3", "p2", "p1"]
+        assert [r["analysis_id"] for r in db.query("process", since="2d")] == ["p3", "p2"]
+        assert [r["analysis_id"] for r in db.query(record_type="process_alert")] == ["p3"]
+        assert {r["analysis_id"] for r in db.query(match="可疑")} == {"p1", "n1"}
+        assert [r["analysis_id"] for r in db.query("process", match="挖矿进程")] == ["p3"]
+        assert len(db.query(limit=1)) == 1
+        print("✓ 部门、时间、类型和关键字查询正确")
+
+        db.insert("process", _record("p4", 0, "新记录"))
+        assert "p1" not in {r["analysis_id"] for r in db.query("process")}
+        print("✓ 超出保留条数时删除最旧的记录")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_sync_department():
+    """测试首次查询时从分段存储同步，写入失败后重新同步"""
+    print("\n=== 同步测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        db = HistoryDatabase(os.path.join(temp_dir, "history.sqlite"))
+        calls = []
+
+        def records():
+            calls.append(1)
+            return [_record("s1", 0, "服务正常")]
+
+        db.sync_department("service", records)
+        db.sync_department("service", records)
+        assert len(calls) == 1
+        db.mark_unsynced("service")
+        db.sync_department("service", records)
+        assert len(calls) == 2
+        assert [r["analysis_id"] for r in db.query("service")] == ["s1"]
+        print("✓ 只同步一次，mark_unsynced 后重新同步")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_time_bounds()
+    test_query()
+    test_sync_department()
+    print("\n=== 测试完成 ===")
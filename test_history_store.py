@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+部门历史分段存储测试
+验证保留条数和分段大小配置变化后重新打开历史，记录不丢失、不损坏，
+以及 LoadAllDepartmentHistory 并发读取各部门的摘要
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools import security_tools
+from tools.history_store import SegmentedHistoryStore
+
+
+def _write_history(base_dir, count, max_records, segment_size):
+    store = SegmentedHistoryStore(base_dir, max_records=max_records, segment_size=segment_size)
+    for i in range(count):
+        store.append("process", {"seq": i})
+
+
+def test_reopen_with_different_segment_size():
+    """测试分段大小变化后重新打开历史"""
+    print("=== 分段大小变化测试 ===")
+    base_dir = tempfile.mkdtemp()
+    try:
+        _write_history(base_dir, 20, max_records=100, segment_size=10)
+
+        for segment_size in (20, 3, 10):
+            store = SegmentedHistoryStore(base_dir, max_records=100, segment_size=segment_size)
+            records = store.read_recent("process")
+            print(f"✓ 分段大小 {segment_size}: 读取到 {len(records)} 条记录")
+            assert [record["seq"] for record in records] == list(range(20))
+
+        store.append("process", {"seq": 20})
+        assert store.read_recent("process", limit=2) == [{"seq": 19}, {"seq": 20}]
+    finally:
+        shutil.rmtree(base_dir)
+
+
+def test_reopen_with_smaller_retention():
+    """测试保留条数变小后只返回保留范围内的记录"""
+    print("\n=== 保留条数变化测试 ===")
+    base_dir = tempfile.mkdtemp()
+    try:
+        _write_history(base_dir, 30, max_records=100, segment_size=10)
+
+        store = SegmentedHistoryStore(base_dir, max_records=15, segment_size=4)
+        records = store.read_recent("process")
+        print(f"✓ 保留 15 条: 读取到 {len(records)} 条记录")
+        assert [record["seq"] for record in records] == list(range(15, 30))
+    finally:
+        shutil.rmtree(base_dir)
+
+
+def test_load_all_department_history():
+    """测试 LoadAllDepartmentHistory 并发读取各部门摘要（最近记录、内容截断）和全部记录"""
+    print("\n=== 全部部门历史测试 ===")
+    base_dir = tempfile.mkdtemp()
+    original_store = security_tools.history_store
+    try:
+        store = SegmentedHistoryStore(base_dir, max_records=100, segment_size=10)
+        for i in range(5):
+            store.append("process_department", {"type": "process_analysis", "timestamp": f"t{i}",
+                                                "content": "长" * (security_tools.HISTORY_SUMMARY_CONTENT_CHARS + i)})
+        store.append("network_department", {"type": "network_analysis", "timestamp": "t0", "content": "正常"})
+        security_tools.history_store = store
+        load = getattr(security_tools.load_all_department_history, "func",
+                       security_tools.load_all_department_history)
+
+        summary = json.loads(load(recent_items=2, output_format="json"))
+        assert set(summary) == set(security_tools.HISTORY_DEPARTMENTS)
+        process = summary["process_department"]
+        assert process["count"] == 5 and process["newest_timestamp"] == "t4"
+        assert len(process["recent"]) == 2 and process["recent"][0]["content"].endswith("字）")
+        assert summary["network_department"]["recent"][0]["content"] == "正常"
+        assert summary["log_department"]["count"] == 0
+        print("✓ 各部门摘要正确")
+
+        full = json.loads(load(full_content=True, output_format="json"))
+        assert len(full["process_department"]) == 5 and full["log_department"] == []
+        print("✓ full_content 返回全部记录")
+    finally:
+        security_tools.history_store = original_store
+        shutil.rmtree(base_dir)
+
+
+if __name__ == "__main__":
+    test_reopen_with_different_segment_size()
+    test_reopen_with_smaller_retention()
+    test_load_all_department_history()
+    print("\n=== 测试完成 ===")
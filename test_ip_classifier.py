@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IP地址分类测试
+验证特殊地址段的最长前缀匹配、允许/拒绝列表的覆盖顺序、IPv4 映射的 IPv6 地址按 IPv4 分类，
+以及列表文件修改后重新加载
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.ip_classifier import ALLOW, DENY, PUBLIC, IPClassifier
+
+
+def _write_lists(path, lists):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(lists, f)
+
+
+def test_special_ranges():
+    """测试特殊地址段、公网地址、IPv4 映射地址和无法解析的地址"""
+    print("=== 特殊地址段测试 ===")
+    classifier = IPClassifier(lists_file=None)
+    expected = {
+        "10.1.2.3": "private",
+        "172.31.255.255": "private",
+        "172.32.0.1": PUBLIC,
+        "127.0.0.1": "loopback",
+        "::1": "loopback",
+        "fe80::1%eth0": "link_local",
+        "100.64.0.1": "shared",
+        "2001:db8::1": "documentation",
+        "8.8.8.8": PUBLIC,
+        "2606:4700::1111": PUBLIC,
+        "::ffff:192.168.1.10": "private",
+        "::ffff:8.8.8.8": PUBLIC,
+        "不是地址": None,
+    }
+    assert classifier.classify_many(expected) == expected
+    for ip, category in expected.items():
+        assert classifier.classify(ip) == category, ip
+    print("✓ 特殊地址段按最长前缀匹配，IPv4 映射地址按 IPv4 分类")
+
+    assert not IPClassifier.is_external("private") and not IPClassifier.is_external(None)
+    assert IPClassifier.is_external(PUBLIC) and IPClassifier.is_external(DENY)
+    print("✓ 公网和拒绝列表地址视为外部地址")
+
+
+def test_allow_deny_lists():
+    """测试允许/拒绝列表覆盖特殊地址段，更长的前缀优先，文件修改后重新加载"""
+    print("\n=== 允许/拒绝列表测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        lists_file = os.path.join(temp_dir, "ip_lists.json")
+        _write_lists(lists_file, {"allow": ["203.0.113.0/24", "10.0.0.0/8"],
+                                  "deny": ["10.66.0.0/16", "1.2.3.4", "无效"]})
+        classifier = IPClassifier(lists_file)
+        memo = {}
+        assert classifier.classify("10.1.1.1", memo) == ALLOW
+        assert classifier.classify("10.66.1.1", memo) == DENY
+        assert classifier.classify("::ffff:1.2.3.4", memo) == DENY
+        assert classifier.classify("203.0.113.5", memo) == ALLOW
+        assert memo["10.66.1.1"] == DENY
+        print("✓ 拒绝列表覆盖允许列表，允许列表覆盖特殊地址段，无效的CIDR被忽略")
+
+        _write_lists(lists_file, {"deny": ["8.8.8.0/24"]})
+        os.utime(lists_file, (time.time() + 5, time.time() + 5))
+        assert classifier.classify("8.8.8.8") == DENY
+        assert classifier.classify("10.1.1.1") == "private"
+        print("✓ 列表文件修改后重新加载")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_special_ranges()
+    test_allow_deny_lists()
+    print("\n=== 测试完成 ===")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存测试
+验证提示词规范化后的命中、模型和温度区分、TTL 过期以及按最近访问淘汰
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.llm_cache import LLMResponseCache, make_cache_key
+
+
+class _Counter:
+    """模拟LLM调用，记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt):
+        self.calls += 1
+        return f"响应 {self.calls}"
+
+
+def test_cache_hit():
+    """测试规范化后相同的提示词命中缓存，模型或温度不同时不命中"""
+    print("=== 缓存命中测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache = LLMResponseCache(os.path.join(temp_dir, "cache.sqlite"), ttl=3600, max_entries=10)
+        llm = SimpleNamespace(model_name="deepseek-chat", temperature=0.1)
+        call = _Counter()
+        assert cache.get_or_call(llm, "  分析以下数据：\n\n    进程列表", call) == "响应 1"
+        assert cache.get_or_call(llm, "分析以下数据：\n进程列表", call) == "响应 1"
+        assert call.calls == 1 and cache.hits == 1
+        print("✓ 缩进和空行不影响命中")
+
+        cache.get_or_call(SimpleNamespace(model_name="deepseek-chat", temperature=0.7), "分析以下数据：\n进程列表", call)
+        cache.get_or_call(llm, "分析以下数据：\n进程列表", call, bypass=True)
+        assert call.calls == 3
+        assert cache.get_or_call(llm, "分析以下数据：\n进程列表", call) == "响应 3"
+        print("✓ 温度不同时不命中，bypass 刷新缓存")
+
+        cache.enabled = False
+        cache.get_or_call(llm, "分析以下数据：\n进程列表", call)
+        assert call.calls == 4
+        print("✓ 关闭缓存时总是调用LLM")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_ttl_and_eviction():
+    """测试过期条目不再命中，超出容量时淘汰最久未访问的条目"""
+    print("\n=== 过期与淘汰测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache = LLMResponseCache(os.path.join(temp_dir, "cache.sqlite"), ttl=0.2, max_entries=2)
+        key = make_cache_key("m", None, "提示词")
+        cache.put(key, "响应")
+        assert cache.get(key) == "响应"
+        time.sleep(0.3)
+        assert cache.get(key) is None
+        print("✓ 超过 TTL 的条目过期")
+
+        cache.ttl = 0
+        for name in ("a", "b"):
+            cache.put(name, name)
+            time.sleep(0.01)
+        cache.get("a")
+        cache.put("c", "c")
+        assert cache.get("b") is None
+        assert cache.get("a") == "a" and cache.get("c") == "c"
+        assert cache.stats()["entries"] == 2
+        print("✓ 淘汰最久未访问的条目")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_cache_hit()
+    test_ttl_and_eviction()
+    print("\n=== 测试完成 ===")
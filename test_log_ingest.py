@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量日志读取测试
+验证游标只越过已返回的事件（max_events）、不完整的最后一行留到下一次、文件轮转后从头读取，
+evtx JSON 数组按记录ID升序返回，以及文本日志的时间窗口过滤
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+from datetime import datetime
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.log_ingest import CursorStore, LogFileSource, LogIngestor, filter_log_text, parse_syslog_line
+
+
+def _syslog(minute, message):
+    return f"2025-01-02T03:{minute:02d}:00 host sshd[42]: {message}\n"
+
+
+def test_incremental_read():
+    """测试增量读取：max_events 之后继续读取、不完整的行、文件轮转"""
+    print("=== 增量读取测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, "auth.log")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(_syslog(i, f"事件 {i}") for i in range(5)))
+            f.write("2025-01-02T03:59:00 host sshd[42]: 写了一半")
+        ingestor = LogIngestor([LogFileSource("auth", path)], CursorStore(os.path.join(temp_dir, "cursors.json")))
+
+        read = lambda **kwargs: [event["message"] for event in ingestor.iter_new_events(**kwargs)]
+        assert read(max_events=2) == ["事件 0", "事件 1"]
+        assert read() == ["事件 2", "事件 3", "事件 4"]
+        assert read() == []
+        print("✓ 游标只越过已返回的事件")
+
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n")
+        assert read() == ["写了一半"]
+        print("✓ 不完整的最后一行在写完后读取")
+
+        # 轮转：新文件（inode 变化）从头读取
+        os.remove(path)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_syslog(0, "新文件"))
+        assert read() == ["新文件"]
+        print("✓ 文件轮转后从头读取")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_evtx_json_array():
+    """测试 evtx JSON 数组（Get-WinEvent 从新到旧）按记录ID升序返回，已读取的记录跳过"""
+    print("\n=== evtx JSON 数组测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, "security.json")
+        entries = [{"Id": 4625, "RecordId": record_id, "TimeCreated": "2025-01-02T03:04:05",
+                    "Message": f"登录失败 {record_id}"} for record_id in (12, 11, 10)]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        ingestor = LogIngestor([LogFileSource("security", path, "evtx_json")],
+                               CursorStore(os.path.join(temp_dir, "cursors.json")))
+
+        assert [e["record_id"] for e in ingestor.iter_new_events(max_events=2)] == [10, 11]
+        assert [e["record_id"] for e in ingestor.iter_new_events()] == [12]
+        assert list(ingestor.iter_new_events()) == []
+        print("✓ 按记录ID升序返回，已读取的记录跳过")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_filter_log_text():
+    """测试文本日志按时间窗口过滤，没有时间戳的续行跟随上一条日志"""
+    print("\n=== 文本过滤测试 ===")
+    text = _syslog(0, "旧事件") + "  续行\n" + _syslog(30, "新事件") + "  续行"
+    since = datetime(2025, 1, 2, 3, 10).timestamp()
+    assert filter_log_text(text, since=since).splitlines() == [_syslog(30, "新事件").rstrip("\n"), "  续行"]
+
+    events = json.dumps([{"epoch": since - 60, "message": "旧"}, {"epoch": since + 60, "message": "新"}])
+    assert [event["message"] for event in json.loads(filter_log_text(events, since=since))] == ["新"]
+
+    event = parse_syslog_line("Jan  2 03:04:05 host cron[7]: 任务", year=2025)
+    assert event["program"] == "cron" and event["pid"] == "7"
+    assert event["epoch"] == datetime(2025, 1, 2, 3, 4, 5).timestamp()
+    print("✓ 时间窗口过滤正确")
+
+
+if __name__ == "__main__":
+    test_incremental_read()
+    test_evtx_json_array()
+    test_filter_log_text()
+    print("\n=== 测试完成 ===")
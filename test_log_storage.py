@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志存储测试
+验证 JSONL 追加写入和旧 .json 数组文件的迁移、单次写入多索引的视图读取，
+以及后台批量写入线程在队列满、并发提交和关闭之后都按提交顺序写入，不丢记录
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.log_storage import (
+    BackgroundLogWriter, IndexedLogStore, JsonlLogStore, iter_log_records, read_log_records
+)
+
+
+class _Sink:
+    """记录写入顺序的写入函数，每批稍作等待以便队列写满"""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __call__(self, target, payloads):
+        time.sleep(0.001)
+        with self._lock:
+            self.records.extend((target, payload) for payload in payloads)
+
+
+def test_jsonl_store():
+    """测试追加写入、跳过损坏的行，以及首次写入时迁移旧 .json 数组文件（旧记录在前）"""
+    print("=== JSONL 存储测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        legacy = os.path.join(temp_dir, "report_2025-01-01.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([{"id": 0}], f)
+        store = JsonlLogStore()
+        path = store.append(legacy, {"id": 1, "content": "中文"})
+        store.append_many(path, [{"id": 2}, {"id": 3}])
+        assert path.suffix == ".jsonl" and not os.path.exists(legacy)
+        print("✓ 旧 .json 文件已迁移")
+
+        # 进程崩溃时写了一半的最后一行
+        with open(path, "ab") as f:
+            f.write(b'{"id": 4')
+        assert [record["id"] for record in iter_log_records(path)] == [0, 1, 2, 3]
+        assert read_log_records(temp_dir, "report_2025-01-01")[1]["content"] == "中文"
+        print("✓ 按写入顺序读取，跳过损坏的行")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_indexed_store():
+    """测试每条记录只写入主段一次，各视图索引按偏移量读取"""
+    print("\n=== 多索引存储测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        store = IndexedLogStore(temp_dir)
+        group_view = ("groups/default", "report_2025-01-01")
+        role_view = ("roles/secretary", "report_2025-01-01")
+        store.append("2025-01-01", {"id": 1}, [group_view, role_view])
+        store.append_many("2025-01-01", [({"id": 2}, [group_view]), ({"id": 3}, [role_view])])
+
+        assert len(list(iter_log_records(store.segment_path("2025-01-01")))) == 3
+        assert [record["id"] for record in store.read_view(*group_view)] == [1, 2]
+        assert [record["id"] for record in store.read_view(*role_view)] == [1, 3]
+        assert store.read_view("groups/other", "report_2025-01-01") == []
+        print("✓ 主段只写一次，视图按索引读取")
+
+        # 写了一半的索引尾部被忽略
+        with open(store.index_path(*group_view), "ab") as f:
+            f.write(b"\x01\x02")
+        assert [record["id"] for record in store.read_view(*group_view)] == [1, 2]
+        print("✓ 忽略写了一半的索引")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_queue_full_order():
+    """测试队列满时在调用线程写入，仍然保持提交顺序"""
+    print("\n=== 队列满测试 ===")
+    sink = _Sink()
+    writer = BackgroundLogWriter(sink, max_queue=4, batch_size=2, put_timeout=0.0005)
+    for i in range(200):
+        writer.submit("a", i)
+    assert writer.flush(5)
+    assert sink.records == [("a", i) for i in range(200)]
+    assert writer.metrics()["sync_fallbacks"] > 0
+    writer.close()
+    print("✓ 队列满时按提交顺序写入")
+
+
+def test_submit_after_close():
+    """测试关闭之后提交的记录同步写入，并发提交与关闭时不丢记录"""
+    print("\n=== 关闭测试 ===")
+    sink = _Sink()
+    writer = BackgroundLogWriter(sink, max_queue=4, batch_size=2, put_timeout=0.0005)
+    threads = [threading.Thread(target=lambda k=k: [writer.submit(k, i) for i in range(100)])
+               for k in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.01)
+    writer.close()
+    for thread in threads:
+        thread.join()
+
+    assert len(sink.records) == 400
+    for k in range(4):
+        assert [payload for target, payload in sink.records if target == k] == list(range(100))
+    print("✓ 并发提交与关闭时不丢记录，每个线程的记录保持顺序")
+
+    assert writer.submit("a", "late") is False
+    assert sink.records[-1] == ("a", "late")
+    assert writer.flush() is True
+    print("✓ 关闭之后提交的记录同步写入")
+
+
+if __name__ == "__main__":
+    test_jsonl_store()
+    test_indexed_store()
+    test_queue_full_order()
+    test_submit_after_close()
+    print("\n=== 测试完成 ===")
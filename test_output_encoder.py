@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工具输出编码测试
+验证每种输出格式（含按token预算截断的输出）都能由 decode_output 还原
+"""
+
+import os
+import sys
+import json
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.output_encoder import OUTPUT_FORMATS, encode_output, decode_output
+
+ROWS = [
+    {"pid": 1, "remote_ip": "1.2.3.4", "remote_port": 4444, "status": "ESTABLISHED",
+     "local_ports": [50000, 50001], "trusted": False, "note": "ipv4"},
+    {"pid": 2, "remote_ip": "2001:db8::1", "remote_port": 443, "status": "ESTABLISHED",
+     "local_ports": [], "trusted": True, "note": "ipv6"},
+    {"pid": 3, "remote_ip": None, "remote_port": None, "status": "LISTEN",
+     "local_ports": [22], "trusted": None, "note": "a, \"quoted\" value"},
+]
+
+
+def test_round_trip_every_format():
+    """测试列表和含列表的字典在每种格式下完整还原"""
+    print("=== 编码还原测试 ===")
+    data = {"summary": {"connections": 3, "groups": 3}, "groups": ROWS}
+    for fmt in OUTPUT_FORMATS:
+        assert decode_output(encode_output(ROWS, fmt)) == ROWS, fmt
+        assert decode_output(encode_output(data, fmt)) == {"summary": data["summary"],
+                                                           "groups": ROWS}, fmt
+        print(f"✓ {fmt} 格式还原一致")
+
+
+def test_compact_is_json():
+    """测试 compact/columnar 输出（包括截断后的输出）始终是合法JSON"""
+    print("\n=== 紧凑输出测试 ===")
+    data = {"summary": {"total": 200}, "groups": [dict(row, pid=i) for i, row in enumerate(ROWS * 70)]}
+    for fmt in ("json", "compact", "columnar"):
+        text = encode_output(data, fmt, token_budget=300)
+        parsed = json.loads(text)
+        assert parsed["groups"]["omitted"] > 0
+        decoded = decode_output(text)
+        assert decoded["summary"] == {"total": 200}
+        assert 0 < len(decoded["groups"]) < len(data["groups"])
+        print(f"✓ {fmt} 截断后保留 {len(decoded['groups'])} 行，省略 {parsed['groups']['omitted']} 行")
+
+
+def test_truncated_csv():
+    """测试截断的CSV输出去掉省略标注后还原保留的行"""
+    print("\n=== CSV截断测试 ===")
+    rows = [dict(row, pid=i) for i, row in enumerate(ROWS * 70)]
+    decoded = decode_output(encode_output(rows, "csv", token_budget=300))
+    assert 0 < len(decoded) < len(rows)
+    assert decoded == rows[:len(decoded)]
+    print(f"✓ 保留 {len(decoded)} 行")
+
+
+def test_unrecognized_output():
+    """测试无法识别的文本抛出 ValueError"""
+    print("\n=== 无法识别的输出测试 ===")
+    for text in ("", "错误: 获取网络连接失败", "a,b\n1,2,3"):
+        try:
+            decode_output(text)
+            raise AssertionError(f"未识别的输出没有报错: {text!r}")
+        except ValueError:
+            pass
+    print("✓ 无法识别的输出抛出 ValueError")
+
+
+if __name__ == "__main__":
+    test_round_trip_every_format()
+    test_compact_is_json()
+    test_truncated_csv()
+    test_unrecognized_output()
+    print("\n=== 测试完成 ===")
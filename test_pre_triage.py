@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预分诊测试
+验证数据摘要取自收集工具登记的数据、沿用上一次分析结果的条件，以及 max_age 过期
+"""
+
+import os
+import sys
+import time
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.pre_triage import PreTriage
+
+SERVICES = [
+    {"name": "EventLog", "display_name": "Windows Event Log", "state": "RUNNING", "pid": 1200,
+     "binary_path": "C:\\Windows\\System32\\svchost.exe", "start_type": "auto"},
+]
+
+
+def test_digest():
+    """测试摘要：使用登记的数据（忽略PID等无关字段），没有登记时使用去掉时间戳的收集结果"""
+    print("=== 摘要测试 ===")
+    triage = PreTriage(state_file=None)
+    triage.observe("service", SERVICES)
+    first = triage.digest("service", "本轮收集结果 A")
+    # 数据收集员的转述不同、PID 变化都不影响摘要
+    triage.observe("service", [dict(SERVICES[0], pid=4321)])
+    assert triage.digest("service", "本轮收集结果 B") == first
+    triage.observe("service", [dict(SERVICES[0], state="STOPPED")])
+    assert triage.digest("service", "本轮收集结果 A") != first
+    print("✓ 摘要取自登记的数据")
+
+    # 登记的数据只使用一次，本轮没有登记时改用收集结果
+    assert triage.digest("service", "本轮收集结果 A") != first
+    assert (triage.digest("log", "2024-01-01 10:00:00  无新事件") ==
+            triage.digest("log", "2024-01-02 11:30:00 无新事件"))
+    assert triage.digest("log", "无新事件") != triage.digest("log", "新事件 1 条")
+    print("✓ 没有登记数据时使用收集结果")
+
+
+def test_cached():
+    """测试沿用结果：摘要相同时返回上一次的分析结果，摘要不同时返回None"""
+    print("\n=== 沿用结果测试 ===")
+    triage = PreTriage(state_file=None)
+    digest = triage.digest("log", "事件 A")
+    assert triage.cached("log", digest) is None
+    triage.record("log", digest, "没有发现威胁")
+    assert triage.cached("log", digest)["result"] == "没有发现威胁"
+    assert triage.cached("log", triage.digest("log", "事件 B")) is None
+    assert triage.cached("process", digest) is None
+
+    triage.reset("log")
+    assert triage.cached("log", digest) is None
+    print("✓ 摘要相同时沿用上一次的分析结果")
+
+
+def test_max_age():
+    """测试 max_age：超过最长沿用时间后即使数据未变化也重新分析"""
+    print("\n=== 过期测试 ===")
+    triage = PreTriage(state_file=None, max_age=60)
+    digest = triage.digest("log", "事件 A")
+    triage.record("log", digest, "没有发现威胁")
+    assert triage.cached("log", digest) is not None
+
+    triage._state["log"]["analyzed_at"] = time.time() - 61
+    assert triage.cached("log", digest) is None
+
+    unlimited = PreTriage(state_file=None, max_age=0)
+    unlimited.record("log", digest, "没有发现威胁")
+    unlimited._state["log"]["analyzed_at"] = 0
+    assert unlimited.cached("log", digest) is not None
+    print("✓ 超过 max_age 后重新分析，0 表示不限")
+
+
+if __name__ == "__main__":
+    test_digest()
+    test_cached()
+    test_max_age()
+    print("\n=== 测试完成 ===")
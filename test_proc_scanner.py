@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/proc 快速扫描测试
+验证从 stat/status/cmdline 读取进程列、包含空格和括号的进程名、被截断的 comm 从 cmdline 恢复、
+读取失败的进程被跳过，以及 passwd 映射在文件修改后重新加载
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.proc_scanner import PasswdMap, ProcScanner
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _add_process(root, pid, comm, ppid, start_ticks, uid, cmdline=None):
+    base = os.path.join(root, str(pid))
+    _write(os.path.join(base, "stat"), f"{pid} ({comm}) S {ppid} " + "0 " * 17 + f"{start_ticks} 0\n")
+    if uid is not None:
+        _write(os.path.join(base, "status"), f"Name:\t{comm}\nUmask:\t0022\nUid:\t{uid}\t{uid}\t{uid}\t{uid}\n")
+    if cmdline is not None:
+        _write(os.path.join(base, "cmdline"), cmdline)
+
+
+def test_scan():
+    """测试进程列、特殊进程名、截断恢复，以及跳过没有 status 的进程"""
+    print("=== /proc 扫描测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        proc_root = os.path.join(temp_dir, "proc")
+        passwd = os.path.join(temp_dir, "passwd")
+        _write(passwd, "root:x:0:0::/root:/bin/sh\nalice:x:1000:1000::/home/alice:/bin/sh\n")
+        _write(os.path.join(proc_root, "stat"), "btime 1700000000\n")
+        _add_process(proc_root, 1, "init", 0, 100, 0, "/sbin/init\0")
+        _add_process(proc_root, 200, "my (evil) app", 1, 300, 1000, "")
+        _add_process(proc_root, 300, "very-long-progr", 1, 400, 1000, "/opt/very-long-program-name\0--flag\0")
+        _add_process(proc_root, 400, "gone", 1, 500, None)
+        os.makedirs(os.path.join(proc_root, "sys"))
+
+        scanner = ProcScanner(proc_root, PasswdMap(passwd))
+        columns = scanner.scan()
+        rows = sorted(columns.records(), key=lambda r: r["pid"])
+        assert [(r["pid"], r["ppid"], r["name"], r["username"]) for r in rows] == [
+            (1, 0, "init", "root"),
+            (200, 1, "my (evil) app", "alice"),
+            (300, 1, "very-long-program-name", "alice"),
+        ]
+        assert rows[2]["cmdline"] == ["/opt/very-long-program-name", "--flag"] and rows[1]["cmdline"] == []
+        assert rows[0]["create_time"] == 1700000000 + 100 / scanner._ticks
+        print("✓ 进程列正确，截断的进程名从 cmdline 恢复，读取失败的进程被跳过")
+
+        # 不读取命令行时无法恢复截断的名称
+        assert "very-long-progr" in set(scanner.scan(with_cmdline=False).name)
+        # 使用 stat 文件属主时不需要 status，读取失败的进程也会返回
+        assert len(scanner.scan(real_uid=False)) == 4
+        print("✓ with_cmdline 和 real_uid 选项正确")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_passwd_map():
+    """测试 passwd 修改后重新加载"""
+    print("\n=== passwd 映射测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        passwd = os.path.join(temp_dir, "passwd")
+        _write(passwd, "alice:x:1000:1000::/home/alice:/bin/sh\n")
+        passwd_map = PasswdMap(passwd)
+        assert passwd_map.resolve_many([1000]) == {1000: "alice"}
+
+        _write(passwd, "bob:x:1000:1000::/home/bob:/bin/sh\n")
+        os.utime(passwd, (time.time() + 5, time.time() + 5))
+        assert passwd_map.resolve_many([1000, 1000]) == {1000: "bob"}
+        print("✓ passwd 修改后重新加载")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_scan()
+    test_passwd_map()
+    print("\n=== 测试完成 ===")
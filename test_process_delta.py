@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程快照差异测试
+验证 delta 模式按 (PID, 创建时间) 识别新启动、已退出和属性变化的进程，以及快照文件的持久化
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.process_delta import ProcessDeltaTracker, process_key
+
+
+def _entry(pid, create_time, name, cmdline=""):
+    record = {"pid": pid, "name": name, "username": "root", "cmdline": cmdline}
+    return process_key(pid, create_time), record
+
+
+def test_delta():
+    """测试新启动、已退出、属性变化，以及 PID 复用视为不同进程"""
+    print("=== 进程差异测试 ===")
+    tracker = ProcessDeltaTracker(snapshot_file=None)
+    first = tracker.update([_entry(1, 100.0, "init"), _entry(20, 200.0, "sshd"), _entry(30, 300.0, "bash")])
+    assert first["summary"]["started"] == 3 and first["summary"]["previous_snapshot"] is None
+
+    delta = tracker.update([_entry(1, 100.0, "init"), _entry(20, 200.0, "sshd", "-D"),
+                            _entry(30, 350.0, "nc"), _entry(40, 400.0, "python3")])
+    assert [p["pid"] for p in delta["started"]] == [30, 40]
+    assert [p["name"] for p in delta["exited"]] == ["bash"]
+    assert delta["changed"] == [{"pid": 20, "name": "sshd", "changes": {"cmdline": ["", "-D"]}}]
+    assert delta["summary"]["unchanged"] == 1
+    print("✓ 新启动、已退出和属性变化正确，PID 复用视为新进程")
+
+
+def test_persistence():
+    """测试快照写入文件，重新创建跟踪器后继续计算差异"""
+    print("\n=== 快照持久化测试 ===")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        snapshot_file = os.path.join(temp_dir, "process_snapshot.json")
+        ProcessDeltaTracker(snapshot_file).update([_entry(1, 100.0, "init")])
+        tracker = ProcessDeltaTracker(snapshot_file)
+        delta = tracker.update([_entry(1, 100.0, "init"), _entry(2, 101.0, "cron")])
+        assert delta["summary"]["started"] == 1 and delta["summary"]["previous_snapshot"] is not None
+
+        tracker.reset()
+        assert not os.path.exists(snapshot_file)
+        assert tracker.update([_entry(1, 100.0, "init")])["summary"]["started"] == 1
+        print("✓ 程序重启后继续计算差异，reset 丢弃快照")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_delta()
+    test_persistence()
+    print("\n=== 测试完成 ===")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式进程快照测试
+验证字符串去重、按创建时间二分过滤（保留没有创建时间的进程）、视图过滤，
+渲染结果缓存并登记到 snapshot_registry，以及从各种输出格式（columnar/compact/csv）重建快照
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.output_encoder import OUTPUT_FORMATS
+from tools.process_snapshot import ProcessSnapshot, snapshot_registry
+
+BASE = datetime(2025, 1, 2, 3, 0, 0).timestamp()
+
+RECORDS = [
+    {"pid": 1, "ppid": 0, "name": "init", "username": "root", "cmdline": ["/sbin/init"], "create_time": BASE},
+    {"pid": 20, "ppid": 1, "name": "bash", "username": "alice", "cmdline": "bash -l", "create_time": BASE + 600},
+    {"pid": 30, "ppid": 20, "name": "bash", "username": "alice", "cmdline": "bash -l", "create_time": BASE + 1200},
+    {"pid": 40, "ppid": 1, "name": "kworker", "username": None, "cmdline": [], "create_time": 0},
+    "不是字典的记录被忽略",
+]
+
+
+def test_columns():
+    """测试字符串去重和记录还原"""
+    print("=== 列式存储测试 ===")
+    snapshot = ProcessSnapshot.from_records(RECORDS)
+    assert len(snapshot) == 4
+    assert snapshot.names == ["init", "bash", "kworker"] and snapshot.cmdlines.count("bash -l") == 1
+    assert snapshot.name_id[1] == snapshot.name_id[2]
+    assert snapshot.record(0) == {"pid": 1, "ppid": 0, "name": "init", "username": "root",
+                                  "cmdline": "/sbin/init", "create_time": "2025-01-02 03:00:00"}
+    assert snapshot.record(3)["username"] is None
+    print("✓ 重复的进程名和命令行只保存一次")
+
+
+def test_time_filter():
+    """测试全量快照二分过滤和子视图过滤结果一致，没有创建时间的进程按需保留"""
+    print("\n=== 时间过滤测试 ===")
+    snapshot = ProcessSnapshot.from_records(RECORDS)
+    assert list(snapshot.created_between(BASE + 300, BASE + 1200)) == [1, 2, 3]
+    assert list(snapshot.created_between(BASE + 300, keep_unknown=False)) == [1, 2]
+    assert list(snapshot.created_between(until=BASE)) == [0, 3]
+
+    view = snapshot.view()
+    assert [r["pid"] for r in view.created_between(BASE + 300, BASE + 900).records()] == [20, 40]
+    bash = view.where(lambda s, i: s.name(i) == "bash")
+    assert bash.names() == ["bash"]
+    assert [r["pid"] for r in bash.created_between(since=BASE + 900).records()] == [30]
+    print("✓ 时间窗口和视图过滤正确")
+
+    # 追加进程后重新排序
+    snapshot.append(50, 1, "nc", "root", "nc -l", BASE + 60)
+    assert list(snapshot.created_between(BASE + 30, BASE + 90, keep_unknown=False)) == [4]
+    print("✓ 追加后重新生成时间顺序")
+
+
+def test_render_and_decode():
+    """测试渲染缓存与登记，以及从每种输出格式重建快照"""
+    print("\n=== 渲染与重建测试 ===")
+    snapshot = ProcessSnapshot.from_records(RECORDS)
+    view = snapshot.view()
+    expected = view.records()
+    for fmt in OUTPUT_FORMATS:
+        text = view.render(output_format=fmt)
+        assert view.render(output_format=fmt) is text
+        assert snapshot_registry.resolve(text) is view
+        assert ProcessSnapshot.from_output(text).view().records() == expected, fmt
+        print(f"✓ {fmt} 输出重建的快照一致")
+
+    # 按token预算截断的输出只重建保留的行
+    text = view.render(output_format="columnar", token_budget=60)
+    rebuilt = ProcessSnapshot.from_output(text)
+    assert 0 < len(rebuilt) < len(snapshot)
+    assert rebuilt.view().records() == expected[:len(rebuilt)]
+    print(f"✓ 截断的输出重建 {len(rebuilt)} 行")
+
+    try:
+        ProcessSnapshot.from_output('"文本"')
+        assert False, "非列表数据应抛出 ValueError"
+    except ValueError:
+        pass
+    snapshot_registry.clear()
+    assert snapshot_registry.resolve(text) is None
+
+
+if __name__ == "__main__":
+    test_columns()
+    test_time_filter()
+    test_render_and_decode()
+    print("\n=== 测试完成 ===")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程树测试
+验证父子索引和深度、已知程序的父进程异常、可疑父进程启动的 shell、孤儿 shell，
+嵌套的标记只出现在祖先的子树中，以及过滤后的视图和部分快照不会误判孤儿进程
+"""
+
+import os
+import sys
+import json
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools import security_tools
+from tools.process_snapshot import ProcessSnapshot
+from tools.process_tree import build_tree
+
+build_process_tree = getattr(security_tools.build_process_tree, "func", security_tools.build_process_tree)
+
+
+def _snapshot(rows):
+    return ProcessSnapshot.from_records(
+        {"pid": pid, "ppid": ppid, "name": name, "username": "user", "cmdline": name, "create_time": pid}
+        for pid, ppid, name in rows)
+
+
+ROWS = [
+    (4, 0, "System"),
+    (300, 4, "smss.exe"),
+    (500, 300, "wininit.exe"),
+    (600, 500, "services.exe"),
+    (700, 600, "lsass.exe"),          # 父进程异常：应由 wininit.exe 启动
+    (800, 600, "svchost.exe"),
+    (1000, 800, "WINWORD.EXE"),
+    (1100, 1000, "cmd.exe"),          # 文档进程启动了 shell
+    (1200, 1100, "powershell.exe"),
+    (1300, 9999, "bash"),             # 父进程已退出的孤儿 shell
+]
+
+
+def test_tree_structure():
+    """测试父子索引、根进程和深度"""
+    print("=== 进程树结构测试 ===")
+    snapshot = _snapshot(ROWS)
+    tree = build_tree(snapshot)
+    pids = snapshot.pid
+    assert [pids[i] for i in tree.roots] == [4, 1300]
+    assert [pids[i] for i in tree.children(3)] == [700, 800]
+    assert tree.depth[8] == 7 and tree.depth[9] == 0
+    print("✓ 父子索引和深度正确")
+
+
+def test_flags():
+    """测试异常父进程、可疑 shell、孤儿 shell 和嵌套标记"""
+    print("\n=== 标记测试 ===")
+    result = build_tree(_snapshot(ROWS)).analyze()
+    flagged = {entry["pid"]: entry for entry in result["flagged"]}
+    assert set(flagged) == {700, 1100, 1300}
+    assert "wininit.exe" in flagged[700]["reasons"][0]
+    assert flagged[1100]["reasons"] == ["winword.exe 启动了命令解释器"]
+    assert flagged[1100]["ancestry"][-1] == "WINWORD.EXE(1000)"
+    assert [child["pid"] for child in flagged[1100]["subtree"]["children"]] == [1200]
+    assert flagged[1300]["reasons"] == ["孤儿shell: 父进程已退出"]
+    assert result["summary"] == {"total": 10, "roots": 2, "max_depth": 7, "flagged": 3, "flagged_subtrees": 3}
+    print("✓ 异常父进程、可疑 shell 和孤儿 shell 被标记")
+
+    # 被标记进程的子树中再被标记的进程不单独输出
+    result = build_tree(_snapshot(ROWS + [(1250, 1100, "lsass.exe")])).analyze()
+    assert result["summary"]["flagged"] == 4 and result["summary"]["flagged_subtrees"] == 3
+    cmd = next(entry for entry in result["flagged"] if entry["pid"] == 1100)
+    nested = next(child for child in cmd["subtree"]["children"] if child["pid"] == 1250)
+    assert "reasons" in nested
+    print("✓ 嵌套的标记只出现在祖先的子树中")
+
+
+def test_partial_and_filtered():
+    """测试过滤后的视图按完整快照判断父进程，部分快照不判断孤儿"""
+    print("\n=== 过滤视图测试 ===")
+    snapshot = _snapshot(ROWS)
+    view = snapshot.view().where(lambda s, i: s.name(i) in ("bash", "cmd.exe"))
+    result = build_tree(snapshot, view.indices).analyze()
+    assert result["summary"]["total"] == 2
+    assert {entry["pid"] for entry in result["flagged"]} == {1100, 1300}
+
+    partial = build_tree(_snapshot([(1300, 9999, "bash")]), partial=True).analyze()
+    assert partial["flagged"] == []
+    print("✓ 过滤掉的父进程不影响判断，部分快照不误判孤儿")
+
+    # 登记的视图按完整快照判断；重新解析的输出视为部分快照
+    rendered = _snapshot(ROWS).view().render("GetProcessDetails", "json")
+    assert json.loads(build_process_tree(rendered, "json", 0))["summary"]["flagged"] == 3
+    reparsed = json.dumps(json.loads(rendered))
+    assert json.loads(build_process_tree(reparsed, "json", 0))["summary"]["flagged"] == 2
+    print("✓ BuildProcessTree 区分登记的视图和重新解析的输出")
+
+
+if __name__ == "__main__":
+    test_tree_structure()
+    test_flags()
+    test_partial_and_filtered()
+    print("\n=== 测试完成 ===")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服务快照测试
+验证服务数据的解析、快照差异，以及 delta 模式的比较基准只在分析后推进
+"""
+
+import os
+import sys
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.output_encoder import OUTPUT_FORMATS, encode_output
+from tools.service_snapshot import ServiceSnapshot, ServiceTracker, parse_services
+
+SERVICES = [
+    {"name": "EventLog", "display_name": "Windows Event Log", "state": "RUNNING", "pid": 1200,
+     "binary_path": "C:\\Windows\\System32\\svchost.exe -k LocalServiceNetworkRestricted", "start_type": "auto"},
+    {"name": "Schedule", "display_name": "Task Scheduler", "state": "RUNNING", "pid": 1400,
+     "binary_path": "C:\\Windows\\system32\\svchost.exe -k netsvcs", "start_type": "auto"},
+]
+
+SC_OUTPUT = """
+SERVICE_NAME: EventLog
+DISPLAY_NAME: Windows Event Log
+        TYPE               : 30  WIN32
+        STATE              : 4  RUNNING
+        PID                : 1200
+"""
+
+
+def test_parse_services():
+    """测试 GetServices 的每种输出格式和 sc 文本输出都解析为相同的记录"""
+    print("=== 服务数据解析测试 ===")
+    for fmt in OUTPUT_FORMATS:
+        assert parse_services(encode_output(SERVICES, fmt)) == SERVICES, fmt
+        print(f"✓ {fmt} 格式解析正确")
+
+    services = parse_services(SC_OUTPUT)
+    assert len(services) == 1
+    assert services[0]["name"] == "EventLog"
+    assert services[0]["state"] == "RUNNING" and services[0]["pid"] == 1200
+    print("✓ sc 文本输出解析正确")
+
+
+def test_snapshot_diff():
+    """测试快照差异：新增、删除和属性变化"""
+    print("\n=== 快照差异测试 ===")
+    previous = ServiceSnapshot(SERVICES)
+    current = ServiceSnapshot([dict(SERVICES[0], state="STOPPED", pid=None),
+                               {"name": "EvilSvc", "display_name": "", "state": "RUNNING", "pid": 666,
+                                "binary_path": "C:\\Temp\\evil.exe", "start_type": "auto"}])
+    delta = current.diff(previous)
+    assert [service["name"] for service in delta["added"]] == ["EvilSvc"]
+    assert [service["name"] for service in delta["removed"]] == ["Schedule"]
+    assert delta["changed"] == [{"name": "EventLog",
+                                 "changes": {"state": ["RUNNING", "STOPPED"], "pid": [1200, None]}}]
+    assert delta["summary"]["unchanged"] == 0
+
+    assert current.is_running("evilsvc")
+    assert not current.is_running("EventLog")
+    assert len(ServiceSnapshot(SERVICES).diff(None)["added"]) == 2
+    print("✓ 新增、删除和属性变化正确")
+
+
+def test_delta_commit():
+    """测试比较基准只在分析后推进：未分析时重试仍报告同样的变化，只提交待确认的快照"""
+    print("\n=== delta 提交测试 ===")
+    tracker = ServiceTracker(snapshot_file=None)
+    first = ServiceSnapshot(SERVICES)
+    assert tracker.update(first)["summary"]["added"] == 2
+    # 收集后没有分析（例如重试），下一次仍报告全部新增
+    assert tracker.update(ServiceSnapshot(SERVICES))["summary"]["added"] == 2
+    assert tracker.current() is not first
+
+    # 分析的不是待确认的快照时不提交
+    tracker.commit(first)
+    assert tracker.update(first)["summary"]["added"] == 2
+
+    tracker.commit(first)
+    delta = tracker.update(ServiceSnapshot(SERVICES))
+    assert delta["summary"]["added"] == 0 and delta["summary"]["unchanged"] == 2
+    print("✓ 分析后才推进比较基准")
+
+    # 差异输出由 load() 换回完整的待确认快照，分析工具提交它
+    text = encode_output(delta, "json")
+    snapshot = tracker.load(text)
+    assert snapshot is tracker.current() and len(snapshot) == 2
+    tracker.commit(snapshot)
+    assert tracker.current() is snapshot
+    print("✓ 差异输出对应完整快照")
+
+
+if __name__ == "__main__":
+    test_parse_services()
+    test_snapshot_diff()
+    test_delta_commit()
+    print("\n=== 测试完成 ===")
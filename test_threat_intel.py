@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线威胁情报索引测试
+验证 CSV/STIX 情报源的查询、IPv4 映射 IPv6 地址的查询，以及情报源变化后重建索引
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools.threat_intel import ThreatIntelIndex, normalize_indicator
+
+
+def _create_index(check_interval=0):
+    """在临时目录中创建情报源和索引"""
+    temp_dir = tempfile.mkdtemp()
+    feed_dir = os.path.join(temp_dir, "feeds")
+    os.makedirs(feed_dir)
+    with open(os.path.join(feed_dir, "ips.csv"), "w", encoding="utf-8") as f:
+        f.write("# 测试情报源\n")
+        f.write("value,type,severity,description\n")
+        f.write("203.0.113.7,ip,high,C2 服务器\n")
+        f.write("4444,port,medium,后门端口\n")
+    with open(os.path.join(feed_dir, "bundle.json"), "w", encoding="utf-8") as f:
+        json.dump({"objects": [
+            {"type": "indicator", "name": "恶意域名", "pattern": "[domain-name:value = 'Evil.Example.']"},
+        ]}, f)
+    index = ThreatIntelIndex(feed_dir, os.path.join(temp_dir, "intel.idx"), check_interval=check_interval)
+    return temp_dir, feed_dir, index
+
+
+def test_lookup():
+    """测试 CSV 和 STIX 情报源的批量查询"""
+    print("=== 情报查询测试 ===")
+    temp_dir, _, index = _create_index()
+    try:
+        hits = index.lookup("ip", ["203.0.113.7", "198.51.100.1"])
+        assert list(hits) == ["203.0.113.7"]
+        assert hits["203.0.113.7"][0]["description"] == "C2 服务器"
+        assert list(index.lookup("port", [4444, 443])) == [4444]
+        assert list(index.lookup("domain", ["evil.example"])) == ["evil.example"]
+        assert index.stats()["indicators"] == 3
+        print("✓ CSV 和 STIX 情报源查询正确")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_ipv4_mapped_lookup():
+    """测试 IPv4 映射的 IPv6 地址（双栈套接字上的 IPv4 对端）按 IPv4 查询"""
+    print("\n=== IPv4 映射地址测试 ===")
+    assert normalize_indicator("ip", "::ffff:203.0.113.7") == "203.0.113.7"
+    assert normalize_indicator("ip", "2001:DB8::1") == "2001:db8::1"
+    temp_dir, _, index = _create_index()
+    try:
+        hits = index.lookup("ip", ["::ffff:203.0.113.7", "::ffff:cb00:7107"])
+        assert set(hits) == {"::ffff:203.0.113.7", "::ffff:cb00:7107"}
+        print("✓ IPv4 映射地址命中 IPv4 情报")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_feed_change():
+    """测试情报源变化后重建索引，检查间隔内复用上一次的签名"""
+    print("\n=== 情报源变化测试 ===")
+    temp_dir, feed_dir, index = _create_index(check_interval=3600)
+    try:
+        assert index.lookup("ip", ["198.51.100.1"]) == {}
+        signature = index.signature()
+        with open(os.path.join(feed_dir, "more.csv"), "w", encoding="utf-8") as f:
+            f.write("198.51.100.1\n")
+        # 检查间隔内不重新读取情报源
+        assert index.signature() == signature
+        assert index.lookup("ip", ["198.51.100.1"]) == {}
+
+        index.check_interval = 0
+        assert index.signature() != signature
+        assert list(index.lookup("ip", ["198.51.100.1"])) == ["198.51.100.1"]
+        print("✓ 情报源变化后重建索引")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_lookup()
+    test_ipv4_mapped_lookup()
+    test_feed_change()
+    print("\n=== 测试完成 ===")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+时间过滤工具测试
+验证 FilterProcessesByTime 直接使用登记的快照视图或解析epoch时间的进程JSON，
+since/until 时间窗口，以及 FilterLogsByTime 按epoch过滤事件
+"""
+
+import os
+import sys
+import json
+import time
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from tools import security_tools
+from tools.process_snapshot import ProcessSnapshot
+
+filter_processes = getattr(security_tools.filter_processes_by_time, "func", security_tools.filter_processes_by_time)
+filter_logs = getattr(security_tools.filter_logs_by_time, "func", security_tools.filter_logs_by_time)
+
+NOW = time.time()
+
+PROCESSES = [
+    {"pid": 1, "ppid": 0, "name": "init", "username": "root", "cmdline": "/sbin/init", "create_time": NOW - 3 * 86400},
+    {"pid": 20, "ppid": 1, "name": "sshd", "username": "root", "cmdline": "sshd -D", "create_time": NOW - 5 * 3600},
+    {"pid": 30, "ppid": 20, "name": "nc", "username": "root", "cmdline": "nc -l 4444", "create_time": NOW - 600},
+    {"pid": 40, "ppid": 1, "name": "kworker", "username": "root", "cmdline": "", "create_time": 0},
+]
+
+
+def _pids(text):
+    return [process["pid"] for process in json.loads(text)]
+
+
+def test_filter_processes():
+    """测试 hours_back、since/until 窗口，以及快照视图和epoch JSON 两种输入"""
+    print("=== 进程时间过滤测试 ===")
+    rendered = ProcessSnapshot.from_records(PROCESSES).view().render("GetProcessDetails", "json")
+    for label, data in (("快照视图", rendered), ("epoch JSON", json.dumps(PROCESSES))):
+        assert _pids(filter_processes(data, hours_back=1)) == [30, 40], label
+        assert _pids(filter_processes(data, since="6h", until="1h")) == [20, 40], label
+        assert _pids(filter_processes(data, since=str(int(NOW - 4 * 86400)), until="2d")) == [1, 40], label
+        print(f"✓ {label}: 时间窗口正确，没有创建时间的进程保留")
+
+    assert filter_processes("不是JSON").startswith("过滤进程数据失败")
+    assert filter_processes(rendered, since="昨天").startswith("过滤进程数据失败")
+    print("✓ 无法解析的输入返回错误信息")
+
+
+def test_filter_logs():
+    """测试事件JSON列表按epoch时间窗口过滤"""
+    print("\n=== 日志时间过滤测试 ===")
+    events = [{"epoch": NOW - 7200, "message": "旧"}, {"epoch": NOW - 60, "message": "新"},
+              {"message": "没有时间"}]
+    result = json.loads(filter_logs(json.dumps(events), hours_back=1))
+    assert [event["message"] for event in result] == ["新", "没有时间"]
+    result = json.loads(filter_logs(json.dumps(events), since="3h", until="1h"))
+    assert [event["message"] for event in result] == ["旧", "没有时间"]
+    print("✓ 日志按时间窗口过滤，没有时间的条目保留")
+
+
+if __name__ == "__main__":
+    test_filter_processes()
+    test_filter_logs()
+    print("\n=== 测试完成 ===")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作流依赖图调度测试
+验证模块按 dependencies/outputs 并发执行，且只接收依赖的输出
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from workflow.dag_scheduler import DagScheduler, WorkflowGraphError, build_module_graph
+
+
+def _load_default_modules():
+    config_path = os.path.join(current_dir, "config", "json", "workflows.json")
+    with open(config_path, "r", encoding="utf-8") as f:
+        return json.load(f)["default_group"]["modules"]
+
+
+def test_default_workflow_graph():
+    """测试默认工作流的依赖图结构"""
+    print("=== 默认工作流依赖图测试 ===")
+    nodes = build_module_graph(_load_default_modules())
+
+    roots = [node.name for node in nodes.values() if not node.upstream]
+    print(f"✓ 无依赖的模块: {roots}")
+    assert len(roots) == 4
+
+    integration = next(node for node in nodes.values() if node.name == "Threat Integration")
+    assert len(integration.upstream) == 4
+
+
+def test_parallel_execution_and_inputs():
+    """测试就绪模块并发执行，且每个模块只收到依赖的输出"""
+    print("\n=== 并发执行测试 ===")
+    nodes = build_module_graph(_load_default_modules())
+    received = {}
+    active = [0]
+    peak = [0]
+    lock = threading.Lock()
+
+    def execute(node, inputs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+            received[node.name] = sorted(inputs.keys())
+        return {"status": "completed", "result": node.name}
+
+    start = time.time()
+    results = DagScheduler(nodes, max_workers=4).run(execute)
+    elapsed = time.time() - start
+
+    print(f"✓ 执行了 {len(results)} 个模块，最大并发 {peak[0]}，耗时 {elapsed:.2f}s")
+    assert len(results) == len(nodes)
+    assert peak[0] == 4
+    assert received["Process Analysis"] == ["process_data"]
+    assert received["Incident Response"] == ["integrated_threats"]
+    assert received["Threat Integration"] == sorted(
+        ["process_threats", "log_threats", "service_threats", "network_threats"])
+
+
+def test_failure_skips_downstream_only():
+    """测试模块失败时只跳过其下游模块"""
+    print("\n=== 失败隔离测试 ===")
+    nodes = build_module_graph(_load_default_modules())
+    skipped = []
+
+    def execute(node, inputs):
+        if node.name == "Log Data Collection":
+            return {"status": "rejected_before_execution", "result": None}
+        return {"status": "completed", "result": node.name}
+
+    results = DagScheduler(nodes, max_workers=4).run(
+        execute, on_skip=lambda node, reason: skipped.append(node.name))
+    executed = {nodes[key].name for key in results}
+
+    print(f"✓ 被跳过的模块: {sorted(skipped)}")
+    assert "Process Analysis" in executed
+    assert "Network Analysis" in executed
+    assert sorted(skipped) == ["Incident Response", "Log Analysis", "Threat Integration"]
+
+
+def test_invalid_graphs():
+    """测试循环依赖和旧格式工作流"""
+    print("\n=== 配置校验测试 ===")
+    cyclic = [
+        {"name": "A", "dependencies": ["b"], "outputs": ["a"]},
+        {"name": "B", "dependencies": ["a"], "outputs": ["b"]},
+    ]
+    try:
+        build_module_graph(cyclic)
+        raise AssertionError("循环依赖未被检测到")
+    except WorkflowGraphError as e:
+        print(f"✓ 检测到循环依赖: {e}")
+
+    # 没有声明依赖的旧格式工作流保持线性执行
+    legacy = build_module_graph([{"name": "A"}, {"name": "B"}, {"name": "C"}])
+    assert legacy["module_2"].upstream == {"module_1"}
+    received = {}
+
+    def execute(node, inputs):
+        received[node.name] = {name: result["result"] for name, result in inputs.items()}
+        return {"status": "completed", "result": f"{node.name} 的结果"}
+
+    DagScheduler(legacy, max_workers=4).run(execute)
+    assert received["A"] == {}
+    assert received["C"] == {"B": "B 的结果"}
+    print("✓ 旧格式工作流按顺序串联，并把上一个模块的结果传给下一个模块")
+
+
+if __name__ == "__main__":
+    test_default_workflow_graph()
+    test_parallel_execution_and_inputs()
+    test_failure_skips_downstream_only()
+    test_invalid_graphs()
+    print("\n=== 测试完成 ===")
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+基线差异引擎
+把当前进程和基线进程压缩为元组后用集合运算一次性计算新增、缺失和路径变化的进程，
+并生成有长度上限的摘要报告
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from config.constants import BASELINE_REPORT_MAX_ITEMS, BASELINE_REPORT_MAX_PIDS, BASELINE_REPORT_MAX_CMDLINE
+
+
+def _compact(processes: Iterable, names: Dict[str, str]) -> Dict[str, List[tuple]]:
+    """
+    把进程字典压缩为 (pid, 路径小写, 路径, 用户名, 命令行) 元组，按小写进程名分组
+    非字典或缺少name字段的条目被忽略，原始进程名记录到 names 中
+    """
+    grouped = {}
+    for process in processes:
+        if not isinstance(process, dict):
+            continue
+        name = process.get('name')
+        if not name:
+            continue
+        key = name.lower()
+        names.setdefault(key, name)
+        path = process.get('path') or None
+        grouped.setdefault(key, []).append((
+            process.get('pid'),
+            path.lower() if path else None,
+            path,
+            process.get('username'),
+            process.get('cmdline') or '',
+        ))
+    return grouped
+
+
+class BaselineDiff:
+    """基线比较的结构化结果"""
+
+    def __init__(self, added: Dict[str, List[tuple]], removed: List[str],
+                 path_changed: Dict[str, tuple], names: Dict[str, str],
+                 total_current: int, total_baseline: int, whitelisted: int):
+        # 不在基线中的进程: {小写名: [进程元组]}
+        self.added = added
+        # 基线中有但当前没有运行的进程名
+        self.removed = removed
+        # 路径与基线不一致的进程: {小写名: (基线路径, [进程元组])}
+        self.path_changed = path_changed
+        # 小写名 -> 原始进程名
+        self.names = names
+        self.total_current = total_current
+        self.total_baseline = total_baseline
+        self.whitelisted = whitelisted
+
+    @property
+    def suspicious_count(self) -> int:
+        """异常进程实例数（新增 + 路径变化）"""
+        return (sum(len(items) for items in self.added.values()) +
+                sum(len(items) for _, items in self.path_changed.values()))
+
+    def is_clean(self) -> bool:
+        return not self.added and not self.path_changed
+
+    def _process_entry(self, key: str, items: List[tuple]) -> Dict:
+        pids = [item[0] for item in items]
+        entry = {
+            "name": self.names.get(key, key),
+            "count": len(items),
+            "pids": pids[:BASELINE_REPORT_MAX_PIDS],
+        }
+        first = items[0]
+        if first[2]:
+            entry["path"] = first[2]
+        if first[3]:
+            entry["username"] = first[3]
+        if first[4]:
+            entry["cmdline"] = first[4][:BASELINE_REPORT_MAX_CMDLINE]
+        return entry
+
+    def to_dict(self, max_items: int = BASELINE_REPORT_MAX_ITEMS) -> Dict:
+        """结构化结果，每一类最多保留 max_items 个进程名"""
+        added_keys = sorted(self.added)
+        changed_keys = sorted(self.path_changed)
+        path_changed = []
+        for key in changed_keys[:max_items]:
+            baseline_path, items = self.path_changed[key]
+            entry = self._process_entry(key, items)
+            entry["baseline_path"] = baseline_path
+            entry["current_path"] = items[0][2]
+            path_changed.append(entry)
+
+        return {
+            "summary": {
+                "total_current": self.total_current,
+                "total_baseline": self.total_baseline,
+                "whitelisted": self.whitelisted,
+                "suspicious": self.suspicious_count,
+                "added_names": len(added_keys),
+                "path_changed_names": len(changed_keys),
+                "removed_names": len(self.removed),
+            },
+            "added": [self._process_entry(key, self.added[key]) for key in added_keys[:max_items]],
+            "path_changed": path_changed,
+            "removed": self.removed[:max_items],
+            "truncated": (len(added_keys) > max_items or len(changed_keys) > max_items or
+                          len(self.removed) > max_items),
+        }
+
+    def render(self, max_items: int = BASELINE_REPORT_MAX_ITEMS) -> str:
+        """生成有长度上限的文本报告"""
+        result = self.to_dict(max_items)
+        summary = result["summary"]
+
+        if self.is_clean():
+            report = "未发现异常进程，所有进程均符合基线要求"
+            if self.removed:
+                report += f"\n基线中有 {len(self.removed)} 个进程当前未运行: {', '.join(result['removed'])}"
+                if len(self.removed) > max_items:
+                    report += f" 等（另有 {len(self.removed) - max_items} 个未列出）"
+            return report
+
+        report = (f"发现 {summary['suspicious']} 个异常进程"
+                  f"（当前 {summary['total_current']} 个进程，基线 {summary['total_baseline']} 个，"
+                  f"白名单跳过 {summary['whitelisted']} 个）:\n\n")
+
+        index = 0
+        for entry in result["added"]:
+            index += 1
+            report += self._render_entry(index, entry, "不在基线中的进程")
+        for entry in result["path_changed"]:
+            index += 1
+            report += self._render_entry(index, entry, "进程路径与基线不一致")
+            report += f"   基线路径: {entry['baseline_path']}\n"
+            report += f"   当前路径: {entry['current_path']}\n"
+
+        omitted = (summary["added_names"] - len(result["added"]) +
+                   summary["path_changed_names"] - len(result["path_changed"]))
+        if omitted > 0:
+            report += f"\n... 另有 {omitted} 个异常进程名未列出\n"
+
+        if self.removed:
+            report += f"\n基线中有 {len(self.removed)} 个进程当前未运行: {', '.join(result['removed'])}\n"
+            if len(self.removed) > max_items:
+                report += f"... 另有 {len(self.removed) - max_items} 个未列出\n"
+
+        return report
+
+    @staticmethod
+    def _render_entry(index: int, entry: Dict, reason: str) -> str:
+        pids = ", ".join(str(pid) for pid in entry["pids"])
+        if entry["count"] > len(entry["pids"]):
+            pids += f" 等共 {entry['count']} 个实例"
+        text = f"{index}. 进程名: {entry['name']} (PID: {pids})\n"
+        text += f"   原因: {reason}\n"
+        if entry.get("username"):
+            text += f"   用户: {entry['username']}\n"
+        if entry.get("cmdline"):
+            text += f"   命令行: {entry['cmdline']}\n"
+        return text
+
+
+def diff_processes(current: Iterable, baseline: Iterable,
+                   whitelisted: Optional[Iterable[str]] = None) -> BaselineDiff:
+    """
+    计算当前进程和基线进程的差异
+
+    参数:
+        current: 当前进程字典列表
+        baseline: 基线进程字典列表
+        whitelisted: 白名单中的进程名（与小写进程名比较）
+
+    返回:
+        BaselineDiff 结构化结果
+    """
+    names = {}
+    current_groups = _compact(current, names)
+    baseline_groups = _compact(baseline, names)
+    whitelisted = frozenset(whitelisted or ())
+
+    current_names = current_groups.keys() - whitelisted
+    skipped = current_groups.keys() & whitelisted
+    baseline_names = baseline_groups.keys()
+
+    added = {key: current_groups[key] for key in current_names - baseline_names}
+    removed = sorted(names[key] for key in baseline_names - current_groups.keys())
+
+    path_changed = {}
+    for key in current_names & baseline_names:
+        baseline_path = baseline_groups[key][0][1]
+        if baseline_path is None:
+            continue
+        mismatched = [item for item in current_groups[key] if item[1] and item[1] != baseline_path]
+        if mismatched:
+            path_changed[key] = (baseline_groups[key][0][2], mismatched)
+
+    return BaselineDiff(
+        added=added,
+        removed=removed,
+        path_changed=path_changed,
+        names=names,
+        total_current=sum(len(items) for items in current_groups.values()),
+        total_baseline=sum(len(items) for items in baseline_groups.values()),
+        whitelisted=sum(len(current_groups[key]) for key in skipped),
+    )
@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""
+系统数据收集器
+进程、网络连接、服务、安全事件的收集以及终止进程、封禁IP等操作统一通过收集器接口完成：
+- WindowsCollector: 保留原来调用 sc / netstat / taskkill / netsh / PowerShell 的实现
+- LinuxCollector: 进程使用 /proc 快速扫描（或 psutil），连接使用 psutil（未安装时直接读取 /proc），服务读取 systemd 单元文件和 cgroup，
+  安全事件读取 journal（安装了 python-systemd 时）或认证日志文件，不需要启动子进程
+"""
+
+import os
+import sys
+import json
+import socket
+import signal
+import logging
+import ipaddress
+import subprocess
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config.constants import COLLECTOR_BACKEND, FAST_PROC_SCANNER, LOG_INGEST_SOURCES
+from tools.log_ingest import (
+    LogFileSource, LogIngestor, log_cursor_store, parse_journal_entry, filter_events_by_time,
+    windows_event_query, max_record_id
+)
+from tools.proc_scanner import ProcScanner, proc_scanner
+from tools.process_snapshot import ProcessSnapshot
+from tools.connection_table import format_address
+from tools.service_snapshot import parse_services, normalize_service
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    from systemd import journal as systemd_journal
+except ImportError:
+    systemd_journal = None
+
+logger = logging.getLogger(__name__)
+
+# Windows 安全日志中关注的事件ID: 登录失败、特权登录、进程创建
+WINDOWS_SECURITY_EVENT_IDS = ("4625", "4672", "4688")
+
+# Linux 认证相关的程序（syslog 标识）
+LINUX_SECURITY_PROGRAMS = (
+    "sshd", "sudo", "su", "login", "systemd-logind", "polkitd", "passwd", "useradd", "userdel",
+    "usermod", "groupadd", "chpasswd", "unix_chkpwd", "gdm-password", "lightdm",
+)
+
+# systemd 单元文件目录（按优先级）
+SYSTEMD_UNIT_DIRS = ("/etc/systemd/system", "/run/systemd/system", "/usr/lib/systemd/system", "/lib/systemd/system")
+# systemd 服务的 cgroup 目录（cgroup v2 / v1）
+SYSTEMD_CGROUP_DIRS = ("/sys/fs/cgroup/system.slice", "/sys/fs/cgroup/systemd/system.slice")
+
+# /proc/net/tcp 中的连接状态
+_TCP_STATES = {
+    "01": "ESTABLISHED", "02": "SYN_SENT", "03": "SYN_RECV", "04": "FIN_WAIT1", "05": "FIN_WAIT2",
+    "06": "TIME_WAIT", "07": "CLOSE", "08": "CLOSE_WAIT", "09": "LAST_ACK", "0A": "LISTEN", "0B": "CLOSING",
+}
+
+class SystemCollector(ABC):
+    """收集器接口：进程和连接有基于 psutil 的默认实现，服务、安全事件和响应操作由各平台实现"""
+
+    platform = "unknown"
+
+    def processes(self) -> List[Dict]:
+        """返回 [{"pid", "ppid", "name", "username", "cmdline"(列表), "create_time"(epoch秒)}]"""
+        if psutil is None:
+            raise RuntimeError("psutil 库未安装")
+        processes = []
+        for proc in psutil.process_iter(['pid', 'ppid', 'name', 'username', 'cmdline', 'create_time']):
+            try:
+                info = proc.info
+                processes.append({
+                    "pid": info["pid"],
+                    "ppid": info["ppid"] or 0,
+                    "name": info["name"],
+                    "username": info["username"],
+                    "cmdline": info["cmdline"] or [],
+                    "create_time": info["create_time"] or 0,
+                })
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+        return processes
+
+    def snapshot(self) -> ProcessSnapshot:
+        """当前进程的列式快照"""
+        return ProcessSnapshot.from_records(self.processes())
+
+    def connections(self) -> List[Dict]:
+        """返回 [{"family", "type", "local_ip", "local_port", "remote_ip", "remote_port", "status", "pid"}]，没有远程地址时为None"""
+        if psutil is None:
+            raise RuntimeError("psutil 库未安装")
+        connections = []
+        for conn in psutil.net_connections(kind='inet'):
+            connections.append({
+                'family': conn.family.name if hasattr(conn.family, 'name') else str(conn.family),
+                'type': conn.type.name if hasattr(conn.type, 'name') else str(conn.type),
+                'local_ip': conn.laddr.ip if conn.laddr else None,
+                'local_port': conn.laddr.port if conn.laddr else None,
+                'remote_ip': conn.raddr.ip if conn.raddr else None,
+                'remote_port': conn.raddr.port if conn.raddr else None,
+                'status': conn.status,
+                'pid': conn.pid
+            })
+        return connections
+
+    def connections_text(self) -> str:
+        """类似 netstat 的连接列表"""
+        lines = [f"{'Proto':<6} {'Local Address':<45} {'Foreign Address':<45} {'State':<12} PID"]
+        for conn in self.connections():
+            proto = "TCP" if conn["type"] == "SOCK_STREAM" else "UDP"
+            local = format_address(conn['local_ip'], conn['local_port'])
+            remote = format_address(conn['remote_ip'], conn['remote_port'])
+            lines.append(f"{proto:<6} {local:<45} {remote:<45} {conn['status']:<12} {conn['pid'] or ''}")
+        return "\n".join(lines)
+
+    @abstractmethod
+    def services(self) -> List[Dict]:
+        """返回 [{"name", "display_name", "state", "pid", "binary_path", "start_type"}]"""
+
+    @abstractmethod
+    def security_events(self, incremental: bool = True) -> str:
+        """GetWindowsLogs 工具的输出：安全相关事件"""
+
+    @abstractmethod
+    def terminate_process(self, process_name: str) -> str:
+        """终止指定名称的进程，返回操作结果"""
+
+    @abstractmethod
+    def block_ip(self, ip_address: str) -> str:
+        """在防火墙中阻止IP，返回操作结果"""
+
+
+class WindowsCollector(SystemCollector):
+    """Windows 收集器：服务、连接文本、事件日志和响应操作调用系统命令"""
+
+    platform = "windows"
+
+    def connections_text(self) -> str:
+        result = subprocess.run(['netstat', '-ano'], capture_output=True, text=True,
+                                encoding="utf-8", errors="ignore")
+        return str(result.stdout)
+
+    def services(self) -> List[Dict]:
+        # Win32_Service 一次给出全部字段；PowerShell 不可用时退回 sc queryex（没有程序路径和启动类型）
+        cmd = ("powershell -NoProfile -Command \"Get-CimInstance Win32_Service | "
+               "Select-Object Name,DisplayName,State,ProcessId,PathName,StartMode | ConvertTo-Json -Compress\"")
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, shell=True, encoding="utf-8", errors="ignore")
+            services = parse_services(result.stdout)
+            if services:
+                return services
+        except Exception as e:
+            logger.error(f"获取服务信息失败: {str(e)}")
+        result = subprocess.run(["sc", "queryex", "type=", "service", "state=", "all"], capture_output=True,
+                                text=True, encoding="utf-8", errors="ignore")
+        return parse_services(result.stdout)
+
+    def security_events(self, incremental: bool = True) -> str:
+        logs = []
+        for event_id in WINDOWS_SECURITY_EVENT_IDS:
+            cursor_name = f"windows_security_{event_id}"
+            cursor = log_cursor_store.get(cursor_name) if incremental else {}
+            last_record_id = cursor.get("last_record_id")
+            max_events = 50 if incremental and last_record_id is not None else 5
+            cmd = windows_event_query(event_id, last_record_id, max_events)
+            try:
+                result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
+                newest = max_record_id(result.stdout)
+                if newest is None:
+                    if incremental and last_record_id is not None:
+                        logs.append(f"事件 {event_id}: 自上次读取以来没有新事件")
+                    continue
+                logs.append(result.stdout)
+                if incremental:
+                    log_cursor_store.set(cursor_name, {"last_record_id": newest})
+            except Exception as e:
+                logger.error(f"获取事件日志失败: {str(e)}")
+        return "\n".join(logs)
+
+    def terminate_process(self, process_name: str) -> str:
+        subprocess.run(["taskkill", "/F", "/IM", process_name])
+        return f"已尝试终止进程: {process_name}"
+
+    def block_ip(self, ip_address: str) -> str:
+        rule_name = f"Block_{ip_address}"
+        subprocess.run([
+            "netsh", "advfirewall", "firewall", "add", "rule",
+            f"name={rule_name}", "dir=in", "action=block",
+            f"remoteip={ip_address}"
+        ])
+        return f"已在防火墙中阻止IP: {ip_address}"
+
+
+class LinuxCollector(SystemCollector):
+    """Linux 收集器：在进程内读取 psutil / procfs / systemd 文件，不启动子进程"""
+
+    platform = "linux"
+
+    def __init__(self, proc_root: str = "/proc"):
+        self.proc_root = proc_root
+        self.scanner = proc_scanner if proc_root == proc_scanner.proc_root else ProcScanner(proc_root)
+        # 安全事件使用独立的游标，不影响 ReadNewLogEvents 的读取位置
+        self.security_ingestor = LogIngestor(
+            [LogFileSource(f"security_{item['name']}", item["path"], item.get("format", "syslog"))
+             for item in LOG_INGEST_SOURCES],
+            log_cursor_store)
+
+    # ---------- 进程 ----------
+
+    def processes(self) -> List[Dict]:
+        # 快速扫描器直接读取 /proc；关闭或不可用时使用 psutil
+        if psutil is None or (FAST_PROC_SCANNER and ProcScanner.available(self.proc_root)):
+            return self.scanner.scan().records()
+        return super().processes()
+
+    def snapshot(self) -> ProcessSnapshot:
+        if psutil is None or (FAST_PROC_SCANNER and ProcScanner.available(self.proc_root)):
+            return ProcessSnapshot.from_columns(self.scanner.scan())
+        return super().snapshot()
+
+    # ---------- 网络连接 ----------
+
+    def connections(self) -> List[Dict]:
+        if psutil is not None:
+            return super().connections()
+        return self._proc_connections()
+
+    def _socket_owners(self) -> Dict[str, int]:
+        """socket inode -> pid"""
+        owners = {}
+        for entry in os.listdir(self.proc_root):
+            if not entry.isdigit():
+                continue
+            fd_dir = os.path.join(self.proc_root, entry, "fd")
+            try:
+                for fd in os.listdir(fd_dir):
+                    try:
+                        target = os.readlink(os.path.join(fd_dir, fd))
+                    except OSError:
+                        continue
+                    if target.startswith("socket:["):
+                        owners[target[8:-1]] = int(entry)
+            except OSError:
+                continue
+        return owners
+
+    @staticmethod
+    def _decode_address(value: str, family: int) -> tuple:
+        """解析 /proc/net 中的 "地址:端口"（十六进制），返回 (ip, port)"""
+        host, port = value.split(":")
+        raw = bytes.fromhex(host)
+        # /proc/net 中地址按32位字以主机字节序存储
+        raw = b"".join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4)) if sys.byteorder == "little" else raw
+        return socket.inet_ntop(family, raw), int(port, 16)
+
+    def _proc_connections(self) -> List[Dict]:
+        owners = self._socket_owners()
+        connections = []
+        for proto, family, sock_type in (("tcp", socket.AF_INET, "SOCK_STREAM"), ("tcp6", socket.AF_INET6, "SOCK_STREAM"),
+                                         ("udp", socket.AF_INET, "SOCK_DGRAM"), ("udp6", socket.AF_INET6, "SOCK_DGRAM")):
+            path = os.path.join(self.proc_root, "net", proto)
+            try:
+                with open(path, "r") as f:
+                    next(f, None)
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) < 10:
+                            continue
+                        local_ip, local_port = self._decode_address(parts[1], family)
+                        remote_ip, remote_port = self._decode_address(parts[2], family)
+                        connected = remote_port != 0
+                        connections.append({
+                            'family': "AF_INET" if family == socket.AF_INET else "AF_INET6",
+                            'type': sock_type,
+                            'local_ip': local_ip,
+                            'local_port': local_port,
+                            'remote_ip': remote_ip if connected else None,
+                            'remote_port': remote_port if connected else None,
+                            'status': _TCP_STATES.get(parts[3], "NONE") if sock_type == "SOCK_STREAM" else "NONE",
+                            'pid': owners.get(parts[9]),
+                        })
+            except (FileNotFoundError, PermissionError):
+                continue
+        return connections
+
+    # ---------- 服务 ----------
+
+    def _cgroup_dir(self) -> Optional[str]:
+        for directory in SYSTEMD_CGROUP_DIRS:
+            if os.path.isdir(directory):
+                return directory
+        return None
+
+    @staticmethod
+    def _unit_info(path: str) -> tuple:
+        """单元文件中的 (Description, ExecStart 的程序路径)"""
+        description, binary_path = "", None
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    if line.startswith("Description=") and not description:
+                        description = line.split("=", 1)[1].strip()
+                    elif line.startswith("ExecStart=") and binary_path is None:
+                        # 去掉 ExecStart 的特殊前缀（-、@、:、+、!）
+                        command = line.split("=", 1)[1].strip().lstrip("-@:+!")
+                        binary_path = command.split()[0] if command else None
+        except OSError:
+            pass
+        return description, binary_path
+
+    @staticmethod
+    def _enabled_units() -> set:
+        """被某个 target 的 .wants/.requires 目录引用（已启用）的服务"""
+        enabled = set()
+        try:
+            entries = os.listdir(SYSTEMD_UNIT_DIRS[0])
+        except OSError:
+            return enabled
+        for entry in entries:
+            if entry.endswith((".wants", ".requires")):
+                try:
+                    enabled.update(os.listdir(os.path.join(SYSTEMD_UNIT_DIRS[0], entry)))
+                except OSError:
+                    continue
+        return enabled
+
+    def services(self) -> List[Dict]:
+        units = {}
+        for directory in SYSTEMD_UNIT_DIRS:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                # 模板单元（name@.service）本身不是服务实例
+                if name.endswith(".service") and not name.endswith("@.service") and name not in units:
+                    units[name] = os.path.join(directory, name)
+
+        cgroup_dir = self._cgroup_dir()
+        # 运行中的服务 -> 主进程（cgroup 中的第一个进程）
+        running = {}
+        if cgroup_dir:
+            for name in os.listdir(cgroup_dir):
+                if not name.endswith(".service"):
+                    continue
+                try:
+                    with open(os.path.join(cgroup_dir, name, "cgroup.procs"), "r") as f:
+                        pids = f.read().split()
+                    if pids:
+                        running[name] = int(pids[0])
+                except (OSError, ValueError):
+                    continue
+            # 实例化的模板服务和临时服务只出现在 cgroup 中
+            for name in running.keys() - units.keys():
+                units[name] = None
+
+        if not units:
+            return self._sysv_services()
+
+        enabled = self._enabled_units()
+        services = []
+        for name in sorted(units):
+            path = units[name]
+            masked = path is not None and os.path.realpath(path) == os.devnull
+            description, binary_path = self._unit_info(path) if path and not masked else ("", None)
+            services.append(normalize_service({
+                "name": name[:-len(".service")],
+                "display_name": description,
+                "state": "RUNNING" if name in running else "STOPPED",
+                "pid": running.get(name),
+                "binary_path": binary_path,
+                "start_type": "masked" if masked else "enabled" if name in enabled else "manual",
+            }))
+        return services
+
+    def _sysv_services(self) -> List[Dict]:
+        """没有 systemd 时按 /etc/init.d 脚本和 /run 下的 pid 文件判断"""
+        services = []
+        try:
+            names = sorted(os.listdir("/etc/init.d"))
+        except OSError:
+            return services
+        for name in names:
+            state, pid = "STOPPED", None
+            try:
+                with open(f"/run/{name}.pid", "r") as f:
+                    pid = int(f.read().strip())
+                if os.path.exists(os.path.join(self.proc_root, str(pid))):
+                    state = "RUNNING"
+            except (OSError, ValueError):
+                pass
+            services.append(normalize_service({
+                "name": name, "state": state, "pid": pid if state == "RUNNING" else None,
+                "binary_path": os.path.join("/etc/init.d", name),
+            }))
+        return services
+
+    # ---------- 安全事件 ----------
+
+    def security_events(self, incremental: bool = True) -> str:
+        if systemd_journal is not None:
+            events = self._journal_events(incremental)
+        else:
+            if incremental:
+                events = self.security_ingestor.iter_new_events()
+            else:
+                # 不使用游标，读取最近24小时
+                since = (datetime.now() - timedelta(hours=24)).timestamp()
+                events = filter_events_by_time(
+                    (event for source in self.security_ingestor.available_sources()
+                     for event in source.read_new({})), since)
+            events = [event for event in events if event.get("program") in LINUX_SECURITY_PROGRAMS]
+
+        if not events:
+            return "自上次读取以来没有新的认证事件" if incremental else "没有找到认证事件"
+        for event in events:
+            event.pop("epoch", None)
+        return json.dumps(events, ensure_ascii=False, indent=2)
+
+    def _journal_events(self, incremental: bool) -> List[Dict]:
+        """通过 python-systemd 读取 journal 中认证程序的事件"""
+        cursor_name = "security_journal"
+        reader = systemd_journal.Reader()
+        for program in LINUX_SECURITY_PROGRAMS:
+            reader.add_match(SYSLOG_IDENTIFIER=program)
+        cursor = log_cursor_store.get(cursor_name).get("last_record_id") if incremental else None
+        if cursor:
+            reader.seek_cursor(cursor)
+            reader.get_next()  # 跳过上次读取的最后一条
+        else:
+            reader.seek_realtime(datetime.now() - timedelta(hours=24))
+
+        events, last_cursor = [], cursor
+        for entry in reader:
+            realtime = entry.get("__REALTIME_TIMESTAMP")
+            raw = {
+                "__REALTIME_TIMESTAMP": int(realtime.timestamp() * 1_000_000) if realtime else None,
+                "__CURSOR": entry.get("__CURSOR"),
+                "MESSAGE": entry.get("MESSAGE"),
+                "_HOSTNAME": entry.get("_HOSTNAME"),
+                "SYSLOG_IDENTIFIER": entry.get("SYSLOG_IDENTIFIER"),
+                "_PID": entry.get("_PID"),
+                "PRIORITY": entry.get("PRIORITY"),
+            }
+            events.append(parse_journal_entry(raw, "journal"))
+            last_cursor = raw["__CURSOR"] or last_cursor
+        if incremental and last_cursor:
+            log_cursor_store.set(cursor_name, {"last_record_id": last_cursor})
+        return events
+
+    # ---------- 响应操作 ----------
+
+    def terminate_process(self, process_name: str) -> str:
+        killed = []
+        for proc in self.processes():
+            if proc["name"] == process_name and proc["pid"] != os.getpid():
+                try:
+                    os.kill(proc["pid"], signal.SIGKILL)
+                    killed.append(proc["pid"])
+                except (ProcessLookupError, PermissionError) as e:
+                    logger.error(f"终止进程 {proc['pid']} 失败: {str(e)}")
+        if not killed:
+            return f"未找到可终止的进程: {process_name}"
+        return f"已终止进程 {process_name}（PID: {', '.join(map(str, killed))}）"
+
+    def block_ip(self, ip_address: str) -> str:
+        # 防火墙规则只能通过 iptables/nft 修改，这里保留子进程调用
+        address = ipaddress.ip_address(ip_address)
+        command = "ip6tables" if address.version == 6 else "iptables"
+        result = subprocess.run([command, "-I", "INPUT", "-s", str(address), "-j", "DROP"],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            family = "ip6" if address.version == 6 else "ip"
+            result = subprocess.run(["nft", "add", "rule", "inet", "filter", "input",
+                                     family, "saddr", str(address), "drop"], capture_output=True, text=True)
+        if result.returncode != 0:
+            return f"阻止IP失败: {result.stderr.strip()}"
+        return f"已在防火墙中阻止IP: {ip_address}"
+
+
+def create_collector(backend: str = COLLECTOR_BACKEND) -> SystemCollector:
+    """
+    创建收集器
+
+    Args:
+        backend: "auto"（按当前系统选择）、"windows" 或 "linux"
+    """
+    if backend == "auto":
+        backend = "windows" if os.name == "nt" else "linux"
+    if backend == "windows":
+        return WindowsCollector()
+    if backend == "linux":
+        return LinuxCollector()
+    raise ValueError(f"不支持的收集器: {backend}")
+
+
+# 全局实例
+system_collector = create_collector()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+网络连接表
+收集器直接给出结构化的 IP/端口字段，按 (pid, 远程IP, 远程端口, 状态) 聚合为带计数的连接组，
+网络分析工具都基于连接组工作，不再拆分 "ip:port" 字符串（IPv6 地址本身包含冒号）
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tools.output_encoder import decode_output
+
+# 每个连接组最多列出的本地端口数
+MAX_LOCAL_PORTS = 10
+
+GROUP_FIELDS = ("pid", "remote_ip", "remote_port", "status")
+# 连接记录中至少包含其一的地址字段
+ADDRESS_FIELDS = ("remote_ip", "local_ip", "remote_address", "local_address")
+
+
+def format_address(ip: Optional[str], port: Optional[int]) -> str:
+    """格式化为 ip:port，IPv6 地址加方括号；没有地址时为 N/A"""
+    if not ip:
+        return "N/A"
+    if ":" in ip:
+        return f"[{ip}]:{port}"
+    return f"{ip}:{port}"
+
+
+def split_address(value) -> Tuple[Optional[str], Optional[int]]:
+    """
+    解析 "ip:port"、"[ipv6]:port" 或 "ipv6:port" 形式的地址（兼容旧的连接输出），
+    N/A 或无法解析时返回 (None, None)
+    """
+    if not value or value == "N/A":
+        return None, None
+    text = str(value).strip()
+    if text.startswith("["):
+        host, _, port = text[1:].partition("]:")
+    else:
+        host, _, port = text.rpartition(":")
+    try:
+        return host or None, int(port)
+    except ValueError:
+        return text, None
+
+
+def normalize_connection(record: Dict) -> Dict:
+    """把连接记录统一为结构化字段，兼容只有 local_address/remote_address 的旧记录"""
+    if "remote_ip" in record or "local_ip" in record:
+        return record
+    local_ip, local_port = split_address(record.get("local_address"))
+    remote_ip, remote_port = split_address(record.get("remote_address"))
+    normalized = {key: value for key, value in record.items() if key not in ("local_address", "remote_address")}
+    normalized.update({"local_ip": local_ip, "local_port": local_port,
+                       "remote_ip": remote_ip, "remote_port": remote_port})
+    return normalized
+
+
+def aggregate_connections(connections: Iterable[Dict], max_local_ports: int = MAX_LOCAL_PORTS) -> List[Dict]:
+    """
+    按 (pid, 远程IP, 远程端口, 状态) 聚合连接
+
+    Returns:
+        连接组列表（按连接数从多到少），每组包含 count 和最多 max_local_ports 个本地端口
+    """
+    groups = {}
+    for conn in connections:
+        conn = normalize_connection(conn)
+        key = (conn.get("pid"), conn.get("remote_ip"), conn.get("remote_port"), conn.get("status"))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "pid": key[0],
+                "remote_ip": key[1],
+                "remote_port": key[2],
+                "status": key[3],
+                "type": conn.get("type"),
+                "count": 0,
+                "local_ports": set(),
+            }
+        group["count"] += 1
+        if conn.get("local_port") is not None:
+            group["local_ports"].add(conn["local_port"])
+
+    result = []
+    for group in groups.values():
+        ports = sorted(group.pop("local_ports"))
+        group["local_ports"] = ports[:max_local_ports]
+        if len(ports) > max_local_ports:
+            group["local_port_count"] = len(ports)
+        result.append(group)
+    result.sort(key=lambda g: (-g["count"], g["pid"] or 0, g["remote_ip"] or "", g["remote_port"] or 0))
+    return result
+
+
+def summarize_groups(groups: List[Dict]) -> Dict:
+    by_status = {}
+    for group in groups:
+        status = group.get("status") or "NONE"
+        by_status[status] = by_status.get(status, 0) + group.get("count", 1)
+    return {
+        "connections": sum(group.get("count", 1) for group in groups),
+        "groups": len(groups),
+        "by_status": by_status,
+    }
+
+
+def load_connection_groups(connections_data) -> List[Dict]:
+    """
+    把网络分析工具的输入统一为连接组
+
+    支持 GetNetworkConnections 任意输出格式（decode_output）的聚合输出（{"summary", "groups"}）、
+    连接组列表、结构化连接列表以及旧的 local_address/remote_address 连接列表；
+    无法识别的数据抛出 ValueError，不会当作没有连接
+    """
+    data = decode_output(connections_data)
+    if isinstance(data, dict):
+        key = next((key for key in ("groups", "connections") if key in data), None)
+        if key is None:
+            raise ValueError(f"无法识别的网络连接数据，缺少 groups/connections 字段: {list(data)[:5]}")
+        data = data[key] or []
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise ValueError("无法识别的网络连接数据，期望连接或连接组列表")
+    records = data
+    if not all(any(field in item for field in ADDRESS_FIELDS) for item in records):
+        raise ValueError(f"无法识别的网络连接数据，连接记录缺少地址字段（{'/'.join(ADDRESS_FIELDS)}）")
+    if records and all("count" in item for item in records):
+        return [normalize_connection(item) for item in records]
+    return aggregate_connections(records)
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+检测规则引擎
+规则从 detection_rules.json 加载，每条规则对若干字段（进程名、命令行、服务程序路径、远程地址等）给出关键词或正则：
+- 同一字段所有规则的关键词编译为一个 Aho–Corasick 自动机，文本扫描一遍即可得到全部命中的规则
+- 同一字段所有规则的正则合并为一个正则做预筛，只有预筛命中的文本才逐条确认
+- 相同的字段文本只匹配一次（例如多个进程共用的命令行）
+规则文件修改后自动重新加载；规则文件缺失、无效或没有规则时使用内置的默认服务规则
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from config.constants import DETECTION_RULES_FILE
+
+logger = logging.getLogger(__name__)
+
+# 各类数据可匹配的字段
+RULE_FIELDS = {
+    "process": ("name", "cmdline", "username"),
+    "service": ("name", "display_name", "binary_path"),
+    "connection": ("remote_ip", "remote_port", "status"),
+}
+
+# 匹配结果中标识每条数据的字段
+ITEM_KEYS = {
+    "process": ("pid", "name"),
+    "service": ("name", "state"),
+    "connection": ("pid", "remote_ip", "remote_port"),
+}
+
+
+# 规则文件不可用时的默认规则（与 detection_rules.json 中的服务规则和后门端口规则相同）
+DEFAULT_RULES = (
+    {
+        "id": "SVC-NAME-001",
+        "description": "服务名包含可疑关键词",
+        "severity": "medium",
+        "fields": ["service.name"],
+        "keywords": ["backdoor", "trojan", "malware", "hack"],
+    },
+    {
+        "id": "SVC-PATH-001",
+        "description": "服务程序位于可写的临时/用户目录",
+        "severity": "high",
+        "fields": ["service.binary_path"],
+        "keywords": ["\\temp\\", "\\tmp\\", "\\appdata\\", "\\users\\public\\", "\\downloads\\",
+                     "/tmp/", "/var/tmp/", "/dev/shm/"],
+    },
+    {
+        "id": "NET-PORT-001",
+        "description": "连接到常见后门端口",
+        "severity": "medium",
+        "fields": ["connection.remote_port"],
+        "regex": ["^(4444|5555|6666|6667|7777|8888|9999|31337)$"],
+    },
+)
+
+
+class _Automaton:
+    """Aho–Corasick 自动机，关键词大小写不敏感，命中时输出规则ID"""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+
+    def add(self, keyword: str, rule_id: str):
+        state = 0
+        for char in keyword.lower():
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            state = next_state
+        if rule_id not in self.out[state]:
+            self.out[state] += (rule_id,)
+
+    def build(self):
+        """按广度优先计算失败指针，并把失败指针上的输出合并到当前状态"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                extra = tuple(rule for rule in self.out[self.fail[next_state]] if rule not in self.out[next_state])
+                self.out[next_state] += extra
+
+    def search(self, text: str) -> set:
+        goto, fail, out = self.goto, self.fail, self.out
+        state, found = 0, set()
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class _FieldMatcher:
+    """一个字段（例如 process.cmdline）上的全部规则"""
+
+    def __init__(self):
+        self.automaton = _Automaton()
+        self.keyword_count = 0
+        self.patterns = []
+        self.prefilter = None
+
+    def build(self):
+        self.automaton.build()
+        if self.patterns:
+            try:
+                self.prefilter = re.compile("|".join(f"(?:{pattern.pattern})" for _, pattern in self.patterns),
+                                            re.IGNORECASE)
+            except re.error:
+                # 含有内联标志等无法合并的正则时逐条匹配
+                self.prefilter = None
+
+    def match(self, text: str) -> set:
+        found = self.automaton.search(text) if self.keyword_count else set()
+        if self.patterns and (self.prefilter is None or self.prefilter.search(text)):
+            found.update(rule_id for rule_id, pattern in self.patterns if pattern.search(text))
+        return found
+
+
+class RuleSet:
+    """编译后的规则集"""
+
+    def __init__(self, rules: Iterable[Dict]):
+        self.rules = {}
+        self.matchers = {}
+        for rule in rules:
+            rule_id = str(rule.get("id") or "").strip()
+            if not rule_id:
+                logger.warning(f"忽略没有ID的检测规则: {rule}")
+                continue
+            fields = [field for field in rule.get("fields", []) if self._valid_field(field)]
+            if not fields:
+                logger.warning(f"忽略没有有效字段的检测规则: {rule_id}")
+                continue
+            patterns = []
+            for expression in rule.get("regex", []):
+                try:
+                    patterns.append(re.compile(expression, re.IGNORECASE))
+                except re.error as e:
+                    logger.warning(f"忽略检测规则 {rule_id} 中无效的正则 {expression}: {str(e)}")
+            keywords = [str(keyword) for keyword in rule.get("keywords", []) if str(keyword)]
+            for field in fields:
+                matcher = self.matchers.setdefault(field, _FieldMatcher())
+                for keyword in keywords:
+                    matcher.automaton.add(keyword, rule_id)
+                matcher.keyword_count += len(keywords)
+                matcher.patterns.extend((rule_id, pattern) for pattern in patterns)
+            self.rules[rule_id] = {
+                "id": rule_id,
+                "description": rule.get("description", ""),
+                "severity": rule.get("severity", "medium"),
+            }
+        for matcher in self.matchers.values():
+            matcher.build()
+
+    @staticmethod
+    def _valid_field(field: str) -> bool:
+        kind, _, name = str(field).partition(".")
+        return name in RULE_FIELDS.get(kind, ())
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @staticmethod
+    def _text(value) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, list):
+            return " ".join(str(item) for item in value)
+        return str(value)
+
+    def match_records(self, kind: str, records: Iterable[Dict], memo: Optional[Dict] = None) -> List[Dict]:
+        """
+        匹配一类数据，返回命中的数据 [{"kind", "item", "rules": [规则ID]}]
+
+        Args:
+            memo: (字段, 文本) -> 命中的规则ID，同一次扫描的多类数据可以共用
+        """
+        memo = {} if memo is None else memo
+        fields = [(name, self.matchers[f"{kind}.{name}"]) for name in RULE_FIELDS.get(kind, ())
+                  if f"{kind}.{name}" in self.matchers]
+        matches = []
+        if not fields:
+            return matches
+        for record in records:
+            found = set()
+            for name, matcher in fields:
+                text = self._text(record.get(name))
+                if not text:
+                    continue
+                key = (kind, name, text)
+                hits = memo.get(key)
+                if hits is None:
+                    hits = memo[key] = matcher.match(text)
+                found |= hits
+            if found:
+                matches.append({
+                    "kind": kind,
+                    "item": {key: record.get(key) for key in ITEM_KEYS[kind]},
+                    "rules": sorted(found),
+                })
+        return matches
+
+    def scan(self, processes: Iterable[Dict] = (), services: Iterable[Dict] = (),
+             connections: Iterable[Dict] = ()) -> Dict:
+        """一次扫描进程、服务和连接，返回摘要、命中的数据和命中规则的说明"""
+        memo = {}
+        matches = (self.match_records("process", processes, memo) +
+                   self.match_records("service", services, memo) +
+                   self.match_records("connection", connections, memo))
+        hit_counts = {}
+        for match in matches:
+            for rule_id in match["rules"]:
+                hit_counts[rule_id] = hit_counts.get(rule_id, 0) + 1
+        return {
+            "summary": {"rules": len(self.rules), "matched_items": len(matches), "rule_hits": hit_counts},
+            "matches": matches,
+            "rules": [self.rules[rule_id] for rule_id in sorted(hit_counts)],
+        }
+
+
+class DetectionRuleEngine:
+    """从规则文件加载规则集，文件修改后自动重新编译"""
+
+    def __init__(self, rules_file: Optional[str] = DETECTION_RULES_FILE):
+        self.rules_file = rules_file
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._ruleset = None
+        # 当前规则集是否为内置的默认规则
+        self.using_defaults = False
+
+    def _load_rules(self) -> List[Dict]:
+        if not self.rules_file:
+            return []
+        try:
+            with open(self.rules_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            rules = data.get("rules", []) if isinstance(data, dict) else data
+            return [rule for rule in rules if isinstance(rule, dict)]
+        except FileNotFoundError:
+            return []
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"读取检测规则失败: {str(e)}")
+            return []
+
+    def ruleset(self) -> RuleSet:
+        try:
+            mtime = os.stat(self.rules_file).st_mtime if self.rules_file else None
+        except OSError:
+            mtime = None
+        with self._lock:
+            if self._ruleset is None or mtime != self._mtime:
+                ruleset = RuleSet(self._load_rules())
+                self.using_defaults = not len(ruleset)
+                if self.using_defaults:
+                    logger.warning(f"检测规则文件缺失、无效或没有有效规则，使用内置默认规则: {self.rules_file}")
+                    ruleset = RuleSet(DEFAULT_RULES)
+                self._ruleset = ruleset
+                self._mtime = mtime
+            return self._ruleset
+
+    def scan(self, processes: Iterable[Dict] = (), services: Iterable[Dict] = (),
+             connections: Iterable[Dict] = ()) -> Dict:
+        return self.ruleset().scan(processes, services, connections)
+
+
+# 全局实例
+detection_rules = DetectionRuleEngine()
@@ -7,13 +7,21 @@
 import os
 import json
 import time
+import atexit
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 
+from tools.log_storage import (
+    BackgroundLogWriter, IndexedLogStore, JsonlLogStore, JSONL_SUFFIX, read_log_records, migrate_log_directory
+)
+
 logger = logging.getLogger(__name__)
 
+# 报告类型
+REPORT_TYPES = ["pre_execution", "post_execution", "analysis"]
+
 class EnhancedLogger:
     """
     增强的日志管理器
@@ -23,12 +31,20 @@ class EnhancedLogger:
     - 提供日志查询和分析功能
     """
     
-    def __init__(self, base_log_dir: str = None):
+    def __init__(self, base_log_dir: str = None, storage_format: str = "indexed", fsync: bool = False,
+                 readable_logs: bool = False, async_writes: bool = True):
         """
         初始化增强日志管理器
         
         Args:
             base_log_dir: 基础日志目录，默认为config/log
+            storage_format: 结构化日志格式
+                - "indexed": 每条记录只写一次到 segments/ 主段，groups/roles/reports 下只写偏移索引（默认）
+                - "jsonl": 在 groups/roles/reports 下各追加一份完整记录
+                - "json": 旧的数组格式
+            fsync: 每次写入后是否刷盘
+            readable_logs: 是否同时写入可读的文本日志，关闭时可用 export_readable_log 按需生成
+            async_writes: 是否由后台线程批量写入，开启后记录日志的调用不做文件I/O
         """
         if base_log_dir is None:
             # 获取项目根目录下的config/log目录
@@ -37,6 +53,10 @@ class EnhancedLogger:
         
         self.base_log_dir = Path(base_log_dir)
         self.enhanced_log_dir = self.base_log_dir / "enhanced"
+        self.storage_format = storage_format
+        self.readable_logs = readable_logs
+        self.jsonl_store = JsonlLogStore(fsync=fsync)
+        self.indexed_store = IndexedLogStore(self.enhanced_log_dir, fsync=fsync)
         
         # 创建目录结构
         self._create_directory_structure()
@@ -44,6 +64,12 @@ class EnhancedLogger:
         # 加载角色组配置
         self.work_groups = self._load_work_groups()
         
+        # 后台批量写入线程
+        self.writer = None
+        if async_writes:
+            self.writer = BackgroundLogWriter(self._write_records, name="enhanced-log-writer")
+            atexit.register(self.close)
+        
     def _create_directory_structure(self):
         """
         创建增强日志的目录结构
@@ -108,38 +134,26 @@ class EnhancedLogger:
                 "metadata": metadata or {}
             }
             
-            # 按角色组保存
-            group_dir = self.enhanced_log_dir / "groups" / group_id
-            group_dir.mkdir(exist_ok=True)
-            
-            # 角色组日志文件
-            group_log_file = group_dir / f"{report_type}_{date_str}.json"
-            self._append_json_record(group_log_file, report_record)
-            
-            # 按角色保存
-            role_dir = self.enhanced_log_dir / "roles" / role_name
-            role_dir.mkdir(exist_ok=True)
-            
-            # 角色日志文件
-            role_log_file = role_dir / f"{report_type}_{date_str}.json"
-            self._append_json_record(role_log_file, report_record)
+            stem = f"{report_type}_{date_str}"
+            views = {
+                "group_log": Path("groups") / group_id,
+                "role_log": Path("roles") / role_name,
+                "report_log": Path("reports")
+            }
             
-            # 保存到总报告目录
-            report_file = self.enhanced_log_dir / "reports" / f"{report_type}_{date_str}.json"
-            self._append_json_record(report_file, report_record)
+            files = self._store_record(date_str, report_record, views, stem)
             
             # 生成可读的文本日志
-            self._generate_readable_log(report_record, group_id, role_name)
+            if self.readable_logs:
+                readable_file = (self.enhanced_log_dir / "groups" / group_id / "readable" /
+                                 f"{report_type}_{date_str}.log")
+                self._submit(("readable", readable_file), self._format_readable(report_record))
             
             return {
                 "status": "success",
                 "message": f"角色 {role_name} 的 {report_type} 报告已记录",
                 "timestamp": time_str,
-                "files": {
-                    "group_log": str(group_log_file),
-                    "role_log": str(role_log_file),
-                    "report_log": str(report_file)
-                }
+                "files": files
             }
             
         except Exception as e:
@@ -186,23 +200,14 @@ class EnhancedLogger:
                 "metadata": metadata or {}
             }
             
-            # 按角色组保存操作日志
-            group_ops_dir = self.enhanced_log_dir / "groups" / group_id / "operations"
-            group_ops_dir.mkdir(exist_ok=True)
-            
-            group_ops_file = group_ops_dir / f"operations_{date_str}.json"
-            self._append_json_record(group_ops_file, operation_record)
-            
-            # 按角色保存操作日志
-            role_ops_dir = self.enhanced_log_dir / "roles" / role_name / "operations"
-            role_ops_dir.mkdir(exist_ok=True)
-            
-            role_ops_file = role_ops_dir / f"operations_{date_str}.json"
-            self._append_json_record(role_ops_file, operation_record)
+            stem = f"operations_{date_str}"
+            views = {
+                "group_log": Path("groups") / group_id / "operations",
+                "role_log": Path("roles") / role_name / "operations",
+                "operation_log": Path("operations")
+            }
             
-            # 保存到总操作目录
-            ops_file = self.enhanced_log_dir / "operations" / f"operations_{date_str}.json"
-            self._append_json_record(ops_file, operation_record)
+            self._store_record(date_str, operation_record, views, stem)
             
             return {
                 "status": "success",
@@ -217,10 +222,101 @@ class EnhancedLogger:
                 "message": f"记录角色操作失败: {str(e)}"
             }
     
-    def _append_json_record(self, file_path: Path, record: Dict):
+    def _store_record(self, date_str: str, record: Dict, views: Dict[str, Path], stem: str) -> Dict[str, str]:
+        """
+        把记录写入各视图
+        
+        Args:
+            date_str: 记录日期
+            record: 记录内容
+            views: {视图名: 相对增强日志目录的视图目录}
+            stem: 视图文件名（不含扩展名）
+            
+        Returns:
+            {视图名: 文件路径}
+        """
+        if self.storage_format == "indexed":
+            # 记录只写一次，各视图只登记偏移量
+            self._submit(("indexed", date_str), (record, [(view_dir, stem) for view_dir in views.values()]))
+            files = {name: str(self.indexed_store.index_path(view_dir, stem))
+                     for name, view_dir in views.items()}
+            files["segment"] = str(self.indexed_store.segment_path(date_str))
+            return files
+        
+        # 每个视图各保存一份
+        suffix = JSONL_SUFFIX if self.storage_format == "jsonl" else ".json"
+        files = {}
+        for name, view_dir in views.items():
+            file_path = self.enhanced_log_dir / view_dir / f"{stem}{suffix}"
+            self._submit(("file", file_path), record)
+            files[name] = str(file_path)
+        return files
+    
+    def _submit(self, target: tuple, payload: Any):
+        """交给后台线程写入；未开启异步写入时直接写入"""
+        if self.writer is not None:
+            self.writer.submit(target, payload)
+        else:
+            self._write_records(target, [payload])
+    
+    def _write_records(self, target: tuple, payloads: List[Any]):
+        """
+        把同一写入目标的一批记录写入文件（后台写入线程的 sink）
+        
+        Args:
+            target: ("indexed", 日期) / ("file", 文件路径) / ("readable", 文件路径)
+            payloads: 该目标的记录列表
+        """
+        kind, key = target
+        if kind == "indexed":
+            self.indexed_store.append_many(key, payloads)
+        elif kind == "file":
+            key.parent.mkdir(parents=True, exist_ok=True)
+            self._append_json_records(key, payloads)
+        elif kind == "readable":
+            try:
+                key.parent.mkdir(parents=True, exist_ok=True)
+                with open(key, 'a', encoding='utf-8') as f:
+                    f.write("".join(payloads))
+            except Exception as e:
+                logger.error(f"生成可读日志失败: {e}")
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待已提交的日志全部写入磁盘
+        
+        Returns:
+            是否在超时前完成
+        """
+        if self.writer is None:
+            return True
+        return self.writer.flush(timeout)
+    
+    def close(self):
+        """写入剩余日志并停止后台写入线程，之后的日志在调用线程中直接写入"""
+        if self.writer is not None:
+            self.writer.close()
+    
+    def get_writer_metrics(self) -> Dict:
+        """
+        获取后台写入的背压指标（队列深度、队列满次数、同步回退次数等）
+        """
+        if self.writer is None:
+            return {"running": False}
+        return self.writer.metrics()
+    
+    def _append_json_records(self, file_path: Path, new_records: List[Dict]) -> Path:
         """
-        向JSON文件追加记录
+        向日志文件追加一批记录
+        
+        jsonl 格式下一次追加多行；json 格式保留旧的读取-追加-重写方式（每批只重写一次）
+        
+        Returns:
+            实际写入的文件路径
         """
+        if self.storage_format != "json":
+            return self.jsonl_store.append_many(file_path, new_records)
+        
         records = []
         
         # 如果文件存在，读取现有记录
@@ -232,40 +328,53 @@ class EnhancedLogger:
                 records = []
         
         # 添加新记录
-        records.append(record)
+        records.extend(new_records)
         
         # 写回文件
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(records, f, ensure_ascii=False, indent=2)
+        return file_path
     
-    def _generate_readable_log(self, record: Dict, group_id: str, role_name: str):
+    def migrate_legacy_logs(self) -> int:
         """
-        生成可读的文本日志
+        把增强日志目录下旧的 .json 数组文件全部迁移为 .jsonl 文件
+        
+        Returns:
+            迁移的文件数
         """
-        try:
-            timestamp = record['timestamp']
-            date_str = timestamp.split(' ')[0]
-            
-            # 角色组可读日志
-            group_readable_dir = self.enhanced_log_dir / "groups" / group_id / "readable"
-            group_readable_dir.mkdir(exist_ok=True)
-            
-            group_readable_file = group_readable_dir / f"{record['report_type']}_{date_str}.log"
-            
-            readable_content = f"""
+        self.flush()
+        return migrate_log_directory(self.enhanced_log_dir)
+    
+    @staticmethod
+    def _format_readable(record: Dict) -> str:
+        """把报告记录格式化为可读文本"""
+        return f"""
 =================================================================
-【{role_name} - {record['report_type']}】- {timestamp}
+【{record.get('role_name')} - {record.get('report_type')}】- {record.get('timestamp')}
 =================================================================
-{record['content']}
+{record.get('content')}
 =================================================================
 
 """
+    
+    def export_readable_log(self, group_id: str, date: str = None) -> str:
+        """
+        按需从结构化记录生成角色组的可读文本日志
+        
+        Args:
+            group_id: 角色组ID
+            date: 日期 (YYYY-MM-DD)，默认为今天
             
-            with open(group_readable_file, 'a', encoding='utf-8') as f:
-                f.write(readable_content)
-                
-        except Exception as e:
-            logger.error(f"生成可读日志失败: {e}")
+        Returns:
+            可读文本
+        """
+        return "".join(self._format_readable(record) for record in self.get_group_reports(group_id, date))
+    
+    def _read_view(self, view_dir: Path, stem: str) -> List[Dict]:
+        """读取一个视图下的记录：旧的 .json/.jsonl 文件在前，索引指向的记录在后"""
+        records = read_log_records(self.enhanced_log_dir / view_dir, stem)
+        records.extend(self.indexed_store.read_view(view_dir, stem))
+        return records
     
     def get_group_reports(self, group_id: str, date: str = None) -> List[Dict]:
         """
@@ -281,22 +390,21 @@ class EnhancedLogger:
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
         
+        # 先写入后台队列中尚未落盘的记录
+        self.flush()
+        
         reports = []
-        group_dir = self.enhanced_log_dir / "groups" / group_id
+        view_dir = Path("groups") / group_id
         
-        if not group_dir.exists():
+        if not (self.enhanced_log_dir / view_dir).exists():
             return reports
         
-        # 查找所有报告类型的文件
-        for report_type in ["pre_execution", "post_execution", "analysis"]:
-            report_file = group_dir / f"{report_type}_{date}.json"
-            if report_file.exists():
-                try:
-                    with open(report_file, 'r', encoding='utf-8') as f:
-                        file_reports = json.load(f)
-                        reports.extend(file_reports)
-                except Exception as e:
-                    logger.error(f"读取报告文件失败: {e}")
+        # 通过索引读取各报告类型的记录（同时兼容旧的 .json 和 .jsonl 文件）
+        for report_type in REPORT_TYPES:
+            try:
+                reports.extend(self._read_view(view_dir, f"{report_type}_{date}"))
+            except Exception as e:
+                logger.error(f"读取报告文件失败: {e}")
         
         # 按时间排序
         reports.sort(key=lambda x: x.get('timestamp', ''))
@@ -316,22 +424,21 @@ class EnhancedLogger:
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
         
+        # 先写入后台队列中尚未落盘的记录
+        self.flush()
+        
         reports = []
-        role_dir = self.enhanced_log_dir / "roles" / role_name
+        view_dir = Path("roles") / role_name
         
-        if not role_dir.exists():
+        if not (self.enhanced_log_dir / view_dir).exists():
             return reports
         
-        # 查找所有报告类型的文件
-        for report_type in ["pre_execution", "post_execution", "analysis"]:
-            report_file = role_dir / f"{report_type}_{date}.json"
-            if report_file.exists():
-                try:
-                    with open(report_file, 'r', encoding='utf-8') as f:
-                        file_reports = json.load(f)
-                        reports.extend(file_reports)
-                except Exception as e:
-                    logger.error(f"读取报告文件失败: {e}")
+        # 通过索引读取各报告类型的记录（同时兼容旧的 .json 和 .jsonl 文件）
+        for report_type in REPORT_TYPES:
+            try:
+                reports.extend(self._read_view(view_dir, f"{report_type}_{date}"))
+            except Exception as e:
+                logger.error(f"读取报告文件失败: {e}")
         
         # 按时间排序
         reports.sort(key=lambda x: x.get('timestamp', ''))
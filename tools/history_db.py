@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+部门历史查询库
+把部门历史同步写入本地SQLite，按部门、时间和类型建立索引，内容建立FTS5全文索引，
+用于只查询需要的时间范围或关键字，而不必加载整个历史
+"""
+
+import os
+import re
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from config.constants import DEPARTMENT_HISTORY_DB, DEPARTMENT_HISTORY_MAX_RECORDS
+
+logger = logging.getLogger(__name__)
+
+# 相对时间，例如 30m、6h、2d、1w
+_RELATIVE_TIME = re.compile(r"^\s*(\d+)\s*([smhdw])\s*$", re.IGNORECASE)
+_TIME_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+# trigram 分词器要求查询词至少3个字符
+_TRIGRAM_MIN_LENGTH = 3
+
+
+def parse_time_bound(value: Optional[str]) -> Optional[str]:
+    """
+    把时间参数转换为与记录 timestamp（datetime.isoformat()）可比较的字符串
+
+    支持相对时间（30m、6h、2d、1w，表示距现在多久之前）和
+    "YYYY-MM-DD"、"YYYY-MM-DD HH:MM:SS"、ISO 格式的绝对时间
+    """
+    if not value:
+        return None
+    match = _RELATIVE_TIME.match(value)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2).lower()
+        return (datetime.now() - timedelta(**{_TIME_UNITS[unit]: amount})).isoformat()
+    try:
+        return datetime.fromisoformat(value.strip()).isoformat()
+    except ValueError:
+        raise ValueError(f"无法解析的时间: {value}")
+
+
+def parse_epoch_bound(value) -> Optional[float]:
+    """与 parse_time_bound 相同，另外接受epoch秒，返回epoch秒"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(parse_time_bound(value)).timestamp()
+
+
+class HistoryDatabase:
+    """
+    部门历史SQLite索引
+    - history 表按 (department, timestamp) 和 type 建立索引
+    - history_fts 为内容的FTS5索引（优先 trigram 分词以支持中文子串），不可用时退回 LIKE 查询
+    - 每个部门与分段存储一样最多保留 max_records 条记录
+    """
+
+    def __init__(self, db_path: str = DEPARTMENT_HISTORY_DB, max_records: int = DEPARTMENT_HISTORY_MAX_RECORDS):
+        self.db_path = db_path
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self._conn = None
+        self.fts_tokenizer = None
+        self._synced_departments = set()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY,
+                    analysis_id TEXT UNIQUE,
+                    department TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    type TEXT,
+                    content TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_history_department_time ON history(department, timestamp);
+                CREATE INDEX IF NOT EXISTS idx_history_time ON history(timestamp);
+                CREATE INDEX IF NOT EXISTS idx_history_type ON history(type, timestamp);
+            """)
+            self.fts_tokenizer = self._create_fts(conn)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _create_fts(conn: sqlite3.Connection) -> Optional[str]:
+        """创建全文索引及同步触发器，返回使用的分词器；FTS5不可用时返回None"""
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'history_fts'").fetchone()
+        if row is not None:
+            return "trigram" if "trigram" in row[0] else "unicode61"
+
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE history_fts USING fts5("
+                    f"content, content='history', content_rowid='id', tokenize='{tokenizer}')")
+            except sqlite3.OperationalError:
+                continue
+            conn.executescript("""
+                CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+                    INSERT INTO history_fts(rowid, content) VALUES (new.id, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+                    INSERT INTO history_fts(history_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                END;
+                INSERT INTO history_fts(history_fts) VALUES ('rebuild');
+            """)
+            return tokenizer
+
+        logger.warning("SQLite不支持FTS5，部门历史全文查询使用LIKE")
+        return None
+
+    def insert(self, department: str, record: Dict):
+        """写入一条历史记录（analysis_id 已存在时忽略）"""
+        self.insert_many(department, [record])
+
+    def insert_many(self, department: str, records: Iterable[Dict]):
+        with self._lock:
+            self._insert_locked(department, records)
+
+    def _insert_locked(self, department: str, records: Iterable[Dict]):
+        """写入记录，调用方持有 _lock"""
+        rows = [(record.get("analysis_id"), department, record.get("timestamp") or datetime.now().isoformat(),
+                 record.get("type"), record.get("content"))
+                for record in records if isinstance(record, dict)]
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR IGNORE INTO history (analysis_id, department, timestamp, type, content) "
+            "VALUES (?, ?, ?, ?, ?)", rows)
+        # 删除超出保留条数的旧记录
+        conn.execute(
+            "DELETE FROM history WHERE department = ? AND id NOT IN ("
+            "SELECT id FROM history WHERE department = ? ORDER BY timestamp DESC, id DESC LIMIT ?)",
+            (department, department, self.max_records))
+        conn.commit()
+
+    def sync_department(self, department: str, records_fn):
+        """
+        首次查询某部门时，把分段存储中已有的记录导入数据库
+
+        Args:
+            records_fn: 返回该部门全部保留记录的函数
+
+        检查、导入和标记在同一把锁内完成，并发查询不会重复导入，也不会覆盖 mark_unsynced
+        """
+        with self._lock:
+            if department in self._synced_departments:
+                return
+            self._insert_locked(department, records_fn())
+            self._synced_departments.add(department)
+
+    def mark_unsynced(self, department: str):
+        """写入失败后，下次查询前重新从分段存储同步该部门"""
+        with self._lock:
+            self._synced_departments.discard(department)
+
+    def query(self, department: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, match: Optional[str] = None,
+              record_type: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """
+        查询历史记录
+
+        Args:
+            department: 部门名称，为空时查询全部部门
+            since/until: 时间范围，见 parse_time_bound
+            match: 内容关键字
+            record_type: 记录类型，例如 process_analysis
+            limit: 最多返回的记录数（最新的在前）
+        """
+        conditions, params = [], []
+        if department:
+            conditions.append("h.department = ?")
+            params.append(department)
+        since, until = parse_time_bound(since), parse_time_bound(until)
+        if since:
+            conditions.append("h.timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("h.timestamp <= ?")
+            params.append(until)
+        if record_type:
+            conditions.append("h.type = ?")
+            params.append(record_type)
+
+        with self._lock:
+            conn = self._connection()
+            if match:
+                if self._use_fts(match):
+                    conditions.append("h.id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)")
+                    # 作为短语查询，避免关键字中的FTS语法字符
+                    params.append('"' + match.replace('"', '""') + '"')
+                else:
+                    conditions.append("h.content LIKE ? ESCAPE '\\'")
+                    escaped = match.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                    params.append(f"%{escaped}%")
+
+            sql = (f"SELECT h.analysis_id, h.department, h.timestamp, h.type, h.content FROM history h" +
+                   (" WHERE " + " AND ".join(conditions) if conditions else "") +
+                   " ORDER BY h.timestamp DESC LIMIT ?")
+            params.append(max(1, limit))
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def _use_fts(self, match: str) -> bool:
+        if self.fts_tokenizer is None:
+            return False
+        if self.fts_tokenizer == "trigram":
+            return len(match) >= _TRIGRAM_MIN_LENGTH
+        return True
+
+
+# 全局实例
+history_db = HistoryDatabase()
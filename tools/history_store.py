@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+部门历史分段存储
+每个部门的历史记录追加写入固定条数的分段文件，环形索引记录每条记录的位置：
+- 追加一条记录只写一次分段文件和一个索引槽，与历史长度无关
+- 保留条数通过整段删除旧分段文件来控制
+- 读取最近的记录时只按索引定位需要的记录，支持分页
+"""
+
+import os
+import json
+import shutil
+import struct
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from config.constants import (
+    DEPARTMENT_HISTORY_DIR, DEPARTMENT_HISTORY_MAX_RECORDS, DEPARTMENT_HISTORY_SEGMENT_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# 旧版整文件存储的历史文件名
+LEGACY_HISTORY_FILE = "analysis_history.json"
+INDEX_FILE = "history.idx"
+SEGMENT_DIR = "segments"
+
+_MAGIC = b"HIX2"
+# 索引文件头: (魔数, 下一条记录的序号, 环形槽数, 分段大小)
+_HEADER = struct.Struct("<4sQQQ")
+# 旧版索引文件头: (下一条记录的序号, 环形槽数)，不含分段大小
+_LEGACY_HEADER = struct.Struct("<QQ")
+# 索引槽: (记录在分段文件中的偏移量, 记录长度)
+_SLOT = struct.Struct("<QQ")
+
+
+class _DepartmentHistory:
+    """单个部门的分段历史"""
+
+    def __init__(self, directory: str, max_records: int, segment_size: int):
+        self.directory = directory
+        self.segment_dir = os.path.join(directory, SEGMENT_DIR)
+        self.index_file = os.path.join(directory, INDEX_FILE)
+        self.max_records = max_records
+        self.segment_size = segment_size
+        # 保留的记录最多跨越 max_records + segment_size 条，环形索引需要覆盖这么多槽
+        self.capacity = max_records + segment_size
+        self.next_seq = 0
+        # 各部门独立加锁，不同部门可以并发读写
+        self.lock = threading.Lock()
+        # 最早仍存在的分段的起始序号
+        self.first_seq = 0
+
+        os.makedirs(self.segment_dir, exist_ok=True)
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "rb") as f:
+                header = f.read(_HEADER.size)
+            if header[:len(_MAGIC)] == _MAGIC:
+                _, self.next_seq, stored_capacity, stored_segment_size = _HEADER.unpack(header)
+            else:
+                # 旧版索引没有记录分段大小，按当前配置重建
+                self.next_seq, stored_capacity = _LEGACY_HEADER.unpack(header[:_LEGACY_HEADER.size])
+                stored_segment_size = None
+            if stored_capacity != self.capacity or stored_segment_size != self.segment_size:
+                self._rebuild_index(stored_capacity, stored_segment_size or self.segment_size)
+            segments = self._segment_numbers()
+            if segments:
+                self.first_seq = min(segments) * self.segment_size
+        else:
+            self._write_header()
+            self._migrate_legacy()
+
+    def _segment_path(self, segment_no: int) -> str:
+        return os.path.join(self.segment_dir, f"seg_{segment_no:08d}.jsonl")
+
+    def _segment_numbers(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.segment_dir):
+            if name.startswith("seg_") and name.endswith(".jsonl"):
+                try:
+                    numbers.append(int(name[4:-6]))
+                except ValueError:
+                    continue
+        return numbers
+
+    def _write_header(self):
+        mode = "r+b" if os.path.exists(self.index_file) else "wb"
+        with open(self.index_file, mode) as f:
+            f.write(self._header())
+
+    def _header(self) -> bytes:
+        return _HEADER.pack(_MAGIC, self.next_seq, self.capacity, self.segment_size)
+
+    @property
+    def oldest_seq(self) -> int:
+        """仍在保留范围内的最早序号"""
+        return max(self.first_seq, self.next_seq - self.max_records)
+
+    def append(self, record: Dict):
+        data = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        seq = self.next_seq
+        segment_no = seq // self.segment_size
+
+        fd = os.open(self._segment_path(segment_no), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            offset = os.lseek(fd, 0, os.SEEK_END)
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+        with open(self.index_file, "r+b") as f:
+            f.seek(_HEADER.size + (seq % self.capacity) * _SLOT.size)
+            f.write(_SLOT.pack(offset, len(data)))
+            self.next_seq = seq + 1
+            f.seek(0)
+            f.write(self._header())
+
+        # 开始新分段时删除已完全超出保留范围的旧分段
+        if seq % self.segment_size == 0:
+            self._drop_old_segments()
+
+    def _drop_old_segments(self):
+        first_kept = self.oldest_seq // self.segment_size
+        for segment_no in self._segment_numbers():
+            if segment_no < first_kept:
+                os.remove(self._segment_path(segment_no))
+        self.first_seq = max(self.first_seq, first_kept * self.segment_size)
+
+    def _read_slots(self, first_seq: int, last_seq: int) -> List[tuple]:
+        """读取 [first_seq, last_seq) 的索引槽"""
+        slots = []
+        with open(self.index_file, "rb") as f:
+            for seq in range(first_seq, last_seq):
+                f.seek(_HEADER.size + (seq % self.capacity) * _SLOT.size)
+                offset, length = _SLOT.unpack(f.read(_SLOT.size))
+                slots.append((seq, offset, length))
+        return slots
+
+    def read_range(self, first_seq: int, last_seq: int) -> List[Dict]:
+        """按序号读取 [first_seq, last_seq) 的记录"""
+        records = []
+        handle, handle_no = None, None
+        try:
+            for seq, offset, length in self._read_slots(first_seq, last_seq):
+                segment_no = seq // self.segment_size
+                if segment_no != handle_no:
+                    if handle:
+                        handle.close()
+                    handle_no = segment_no
+                    path = self._segment_path(segment_no)
+                    handle = open(path, "rb") if os.path.exists(path) else None
+                if handle is None:
+                    continue
+                handle.seek(offset)
+                try:
+                    records.append(json.loads(handle.read(length)))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logger.warning(f"跳过损坏的历史记录: {self.directory} #{seq}")
+        finally:
+            if handle:
+                handle.close()
+        return records
+
+    def _rebuild_index(self, old_capacity: int, old_segment_size: int):
+        """保留条数或分段大小配置变化后，从分段文件重建索引；分段大小变化时先按新的大小重写分段文件"""
+        if old_segment_size != self.segment_size:
+            self._resegment(old_segment_size)
+        old_next = self.next_seq
+        entries = []
+        first_segment = max(0, old_next - old_capacity) // self.segment_size
+        end_segment = (old_next + self.segment_size - 1) // self.segment_size
+        for segment_no in range(first_segment, end_segment):
+            path = self._segment_path(segment_no)
+            if not os.path.exists(path):
+                continue
+            offset = 0
+            seq = segment_no * self.segment_size
+            with open(path, "rb") as f:
+                for line in f:
+                    entries.append((seq, offset, len(line)))
+                    offset += len(line)
+                    seq += 1
+
+        with open(self.index_file, "wb") as f:
+            f.write(self._header())
+            f.write(b"\0" * (self.capacity * _SLOT.size))
+            for seq, offset, length in entries[-self.capacity:]:
+                f.seek(_HEADER.size + (seq % self.capacity) * _SLOT.size)
+                f.write(_SLOT.pack(offset, length))
+        logger.info(f"已重建部门历史索引: {self.directory}")
+
+    def _resegment(self, old_segment_size: int):
+        """
+        按新的分段大小重写分段文件
+        记录的分段号为 序号 // 分段大小，分段大小变化后原分段文件中的记录无法按新的分段号定位
+        """
+        tmp_dir = self.segment_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        handle, handle_no = None, None
+        try:
+            for old_no in sorted(self._segment_numbers()):
+                seq = old_no * old_segment_size
+                with open(self._segment_path(old_no), "rb") as f:
+                    for line in f:
+                        segment_no = seq // self.segment_size
+                        if segment_no != handle_no:
+                            if handle:
+                                handle.close()
+                            handle_no = segment_no
+                            handle = open(os.path.join(tmp_dir, os.path.basename(self._segment_path(segment_no))),
+                                          "ab")
+                        handle.write(line)
+                        seq += 1
+        finally:
+            if handle:
+                handle.close()
+        old_dir = self.segment_dir + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(self.segment_dir, old_dir)
+        os.replace(tmp_dir, self.segment_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        logger.info(f"已按分段大小 {self.segment_size} 重写部门历史: {self.directory}（原分段大小 {old_segment_size}）")
+
+    def _migrate_legacy(self):
+        """把旧的 analysis_history.json 导入分段存储，原文件重命名保留"""
+        legacy_file = os.path.join(self.directory, LEGACY_HISTORY_FILE)
+        if not os.path.exists(legacy_file):
+            return
+        try:
+            with open(legacy_file, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"读取旧部门历史失败 {legacy_file}: {str(e)}")
+            return
+        if isinstance(records, list):
+            for record in records[-self.max_records:]:
+                self.append(record)
+        os.replace(legacy_file, legacy_file + ".migrated")
+        logger.info(f"已迁移部门历史 {legacy_file}（{len(records)} 条记录）")
+
+
+class SegmentedHistoryStore:
+    """
+    部门历史分段存储
+    - append() 为常数时间操作
+    - 每个部门最多保留 max_records 条记录（整段删除，实际文件中可能多保留不足一段的记录）
+    - read_recent() 按从新到旧的偏移分页读取
+    - 每个部门一把锁，不同部门的读写互不阻塞
+    """
+
+    def __init__(self, base_dir: str = DEPARTMENT_HISTORY_DIR,
+                 max_records: int = DEPARTMENT_HISTORY_MAX_RECORDS,
+                 segment_size: int = DEPARTMENT_HISTORY_SEGMENT_SIZE):
+        """
+        Args:
+            base_dir: 部门历史根目录，每个部门一个子目录
+            max_records: 每个部门保留的记录数
+            segment_size: 每个分段文件的记录数
+        """
+        self.base_dir = base_dir
+        self.max_records = max_records
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        self._departments = {}
+
+    def _department(self, department: str) -> _DepartmentHistory:
+        with self._lock:
+            history = self._departments.get(department)
+            if history is None:
+                history = _DepartmentHistory(os.path.join(self.base_dir, department),
+                                             self.max_records, self.segment_size)
+                self._departments[department] = history
+            return history
+
+    def append(self, department: str, record: Dict):
+        """追加一条历史记录"""
+        history = self._department(department)
+        with history.lock:
+            history.append(record)
+
+    def count(self, department: str) -> int:
+        """保留范围内的记录数"""
+        history = self._department(department)
+        with history.lock:
+            return history.next_seq - history.oldest_seq
+
+    def read_recent(self, department: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """
+        读取最近的记录
+
+        Args:
+            department: 部门名称
+            limit: 最多返回的记录数，None 表示保留范围内的全部记录
+            offset: 跳过最新的 offset 条记录
+
+        Returns:
+            按时间从旧到新排列的记录
+        """
+        history = self._department(department)
+        with history.lock:
+            last_seq = max(history.oldest_seq, history.next_seq - max(0, offset))
+            first_seq = history.oldest_seq if limit is None else max(history.oldest_seq, last_seq - limit)
+            return history.read_range(first_seq, last_seq)
+
+    def page(self, department: str, limit: int, offset: int = 0) -> Dict:
+        """分页读取，返回记录和分页信息"""
+        total = self.count(department)
+        records = self.read_recent(department, limit, offset)
+        return {
+            "department": department,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "has_more": offset + len(records) < total,
+            "records": records,
+        }
+
+
+# 全局实例
+history_store = SegmentedHistoryStore()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+IP地址分类
+RFC1918 / RFC6890 特殊地址段和用户配置的 CIDR 允许/拒绝列表存放在按位前缀树（radix trie）中，
+查询按最长前缀匹配，耗时只与地址位数有关，与CIDR数量无关；
+一次分析中已经分类过的地址通过 memo 字典直接返回
+"""
+
+import os
+import json
+import logging
+import socket
+import ipaddress
+import threading
+from typing import Dict, Iterable, Optional
+
+from config.constants import IP_LISTS_FILE
+
+logger = logging.getLogger(__name__)
+
+# 地址类别
+PUBLIC = "public"
+ALLOW = "allow"
+DENY = "deny"
+
+# 特殊用途地址段（RFC1918、RFC6598、RFC6890 及其更新）
+SPECIAL_RANGES = {
+    "private": ["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "fc00::/7"],
+    "loopback": ["127.0.0.0/8", "::1/128"],
+    "link_local": ["169.254.0.0/16", "fe80::/10"],
+    "shared": ["100.64.0.0/10"],
+    "multicast": ["224.0.0.0/4", "ff00::/8"],
+    "documentation": ["192.0.2.0/24", "198.51.100.0/24", "203.0.113.0/24", "2001:db8::/32"],
+    "reserved": [
+        "0.0.0.0/8", "192.0.0.0/24", "198.18.0.0/15", "240.0.0.0/4", "255.255.255.255/32",
+        "::/128", "100::/64", "2001::/23",
+    ],
+}
+
+# ::ffff:0:0/96 的高96位
+_IPV4_MAPPED_PREFIX = 0xFFFF
+
+# 不属于外部地址的类别
+INTERNAL_CATEGORIES = frozenset(SPECIAL_RANGES) | {ALLOW}
+
+
+def _parse_address(ip) -> Optional[tuple]:
+    """解析为 (4 或 6, 整数地址)，IPv4 映射的 IPv6 地址按 IPv4 处理，无法解析时返回None"""
+    if not isinstance(ip, str):
+        return None
+    text = ip.split("%", 1)[0]
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, text), "big")
+    except OSError:
+        pass
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, text), "big")
+    except OSError:
+        return None
+    if value >> 32 == _IPV4_MAPPED_PREFIX:
+        return 4, value & 0xFFFFFFFF
+    return 6, value
+
+
+class _PrefixTrie:
+    """单个地址族的二进制前缀树，节点为 [0子节点, 1子节点, 类别]"""
+
+    def __init__(self, bits: int):
+        self.bits = bits
+        self.root = [None, None, None]
+        self.size = 0
+
+    def insert(self, network: int, prefix_length: int, category: str):
+        node = self.root
+        for position in range(self.bits - 1, self.bits - 1 - prefix_length, -1):
+            bit = (network >> position) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = category
+        self.size += 1
+
+    def lookup(self, address: int) -> Optional[str]:
+        """最长前缀匹配"""
+        node = self.root
+        match = node[2]
+        position = self.bits - 1
+        while position >= 0:
+            node = node[(address >> position) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                match = node[2]
+            position -= 1
+        return match
+
+
+class IPClassifier:
+    """
+    IP地址分类器
+    - 相同前缀后插入的类别覆盖先插入的：特殊地址段 < 允许列表 < 拒绝列表
+    - IPv4 映射的 IPv6 地址（::ffff:a.b.c.d）按 IPv4 分类
+    - lists_file 修改后自动重新加载
+    """
+
+    def __init__(self, lists_file: Optional[str] = IP_LISTS_FILE):
+        self.lists_file = lists_file
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._tries = None
+
+    def _build(self, lists: Dict):
+        tries = {4: _PrefixTrie(32), 6: _PrefixTrie(128)}
+        entries = [(category, cidr) for category, cidrs in SPECIAL_RANGES.items() for cidr in cidrs]
+        entries += [(ALLOW, cidr) for cidr in lists.get("allow", [])]
+        entries += [(DENY, cidr) for cidr in lists.get("deny", [])]
+        for category, cidr in entries:
+            try:
+                network = ipaddress.ip_network(str(cidr).strip(), strict=False)
+            except ValueError:
+                logger.warning(f"忽略无效的CIDR: {cidr}")
+                continue
+            tries[network.version].insert(int(network.network_address), network.prefixlen, category)
+        return tries
+
+    def _load_lists(self) -> Dict:
+        if not self.lists_file:
+            return {}
+        try:
+            with open(self.lists_file, "r", encoding="utf-8") as f:
+                lists = json.load(f)
+            return lists if isinstance(lists, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"读取IP列表失败: {str(e)}")
+            return {}
+
+    def _current_tries(self):
+        try:
+            mtime = os.stat(self.lists_file).st_mtime if self.lists_file else None
+        except OSError:
+            mtime = None
+        with self._lock:
+            if self._tries is None or mtime != self._mtime:
+                self._tries = self._build(self._load_lists())
+                self._mtime = mtime
+            return self._tries
+
+    def classify(self, ip: str, memo: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        返回地址类别（private/loopback/.../allow/deny/public），无法解析的地址返回None
+
+        Args:
+            memo: 本次分析的分类缓存
+        """
+        if memo is not None and ip in memo:
+            return memo[ip]
+        parsed = _parse_address(ip)
+        category = None
+        if parsed is not None:
+            version, value = parsed
+            category = self._current_tries()[version].lookup(value) or PUBLIC
+        if memo is not None:
+            memo[ip] = category
+        return category
+
+    def classify_many(self, ips: Iterable[str]) -> Dict[str, str]:
+        """批量分类，返回 {地址: 类别}，重复地址只分类一次"""
+        tries = self._current_tries()
+        memo = {}
+        for ip in ips:
+            if ip not in memo:
+                parsed = _parse_address(ip)
+                memo[ip] = (tries[parsed[0]].lookup(parsed[1]) or PUBLIC) if parsed is not None else None
+        return memo
+
+    @staticmethod
+    def is_external(category: Optional[str]) -> bool:
+        """公网地址和拒绝列表中的地址需要关注"""
+        return category is not None and category not in INTERNAL_CATEGORIES
+
+
+# 全局实例
+ip_classifier = IPClassifier()
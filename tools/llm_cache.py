@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存
+以 模型名 + temperature + 规范化提示词 的哈希为键，把响应保存在本地SQLite文件中，
+支持过期时间（TTL）和按最近访问时间淘汰（LRU）
+"""
+
+import os
+import re
+import time
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from config.constants import LLM_CACHE_ENABLED, LLM_CACHE_FILE, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"[ \t]+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    规范化提示词：去掉每行首尾空白、合并连续空格并删除空行
+    f-string 模板的缩进和空行变化不会影响缓存命中
+    """
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in str(prompt).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def make_cache_key(model: Optional[str], temperature: Optional[float], prompt: str) -> str:
+    """计算缓存键"""
+    payload = json.dumps([model, temperature, normalize_prompt(prompt)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def describe_llm(llm) -> tuple:
+    """从LLM对象中取出 (模型名, temperature)，取不到时为None"""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    temperature = getattr(llm, "temperature", None)
+    return (str(model) if model is not None else None,
+            float(temperature) if isinstance(temperature, (int, float)) else None)
+
+
+class LLMResponseCache:
+    """
+    LLM响应缓存
+    - 键为内容哈希，相同模型、温度和规范化后的提示词命中同一条缓存
+    - 超过 ttl 秒的条目视为过期
+    - 条目数超过 max_entries 时淘汰最久未访问的条目
+    """
+
+    def __init__(self, db_path: str = LLM_CACHE_FILE, ttl: float = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES, enabled: bool = LLM_CACHE_ENABLED):
+        """
+        Args:
+            db_path: SQLite缓存文件路径
+            ttl: 条目有效期（秒），<=0 表示永不过期
+            max_entries: 最多保留的条目数
+            enabled: 是否启用缓存，关闭时 get_or_call 总是调用LLM
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?",
+                                   (key,)).fetchone()
+                if row is None:
+                    return None
+                response, created_at = row
+                if self.ttl > 0 and now - created_at > self.ttl:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    return None
+                conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+                return response
+            finally:
+                conn.close()
+
+    def put(self, key: str, response: str, model: Optional[str] = None):
+        """写入缓存，并清理过期和超出容量的条目"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, model, response, now, now))
+                if self.ttl > 0:
+                    conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def get_or_call(self, llm, prompt: str, call_fn: Callable[[str], str], bypass: bool = False) -> str:
+        """
+        优先返回缓存的响应，未命中时调用 call_fn(prompt) 并写入缓存
+
+        Args:
+            llm: LLM对象，用于取模型名和temperature
+            prompt: 提示词
+            call_fn: 实际调用LLM的函数
+            bypass: 为True时跳过缓存读取，直接调用LLM并刷新缓存
+        """
+        if not self.enabled:
+            return call_fn(prompt)
+
+        model, temperature = describe_llm(llm)
+        key = make_cache_key(model, temperature, prompt)
+
+        if not bypass:
+            try:
+                cached = self.get(key)
+            except sqlite3.Error as e:
+                logger.error(f"读取LLM缓存失败: {str(e)}")
+                cached = None
+            if cached is not None:
+                self.hits += 1
+                logger.info(f"LLM缓存命中 ({model})")
+                return cached
+
+        self.misses += 1
+        response = call_fn(prompt)
+        if isinstance(response, str) and response:
+            try:
+                self.put(key, response, model)
+            except sqlite3.Error as e:
+                logger.error(f"写入LLM缓存失败: {str(e)}")
+        return response
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            finally:
+                conn.close()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "ttl": self.ttl, "max_entries": self.max_entries, "enabled": self.enabled}
+
+
+# 全局实例
+llm_cache = LLMResponseCache()
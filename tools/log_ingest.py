@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+增量日志读取
+每个日志来源保存一个游标（文件 inode、读取偏移、最后的记录ID和时间），
+每次只解析上次之后新增的条目，并以生成器的方式按时间窗口过滤
+
+支持的本地文件格式:
+- syslog: 传统 syslog 文本（"Jan  2 03:04:05 host prog[pid]: msg"）或 ISO 时间开头的 rsyslog 格式
+- journal: journalctl -o json 导出（每行一个JSON对象）
+- evtx_json: Windows 事件日志的JSON导出（evtx_dump -o jsonl 或 Get-WinEvent | ConvertTo-Json）
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config.constants import LOG_CURSOR_FILE, LOG_INGEST_SOURCES
+
+logger = logging.getLogger(__name__)
+
+_SYSLOG_BSD = re.compile(
+    r"^(?P<time>[A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2}) (?P<host>\S+) (?P<program>[^:\[\s]+)(?:\[(?P<pid>\d+)\])?: ?(?P<message>.*)$")
+_SYSLOG_ISO = re.compile(
+    r"^(?P<time>\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?) (?P<host>\S+) "
+    r"(?P<program>[^:\[\s]+)(?:\[(?P<pid>\d+)\])?: ?(?P<message>.*)$")
+_DOTNET_DATE = re.compile(r"/Date\((-?\d+)\)/")
+
+# Format-List 输出中的时间字段和常见时间格式
+_TIME_FIELD = re.compile(r"^\s*TimeCreated\s*:\s*(?P<value>.+?)\s*$", re.MULTILINE)
+_RECORD_ID_FIELD = re.compile(r"^\s*RecordId\s*:\s*(?P<value>\d+)\s*$", re.MULTILINE)
+_TEXT_TIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S", "%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y %H:%M:%S",
+    "%Y/%m/%d %H:%M", "%d/%m/%Y %H:%M:%S",
+)
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """把常见的时间表示转换为epoch秒，无法解析时返回None"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if not text:
+        return None
+
+    match = _DOTNET_DATE.search(text)
+    if match:
+        return int(match.group(1)) / 1000.0
+
+    iso = text.replace("Z", "+00:00")
+    # evtx 的 SystemTime 可能带7位小数
+    iso = re.sub(r"(\.\d{6})\d+", r"\1", iso)
+    try:
+        parsed = datetime.fromisoformat(iso)
+        return parsed.timestamp()
+    except ValueError:
+        pass
+
+    for fmt in _TEXT_TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def _event(source: str, epoch: Optional[float], message: str, **fields) -> Dict:
+    event = {
+        "source": source,
+        "timestamp": datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M:%S") if epoch is not None else None,
+        "epoch": epoch,
+        "message": message,
+    }
+    event.update({key: value for key, value in fields.items() if value not in (None, "")})
+    return event
+
+
+def parse_syslog_line(line: str, source: str = "syslog", year: Optional[int] = None) -> Optional[Dict]:
+    """解析一行 syslog，无法识别格式时返回None"""
+    line = line.rstrip("\r\n")
+    match = _SYSLOG_ISO.match(line)
+    if match:
+        epoch = parse_timestamp(match.group("time"))
+    else:
+        match = _SYSLOG_BSD.match(line)
+        if not match:
+            return None
+        # 传统 syslog 没有年份，取当前年份；如果得到未来时间则属于上一年
+        now = datetime.now()
+        parsed = datetime.strptime(f"{year or now.year} {match.group('time')}", "%Y %b %d %H:%M:%S")
+        if year is None and parsed > now:
+            parsed = parsed.replace(year=parsed.year - 1)
+        epoch = parsed.timestamp()
+    return _event(source, epoch, match.group("message"), host=match.group("host"),
+                  program=match.group("program"), pid=match.group("pid"))
+
+
+def parse_journal_entry(entry: Dict, source: str = "journal") -> Dict:
+    """解析 journalctl -o json 的一条记录"""
+    realtime = entry.get("__REALTIME_TIMESTAMP")
+    epoch = int(realtime) / 1_000_000 if realtime else None
+    message = entry.get("MESSAGE")
+    if isinstance(message, list):
+        # 非UTF-8消息在journal JSON中是字节数组
+        message = bytes(message).decode("utf-8", "replace")
+    return _event(source, epoch, message or "", host=entry.get("_HOSTNAME"),
+                  program=entry.get("SYSLOG_IDENTIFIER") or entry.get("_COMM"),
+                  pid=entry.get("_PID"), priority=entry.get("PRIORITY"),
+                  record_id=entry.get("__CURSOR"))
+
+
+def parse_evtx_entry(entry: Dict, source: str = "evtx") -> Dict:
+    """解析 Windows 事件的JSON导出（evtx_dump 或 Get-WinEvent | ConvertTo-Json）"""
+    if "Event" in entry:
+        event = entry["Event"]
+        system = event.get("System", {})
+        event_id = system.get("EventID")
+        if isinstance(event_id, dict):
+            event_id = event_id.get("#text") or event_id.get("Value")
+        time_created = system.get("TimeCreated", {})
+        if isinstance(time_created, dict):
+            time_created = time_created.get("#attributes", {}).get("SystemTime") or time_created.get("SystemTime")
+        provider = system.get("Provider", {})
+        if isinstance(provider, dict):
+            provider = provider.get("#attributes", {}).get("Name") or provider.get("Name")
+        message = event.get("EventData") or event.get("UserData") or {}
+        return _event(source, parse_timestamp(time_created),
+                      message if isinstance(message, str) else json.dumps(message, ensure_ascii=False),
+                      event_id=event_id, record_id=system.get("EventRecordID"),
+                      host=system.get("Computer"), program=provider)
+
+    return _event(source, parse_timestamp(entry.get("TimeCreated")), entry.get("Message") or "",
+                  event_id=entry.get("Id"), record_id=entry.get("RecordId"),
+                  host=entry.get("MachineName"), program=entry.get("ProviderName"))
+
+
+def filter_events_by_time(events: Iterable[Dict], since: Optional[float] = None,
+                          until: Optional[float] = None) -> Iterator[Dict]:
+    """按epoch时间窗口过滤事件，没有时间的事件保留"""
+    for event in events:
+        epoch = event.get("epoch")
+        if epoch is not None:
+            if since is not None and epoch < since:
+                continue
+            if until is not None and epoch > until:
+                continue
+        yield event
+
+
+class CursorStore:
+    """日志来源游标的持久化存储"""
+
+    def __init__(self, cursor_file: str = LOG_CURSOR_FILE):
+        self.cursor_file = cursor_file
+        self._lock = threading.Lock()
+        self._cursors = None
+
+    def _load(self) -> Dict:
+        if self._cursors is None:
+            try:
+                with open(self.cursor_file, "r", encoding="utf-8") as f:
+                    self._cursors = json.load(f)
+            except FileNotFoundError:
+                self._cursors = {}
+            except (json.JSONDecodeError, OSError) as e:
+                logger.error(f"读取日志游标失败: {str(e)}")
+                self._cursors = {}
+        return self._cursors
+
+    def get(self, source: str) -> Dict:
+        with self._lock:
+            return dict(self._load().get(source, {}))
+
+    def set(self, source: str, cursor: Dict):
+        with self._lock:
+            cursors = self._load()
+            cursors[source] = cursor
+            directory = os.path.dirname(self.cursor_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_file = f"{self.cursor_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(cursors, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.cursor_file)
+
+    def reset(self, source: Optional[str] = None):
+        """清除某个来源（或全部来源）的游标"""
+        with self._lock:
+            cursors = self._load()
+            if source is None:
+                cursors.clear()
+            else:
+                cursors.pop(source, None)
+            if os.path.exists(self.cursor_file):
+                with open(self.cursor_file, "w", encoding="utf-8") as f:
+                    json.dump(cursors, f, ensure_ascii=False, indent=2)
+
+
+class LogFileSource:
+    """
+    本地日志文件来源
+    - 按行追加的文件（syslog、journal JSON、evtx JSONL）从上次的偏移量继续读取，
+      文件被轮转（inode变化）或截断时从头读取
+    - 整体为JSON数组的evtx导出按记录ID跳过已读取的事件
+    """
+
+    FORMATS = ("syslog", "journal", "evtx_json")
+
+    def __init__(self, name: str, path: str, fmt: str = "syslog"):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"不支持的日志格式: {fmt}")
+        self.name = name
+        self.path = path
+        self.format = fmt
+
+    def _parse_line(self, line: str) -> Optional[Dict]:
+        if self.format == "syslog":
+            return parse_syslog_line(line, self.name)
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        if self.format == "journal":
+            return parse_journal_entry(entry, self.name)
+        return parse_evtx_entry(entry, self.name)
+
+    def read_new(self, cursor: Dict) -> Iterator[Dict]:
+        """
+        读取游标之后的新事件
+
+        每生成一个事件前 cursor 更新为该事件之后的位置，生成器结束后为已读取的末尾（调用方负责持久化）；
+        调用方中途停止时，cursor 停在最后一个已生成的事件之后
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+
+        offset = cursor.get("offset", 0)
+        if cursor.get("inode") != stat.st_ino or stat.st_size < offset:
+            offset = 0
+
+        with open(self.path, "rb") as f:
+            head = f.read(1)
+            if self.format == "evtx_json" and head == b"[":
+                yield from self._read_json_array(f, cursor, stat)
+                return
+
+            f.seek(offset)
+            last_record_id = cursor.get("last_record_id")
+            while True:
+                line = f.readline()
+                # 不完整的最后一行留到下一次读取
+                if not line or not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                event = self._parse_line(line.decode("utf-8", "replace"))
+                if event is None:
+                    continue
+                last_record_id = event.get("record_id", last_record_id)
+                cursor.update({"inode": stat.st_ino, "offset": offset, "last_record_id": last_record_id})
+                yield event
+
+        cursor.update({"inode": stat.st_ino, "offset": offset, "last_record_id": last_record_id})
+
+    def _read_json_array(self, f, cursor: Dict, stat) -> Iterator[Dict]:
+        f.seek(0)
+        try:
+            entries = json.load(f)
+        except json.JSONDecodeError as e:
+            logger.error(f"解析事件日志导出失败 {self.path}: {str(e)}")
+            return
+        last_record_id = cursor.get("last_record_id")
+        events = []
+        for entry in entries if isinstance(entries, list) else [entries]:
+            event = parse_evtx_entry(entry, self.name)
+            record_id = event.get("record_id")
+            if last_record_id is not None and record_id is not None and int(record_id) <= int(last_record_id):
+                continue
+            events.append(event)
+        # 导出的顺序不一定是记录ID的顺序（Get-WinEvent 从新到旧），按记录ID升序生成，
+        # 中途停止时游标只越过已生成的事件；没有记录ID的事件无法跳过，放在最后
+        events.sort(key=lambda event: (event.get("record_id") is None, int(event.get("record_id") or 0)))
+        newest = last_record_id
+        for event in events:
+            if event.get("record_id") is not None:
+                newest = event["record_id"]
+                cursor.update({"inode": stat.st_ino, "offset": stat.st_size, "last_record_id": newest})
+            yield event
+        cursor.update({"inode": stat.st_ino, "offset": stat.st_size, "last_record_id": newest})
+
+
+class LogIngestor:
+    """
+    增量日志读取器
+    只有当某个来源的新事件被完整读取，或达到 max_events 时，该来源的游标才会前进；
+    达到 max_events 时游标停在最后一个返回的事件之后，其余事件在下一次读取时返回；
+    调用方中途停止迭代时，下一次会重新读取这些事件
+    """
+
+    def __init__(self, sources: Optional[List[LogFileSource]] = None, cursor_store: Optional[CursorStore] = None):
+        if sources is None:
+            sources = [LogFileSource(item["name"], item["path"], item.get("format", "syslog"))
+                       for item in LOG_INGEST_SOURCES]
+        self.sources = sources
+        self.cursor_store = cursor_store or CursorStore()
+
+    def available_sources(self) -> List[LogFileSource]:
+        return [source for source in self.sources if os.path.exists(source.path)]
+
+    def iter_new_events(self, since: Optional[float] = None, until: Optional[float] = None,
+                        source_name: Optional[str] = None, max_events: Optional[int] = None) -> Iterator[Dict]:
+        """
+        依次读取各来源的新事件，并按时间窗口过滤
+
+        Args:
+            since/until: epoch时间窗口
+            source_name: 只读取指定来源
+            max_events: 最多返回的事件数，为None时不限
+        """
+        remaining = max_events
+        for source in self.sources:
+            if remaining is not None and remaining <= 0:
+                break
+            if source_name and source.name != source_name:
+                continue
+            cursor = self.cursor_store.get(source.name)
+            try:
+                for event in filter_events_by_time(source.read_new(cursor), since, until):
+                    yield event
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining <= 0:
+                            break
+            except OSError as e:
+                logger.error(f"读取日志来源 {source.name} 失败: {str(e)}")
+                continue
+            if cursor:
+                self.cursor_store.set(source.name, cursor)
+
+
+def filter_log_text(logs_data: str, since: Optional[float] = None, until: Optional[float] = None) -> str:
+    """
+    按epoch时间窗口 [since, until] 过滤文本形式的日志
+
+    - JSON数组（事件列表）按 epoch/timestamp/TimeCreated 字段过滤
+    - PowerShell Format-List 输出按空行分块，按块中的 TimeCreated 过滤
+    - 其他文本逐行按 syslog 时间过滤
+    无法解析时间的条目保留
+    """
+    low = since if since is not None else float("-inf")
+    high = until if until is not None else float("inf")
+    in_window = lambda epoch: epoch is None or low <= epoch <= high
+
+    text = logs_data.strip()
+    if text.startswith("[") or text.startswith("{"):
+        try:
+            entries = json.loads(text)
+            if isinstance(entries, dict):
+                entries = [entries]
+            kept = [entry for entry in entries if not isinstance(entry, dict) or in_window(_entry_epoch(entry))]
+            return json.dumps(kept, ensure_ascii=False, indent=2)
+        except json.JSONDecodeError:
+            pass
+
+    if _TIME_FIELD.search(logs_data):
+        blocks = re.split(r"\n\s*\n", logs_data)
+        kept = []
+        for block in blocks:
+            match = _TIME_FIELD.search(block)
+            epoch = parse_timestamp(match.group("value")) if match else None
+            if in_window(epoch):
+                kept.append(block)
+        return "\n\n".join(block for block in kept if block.strip())
+
+    kept = []
+    keep_current = True
+    for line in logs_data.splitlines():
+        event = parse_syslog_line(line)
+        if event is not None:
+            keep_current = in_window(event["epoch"])
+        # 没有时间戳的续行跟随上一条日志
+        if keep_current:
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def _entry_epoch(entry: Dict) -> Optional[float]:
+    for key in ("epoch", "timestamp", "TimeCreated", "time", "__REALTIME_TIMESTAMP"):
+        if key in entry:
+            if key == "__REALTIME_TIMESTAMP":
+                return int(entry[key]) / 1_000_000
+            return parse_timestamp(entry[key])
+    return None
+
+
+def windows_event_query(event_id: str, after_record_id: Optional[int] = None, max_events: int = 50) -> str:
+    """
+    构造只获取新事件的 Get-WinEvent 命令
+
+    Args:
+        event_id: 事件ID
+        after_record_id: 只获取记录ID大于该值的事件
+        max_events: 最多获取的事件数
+    """
+    xpath = f"*[System[(EventID={int(event_id)})"
+    if after_record_id is not None:
+        xpath += f" and (EventRecordID > {int(after_record_id)})"
+    xpath += "]]"
+    return (f'powershell -Command "Get-WinEvent -LogName Security -FilterXPath \'{xpath}\' '
+            f'-MaxEvents {int(max_events)} -ErrorAction SilentlyContinue | '
+            f'Select-Object RecordId,Id,TimeCreated,ProviderName,Message | Format-List"')
+
+
+def max_record_id(output: str) -> Optional[int]:
+    """从 Format-List 输出中取最大的 RecordId"""
+    ids = [int(match.group("value")) for match in _RECORD_ID_FIELD.finditer(output)]
+    return max(ids) if ids else None
+
+
+# 全局实例
+log_cursor_store = CursorStore()
+log_ingestor = LogIngestor(cursor_store=log_cursor_store)
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+"""
+追加写入的JSONL日志存储，以及单次写入、偏移索引的多视图日志布局
+每条记录占一行，写入只需一次 write（可选 fsync），读取时逐行惰性解析
+"""
+
+import os
+import json
+import queue
+import logging
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+JSONL_SUFFIX = ".jsonl"
+LEGACY_SUFFIX = ".json"
+INDEX_SUFFIX = ".idx"
+
+
+def encode_record(record: Dict) -> bytes:
+    """把记录编码为一行JSON（UTF-8，以换行结尾）"""
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def iter_log_records(file_path: Union[str, Path]) -> Iterator[Dict]:
+    """
+    惰性读取日志文件中的记录
+
+    - .jsonl 文件逐行解析，跳过损坏的行（例如进程崩溃时写了一半的最后一行）
+    - 旧的 .json 数组文件整体解析后逐条返回
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        return
+
+    if file_path.suffix == LEGACY_SUFFIX:
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"读取日志文件失败 {file_path}: {e}")
+            return
+        if isinstance(records, list):
+            yield from records
+        return
+
+    with open(file_path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                logger.warning(f"跳过损坏的日志行: {file_path}")
+
+
+def read_log_records(directory: Union[str, Path], stem: str) -> List[Dict]:
+    """
+    读取同名的旧 .json 和新 .jsonl 文件中的全部记录（旧记录在前）
+
+    Args:
+        directory: 日志目录
+        stem: 不含扩展名的文件名，例如 pre_execution_2025-01-01
+    """
+    directory = Path(directory)
+    records = list(iter_log_records(directory / f"{stem}{LEGACY_SUFFIX}"))
+    records.extend(iter_log_records(directory / f"{stem}{JSONL_SUFFIX}"))
+    return records
+
+
+class JsonlLogStore:
+    """
+    JSONL 追加写入后端
+    - 每条记录一次 write 系统调用，写入成本与文件大小无关
+    - fsync=True 时每次写入后刷盘
+    - 首次写入某个文件时，自动把同名的旧 .json 数组文件迁移进来
+    """
+
+    def __init__(self, fsync: bool = False):
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._checked_paths = set()
+
+    def append(self, file_path: Union[str, Path], record: Dict) -> Path:
+        """追加一条记录，返回实际写入的 .jsonl 文件路径"""
+        return self.append_many(file_path, [record])
+
+    def append_many(self, file_path: Union[str, Path], records: Iterable[Dict]) -> Path:
+        """一次写入多条记录，返回实际写入的 .jsonl 文件路径"""
+        path = Path(file_path).with_suffix(JSONL_SUFFIX)
+        data = b"".join(encode_record(record) for record in records)
+        if not data:
+            return path
+
+        with self._lock:
+            if path not in self._checked_paths:
+                legacy_path = path.with_suffix(LEGACY_SUFFIX)
+                if legacy_path.exists():
+                    migrate_json_array(legacy_path)
+                self._checked_paths.add(path)
+
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        return path
+
+
+def migrate_json_array(json_path: Union[str, Path]) -> Path:
+    """
+    把旧的 .json 数组日志文件迁移为 .jsonl 文件
+
+    如果同名 .jsonl 已存在，旧记录会排在已有记录之前。迁移完成后删除旧文件。
+
+    Returns:
+        迁移后的 .jsonl 文件路径
+    """
+    json_path = Path(json_path)
+    jsonl_path = json_path.with_suffix(JSONL_SUFFIX)
+    if not json_path.exists():
+        return jsonl_path
+
+    legacy_records = list(iter_log_records(json_path))
+    tmp_path = jsonl_path.with_suffix(JSONL_SUFFIX + ".tmp")
+    with open(tmp_path, "wb") as out:
+        for record in legacy_records:
+            out.write(encode_record(record))
+        if jsonl_path.exists():
+            with open(jsonl_path, "rb") as existing:
+                out.write(existing.read())
+    os.replace(tmp_path, jsonl_path)
+    json_path.unlink()
+    logger.info(f"已迁移日志文件 {json_path} -> {jsonl_path}（{len(legacy_records)} 条记录）")
+    return jsonl_path
+
+
+def migrate_log_directory(directory: Union[str, Path]) -> int:
+    """
+    迁移目录下所有旧的 .json 数组日志文件
+
+    Returns:
+        迁移的文件数
+    """
+    migrated = 0
+    for json_path in Path(directory).rglob(f"*{LEGACY_SUFFIX}"):
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                if not isinstance(json.load(f), list):
+                    continue
+            migrate_json_array(json_path)
+            migrated += 1
+        except Exception as e:
+            logger.error(f"迁移日志文件失败 {json_path}: {e}")
+    return migrated
+
+
+class IndexedLogStore:
+    """
+    单次写入、多索引的日志布局
+
+    - 每条记录只写一次，追加到按日期划分的主段文件 segments/<日期>.jsonl
+    - 角色组/角色/类型等视图由二级索引文件提供，索引文件只保存记录在主段中的偏移量
+      （每条8字节），例如 groups/<组>/<类型>_<日期>.idx
+    - 读取视图时按偏移量定位到主段中的记录
+    """
+
+    SEGMENT_DIR = "segments"
+
+    def __init__(self, root_dir: Union[str, Path], fsync: bool = False):
+        """
+        Args:
+            root_dir: 日志根目录（索引文件的相对路径以此为基准）
+            fsync: 每次写入后是否刷盘
+        """
+        self.root_dir = Path(root_dir)
+        self.segment_dir = self.root_dir / self.SEGMENT_DIR
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+    def segment_path(self, date: str) -> Path:
+        """某一天的主段文件路径"""
+        return self.segment_dir / f"{date}{JSONL_SUFFIX}"
+
+    def index_path(self, view_dir: Union[str, Path], stem: str) -> Path:
+        """视图索引文件路径，view_dir 为相对根目录的视图目录"""
+        return self.root_dir / view_dir / f"{stem}{INDEX_SUFFIX}"
+
+    def append(self, date: str, record: Dict,
+               views: Sequence[Tuple[Union[str, Path], str]]) -> Tuple[Path, int]:
+        """
+        写入一条记录并登记到各视图索引
+
+        Args:
+            date: 记录日期 (YYYY-MM-DD)，决定主段文件
+            record: 记录内容
+            views: [(视图目录, 索引文件名不含扩展名)]
+
+        Returns:
+            (主段文件路径, 记录偏移量)
+        """
+        [offset] = self.append_many(date, [(record, views)])
+        return self.segment_path(date), offset
+
+    def append_many(self, date: str,
+                    entries: Sequence[Tuple[Dict, Sequence[Tuple[Union[str, Path], str]]]]) -> List[int]:
+        """
+        批量写入同一天的多条记录，主段只写一次，每个索引文件只写一次
+
+        Returns:
+            每条记录在主段中的偏移量
+        """
+        if not entries:
+            return []
+
+        encoded = [encode_record(record) for record, _ in entries]
+        segment = self.segment_path(date)
+
+        with self._lock:
+            self.segment_dir.mkdir(parents=True, exist_ok=True)
+            fd = os.open(segment, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                offset = os.lseek(fd, 0, os.SEEK_END)
+                os.write(fd, b"".join(encoded))
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+
+            offsets = []
+            index_offsets = {}
+            for (record, views), data in zip(entries, encoded):
+                offsets.append(offset)
+                for view_dir, stem in views:
+                    index_offsets.setdefault(self.index_path(view_dir, stem), array("Q")).append(offset)
+                offset += len(data)
+
+            for index_file, positions in index_offsets.items():
+                index_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(index_file, "ab") as f:
+                    f.write(positions.tobytes())
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+
+        return offsets
+
+    @staticmethod
+    def _read_offsets(index_file: Path) -> array:
+        offsets = array("Q")
+        if index_file.exists():
+            data = index_file.read_bytes()
+            # 忽略写了一半的尾部
+            usable = len(data) - len(data) % offsets.itemsize
+            offsets.frombytes(data[:usable])
+        return offsets
+
+    def iter_index_file(self, index_file: Union[str, Path]) -> Iterator[Dict]:
+        """
+        按索引文件读取记录
+
+        索引文件名以日期结尾（<名称>_<YYYY-MM-DD>.idx），据此定位主段文件
+        """
+        index_file = Path(index_file)
+        offsets = self._read_offsets(index_file)
+        if not offsets:
+            return
+
+        date = index_file.stem[-10:]
+        segment = self.segment_path(date)
+        if not segment.exists():
+            logger.warning(f"索引 {index_file} 对应的主段文件不存在: {segment}")
+            return
+
+        with open(segment, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                line = f.readline()
+                try:
+                    yield json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logger.warning(f"索引 {index_file} 指向损坏的记录，偏移量 {offset}")
+
+    def read_view(self, view_dir: Union[str, Path], stem: str) -> List[Dict]:
+        """读取一个视图索引对应的全部记录"""
+        return list(self.iter_index_file(self.index_path(view_dir, stem)))
+
+
+class _FlushRequest:
+    """写入线程的刷新/停止标记"""
+
+    def __init__(self, stop: bool = False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class BackgroundLogWriter:
+    """
+    后台批量日志写入线程
+
+    - 调用方只把 (写入目标, 记录) 放入有界队列，不做文件I/O
+    - 单个后台线程取出记录，按写入目标合并后批量交给 sink(target, payloads) 写入
+    - 缓冲达到 batch_size 条、等待超过 flush_interval 秒或收到 flush()/close() 时写入
+    - 队列满时最多等待 put_timeout 秒，仍然放不进去则在调用线程中写入：持有写入锁，
+      先写完缓冲和队列中已提交的记录再写这条记录，保持提交顺序，不丢记录
+    - close() 之后提交的记录在调用线程中同步写入
+    """
+
+    def __init__(self, sink, max_queue: int = 10000, batch_size: int = 256,
+                 flush_interval: float = 0.5, put_timeout: float = 0.05,
+                 name: str = "log-writer"):
+        """
+        Args:
+            sink: 写入函数 sink(target, payloads)，payloads 为同一目标的记录列表（保持提交顺序）
+            max_queue: 队列容量
+            batch_size: 缓冲多少条记录后立即写入
+            flush_interval: 缓冲中最早的记录最多等待多少秒
+            put_timeout: 队列满时调用方最多等待的秒数
+        """
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        # 提交与关闭互斥：关闭之后不会再有记录进入队列
+        self._submit_lock = threading.Lock()
+        # 写入锁：后台线程和调用线程的写入按顺序进行，_buffer 为已取出、尚未写入的记录
+        self._write_lock = threading.Lock()
+        self._buffer = []
+        self._closed = False
+        self._stats = {
+            "submitted": 0,          # 提交的记录数
+            "written": 0,            # 写入的记录数
+            "batches": 0,            # 写入批次数
+            "queue_full": 0,         # 提交时遇到队列满的次数
+            "sync_fallbacks": 0,     # 队列满或已关闭时在调用线程写入的记录数
+            "errors": 0,             # 写入失败的批次数
+            "max_queue_depth": 0,    # 观察到的最大队列深度
+            "last_batch_seconds": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _count(self, key: str, value=1):
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def submit(self, target, payload) -> bool:
+        """
+        提交一条记录
+
+        Returns:
+            True 表示已进入队列，False 表示队列满或写入线程已关闭，记录（及此前提交的记录）已在调用线程中写入
+        """
+        with self._submit_lock:
+            if not self._closed:
+                try:
+                    self._queue.put((target, payload), timeout=self.put_timeout)
+                    depth = self._queue.qsize()
+                    with self._stats_lock:
+                        self._stats["submitted"] += 1
+                        if depth > self._stats["max_queue_depth"]:
+                            self._stats["max_queue_depth"] = depth
+                    return True
+                except queue.Full:
+                    self._count("queue_full")
+
+            self._count("submitted")
+            self._count("sync_fallbacks")
+            self._write_pending([(target, payload)])
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前提交的记录全部写入，返回是否在超时前完成"""
+        if self._closed or not self._thread.is_alive():
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """写入剩余记录并停止后台线程，可重复调用"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+        request = _FlushRequest(stop=True)
+        self._queue.put(request)
+        request.done.wait(timeout)
+        self._thread.join(timeout)
+
+        # 写入线程未能在超时前停止时，剩余的记录在当前线程写入
+        self._write_pending()
+
+    def _write_pending(self, extra: Optional[List[Tuple]] = None):
+        """
+        在调用线程中按提交顺序写入：后台线程缓冲中的记录、队列中的记录，最后是 extra
+        队列中的刷新请求在写入后完成，停止标记写入后放回队列，由后台线程处理
+        """
+        requests, stop = [], None
+        with self._write_lock:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, _FlushRequest):
+                    if item.stop:
+                        stop = item
+                    else:
+                        requests.append(item)
+                else:
+                    self._buffer.append(item)
+            self._buffer.extend(extra or [])
+            self._write_batch(self._buffer)
+        for request in requests:
+            request.done.set()
+        if stop is not None:
+            if self._thread.is_alive():
+                self._queue.put(stop)
+            else:
+                stop.done.set()
+
+    def metrics(self) -> Dict:
+        """背压与吞吐指标"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_capacity"] = self._queue.maxsize
+        stats["running"] = self._thread.is_alive()
+        return stats
+
+    def _write_batch(self, buffer: List[Tuple]):
+        """按写入目标合并缓冲中的记录并写入"""
+        if not buffer:
+            return
+        grouped = {}
+        for target, payload in buffer:
+            grouped.setdefault(target, []).append(payload)
+
+        started = time.monotonic()
+        for target, payloads in grouped.items():
+            try:
+                self.sink(target, payloads)
+                self._count("written", len(payloads))
+            except Exception as e:
+                self._count("errors")
+                logger.error(f"后台写入日志失败 {target}: {e}")
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["last_batch_seconds"] = time.monotonic() - started
+        buffer.clear()
+
+    def _run(self):
+        deadline = None
+        while True:
+            # 调用线程可能已经写完缓冲，deadline 过期时写入空缓冲，不产生I/O
+            with self._write_lock:
+                pending = bool(self._buffer)
+            if pending:
+                timeout = max(0.0, deadline - time.monotonic())
+            else:
+                timeout = None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                # 缓冲中的记录等待时间到了
+                with self._write_lock:
+                    self._write_batch(self._buffer)
+                continue
+
+            if isinstance(item, _FlushRequest):
+                with self._write_lock:
+                    self._write_batch(self._buffer)
+                item.done.set()
+                if item.stop:
+                    return
+                continue
+
+            with self._write_lock:
+                if not self._buffer:
+                    deadline = time.monotonic() + self.flush_interval
+                self._buffer.append(item)
+                if len(self._buffer) >= self.batch_size:
+                    self._write_batch(self._buffer)
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+工具输出编码器
+把工具返回的数据编码为适合放进提示词的文本：紧凑JSON、列式表格或CSV，
+并可按token预算截断列表，截断处明确标注省略的行数
+"""
+
+import csv
+import io
+import re
+import json
+from typing import Any, Dict, List, Optional
+
+from config.constants import TOOL_OUTPUT_SETTINGS
+
+# 支持的输出格式
+OUTPUT_FORMATS = ("json", "compact", "columnar", "csv")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：ASCII字符约4个一个token，其余字符（中文等）每个算一个token"""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+# csv 输出中顶层字典各字段的分节标记
+SECTION_PREFIX = "## "
+# csv 截断标注，decode_output 按此识别
+_OMITTED = re.compile(r"^\.\.\. 另有 \d+ 行已省略$")
+# 表格/截断列表的字段，decode_output 按此还原为列表
+_TABLE_KEYS = frozenset({"columns", "rows", "omitted"})
+
+
+def omitted_marker(count: int) -> str:
+    return f"... 另有 {count} 行已省略"
+
+
+def _is_table(value: Any) -> bool:
+    """非空且每个元素都是字典的列表可以按表格输出"""
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def _columns(rows: List[Dict]) -> List[str]:
+    """按首次出现的顺序合并所有行的字段名"""
+    columns = {}
+    for row in rows:
+        for key in row:
+            columns.setdefault(key, None)
+    return list(columns)
+
+
+def _compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _cell(value: Any) -> Any:
+    """CSV单元格：嵌套结构和布尔值转为JSON，None 为空"""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list, bool)):
+        return _compact_json(value)
+    return value
+
+
+def _truncate(items: list, limit: Optional[int]) -> Any:
+    """json/compact 截断列表：省略的行数写在结果中（{"rows", "omitted"}），输出仍然是合法JSON"""
+    if limit is None or len(items) <= limit:
+        return items
+    return {"rows": items[:limit], "omitted": len(items) - limit}
+
+
+def _table(items: list, limit: Optional[int]) -> Dict:
+    """字典列表 -> {"columns", "rows"[, "omitted"]}"""
+    shown = items if limit is None else items[:limit]
+    columns = _columns(items)
+    table = {"columns": columns, "rows": [[row.get(col) for col in columns] for row in shown]}
+    if len(items) > len(shown):
+        table["omitted"] = len(items) - len(shown)
+    return table
+
+
+def _dump(value: Any, fmt: str) -> str:
+    return json.dumps(value, ensure_ascii=False, indent=2) if fmt == "json" else _compact_json(value)
+
+
+def _render_list(items: list, fmt: str, limit: Optional[int]) -> str:
+    if fmt == "csv" and _is_table(items):
+        shown = items if limit is None else items[:limit]
+        columns = _columns(items)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        for row in shown:
+            writer.writerow([_cell(row.get(col)) for col in columns])
+        text = buffer.getvalue().rstrip("\n")
+        if len(items) > len(shown):
+            text += "\n" + omitted_marker(len(items) - len(shown))
+        return text
+    if fmt == "columnar" and _is_table(items):
+        return _compact_json(_table(items, limit))
+    return _dump(_truncate(items, limit), fmt)
+
+
+def _render(data: Any, fmt: str, limit: Optional[int]) -> str:
+    """
+    渲染数据，limit 为每个列表最多保留的行数（None 表示不限）
+
+    json/compact/columnar 的输出始终是合法JSON；csv 无法表示嵌套结构，
+    顶层字典中的列表按 "## 字段名" 分节输出
+    """
+    if isinstance(data, list):
+        return _render_list(data, fmt, limit)
+    if not isinstance(data, dict):
+        return _dump(data, fmt)
+
+    if fmt == "csv" and any(isinstance(value, list) for value in data.values()):
+        sections = []
+        for key, value in data.items():
+            body = _render_list(value, fmt, limit) if isinstance(value, list) else _compact_json(value)
+            sections.append(f"{SECTION_PREFIX}{key}\n{body}")
+        return "\n".join(sections)
+
+    rendered = {}
+    for key, value in data.items():
+        if isinstance(value, list):
+            value = _table(value, limit) if fmt == "columnar" and _is_table(value) else _truncate(value, limit)
+        rendered[key] = value
+    return _dump(rendered, fmt)
+
+
+def _max_rows(data: Any) -> int:
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict):
+        return max((len(v) for v in data.values() if isinstance(v, list)), default=0)
+    return 0
+
+
+def encode_output(data: Any, output_format: str = "json", token_budget: int = 0) -> str:
+    """
+    编码工具输出
+
+    Args:
+        data: 要输出的数据（通常是字典列表，或值为列表的字典）
+        output_format:
+            - "json": 缩进JSON（与原来的输出一致）
+            - "compact": 无多余空白的紧凑JSON
+            - "columnar": 字典列表输出为 {"columns": [...], "rows": [[...]]}
+            - "csv": 字典列表输出为带表头的CSV
+            截断的列表在 json/compact/columnar 中输出为 {"rows": [...], "omitted": N}，
+            在 csv 中以省略标注行结尾；decode_output 可以还原所有格式
+        token_budget: token预算，>0 时按预算截断列表并标注省略的行数
+
+    Returns:
+        编码后的文本
+    """
+    if output_format not in OUTPUT_FORMATS:
+        output_format = "json"
+
+    text = _render(data, output_format, None)
+    if token_budget <= 0 or estimate_tokens(text) <= token_budget:
+        return text
+
+    # 二分查找预算内能保留的最多行数
+    low, high = 0, _max_rows(data)
+    best = _render(data, output_format, 0)
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = _render(data, output_format, middle)
+        if estimate_tokens(candidate) <= token_budget:
+            best = candidate
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def encode_tool_output(tool_name: str, data: Any, output_format: Optional[str] = None,
+                       token_budget: Optional[int] = None) -> str:
+    """
+    按工具配置编码输出
+
+    参数未指定时使用 TOOL_OUTPUT_SETTINGS 中该工具的配置，没有配置的工具保持原来的缩进JSON
+    """
+    settings: Dict = TOOL_OUTPUT_SETTINGS.get(tool_name, {})
+    if not output_format:
+        output_format = settings.get("format", "json")
+    if token_budget is None:
+        token_budget = settings.get("token_budget", 0)
+    return encode_output(data, output_format, token_budget)
+
+
+def _restore(value: Any) -> Any:
+    """{"columns", "rows"} 表格还原为字典列表，{"rows", "omitted"} 截断列表还原为列表"""
+    if isinstance(value, dict) and "rows" in value and value.keys() <= _TABLE_KEYS:
+        rows = value["rows"]
+        if "columns" in value:
+            columns = value["columns"]
+            return [dict(zip(columns, row)) for row in rows]
+        return rows
+    return value
+
+
+def _csv_value(cell: str) -> Any:
+    """CSV单元格还原：空为None，数字、布尔和嵌套结构按JSON解析，其余保持字符串"""
+    if cell == "":
+        return None
+    if cell[0] in "-0123456789[{" or cell in ("true", "false", "null"):
+        try:
+            return json.loads(cell)
+        except ValueError:
+            pass
+    return cell
+
+
+def _decode_csv(text: str) -> List[Dict]:
+    lines = [line for line in text.split("\n") if not _OMITTED.match(line.strip())]
+    rows = list(csv.reader(lines))
+    if not rows or len(rows[0]) < 2 or any(len(row) != len(rows[0]) for row in rows[1:]):
+        raise ValueError("无法识别的工具输出格式")
+    columns = rows[0]
+    return [{column: _csv_value(cell) for column, cell in zip(columns, row)} for row in rows[1:]]
+
+
+def _decode_body(text: str) -> Any:
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    lines = text.split("\n")
+    if lines and _OMITTED.match(lines[-1].strip()):
+        # 旧版截断输出：JSON 后跟省略标注行
+        try:
+            return json.loads("\n".join(lines[:-1]))
+        except ValueError:
+            pass
+    return _decode_csv(text)
+
+
+def decode_output(text: Any) -> Any:
+    """
+    读取 encode_output 的输出（任意格式，可能被截断），还原为字典/列表
+
+    - JSON（json/compact/columnar）：表格还原为字典列表，截断列表还原为保留的行
+    - CSV：按表头还原为字典列表，数字、布尔和嵌套结构按JSON解析（空单元格还原为None）
+    - "## 字段名" 分节的 csv 输出还原为字典
+    已经是字典或列表的数据同样还原其中的表格；无法识别的文本抛出 ValueError
+    """
+    if isinstance(text, str):
+        stripped = text.strip()
+        if not stripped:
+            raise ValueError("工具输出为空")
+        if stripped.startswith(SECTION_PREFIX):
+            data = {}
+            for section in re.split(r"(?m)^" + re.escape(SECTION_PREFIX), stripped)[1:]:
+                key, _, body = section.partition("\n")
+                data[key.strip()] = _decode_body(body) if body.strip() else None
+        else:
+            data = _decode_body(stripped)
+    else:
+        data = text
+    data = _restore(data)
+    if isinstance(data, dict):
+        data = {key: _restore(value) for key, value in data.items()}
+    return data
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+部门分析前的预分诊
+数据收集完成后，对部门的规范化数据计算摘要，与上一次已分析数据的摘要比较；
+相同则直接沿用上一次的分析结果，不再调用分析员，也不再生成秘书的执行前/执行后报告
+
+规范化数据取自本轮数据收集工具实际收集的数据（GetProcessDetails、GetServices、GetNetworkConnections
+通过 observe() 登记，与 LLM 如何转述无关），只保留影响安全判断的字段：
+- 进程: (进程名, 用户, 命令行)，不含PID和创建时间
+- 服务: (服务名, 状态, 程序路径, 启动类型)
+- 网络: 监听端口和 (状态, 远程地址, 远程端口)，不含本地临时端口和连接数
+本轮没有登记数据的部门（例如日志部门，或数据收集员没有调用收集工具），
+对数据收集员的输出去掉时间戳和空白差异后计算摘要；计算摘要时不会再次收集数据
+
+分析依据的配置（白名单、进程基线、检测规则、IP 列表）和威胁情报源的签名也计入摘要，
+它们变化后即使系统数据不变也重新分析
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from config.constants import (
+    TRIAGE_STATE_FILE, PRE_TRIAGE_MAX_AGE, WHITELIST_FILE, BASELINE_PROCESSES_FILE,
+    DETECTION_RULES_FILE, IP_LISTS_FILE
+)
+from tools.threat_intel import threat_intel
+
+logger = logging.getLogger(__name__)
+
+# 数据收集员输出中的时间戳
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2})?(\.\d+)?(Z|[+-]\d{2}:?\d{2})?")
+
+
+def normalize_text(text) -> str:
+    """去掉时间戳，合并空白"""
+    return " ".join(_TIMESTAMP.sub("<time>", str(text or "")).split())
+
+
+def _process_state(snapshot):
+    return sorted((snapshot.names[snapshot.name_id[i]], snapshot.users[snapshot.user_id[i]],
+                   snapshot.cmdlines[snapshot.cmdline_id[i]]) for i in range(len(snapshot)))
+
+
+def _service_state(services):
+    return sorted((service["name"], service["state"], service["binary_path"] or "", service["start_type"] or "")
+                  for service in services)
+
+
+def _network_state(connections):
+    state = set()
+    for conn in connections:
+        if conn.get("status") == "LISTEN":
+            state.add(("LISTEN", conn.get("local_ip") or "", conn.get("local_port") or 0))
+        elif conn.get("remote_ip"):
+            state.add((conn.get("status") or "", conn["remote_ip"], conn.get("remote_port") or 0))
+    return sorted(state)
+
+
+# 影响分析结果的配置文件
+ANALYSIS_CONFIG_FILES = (WHITELIST_FILE, BASELINE_PROCESSES_FILE, DETECTION_RULES_FILE, IP_LISTS_FILE)
+
+
+def config_signature():
+    """配置文件的 (文件名, 大小, 修改时间) 和威胁情报源签名，文件不存在时大小和时间为None"""
+    files = []
+    for path in ANALYSIS_CONFIG_FILES:
+        try:
+            stat = os.stat(path)
+            files.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            files.append((os.path.basename(path), None, None))
+    return [files, threat_intel.signature()]
+
+
+# 部门 -> 收集工具登记的数据（进程快照、服务记录、连接记录）的规范化函数
+DEPARTMENT_STATES = {
+    "process": _process_state,
+    "service": _service_state,
+    "network": _network_state,
+}
+
+
+class PreTriage:
+    """
+    预分诊
+    每个部门保存最近一次完成分析时的数据摘要和分析结果，写入 state_file，程序重启后仍然有效
+    数据收集工具用 observe() 登记本轮收集的数据，digest() 使用并清除登记的数据
+    """
+
+    def __init__(self, state_file: Optional[str] = TRIAGE_STATE_FILE, max_age: int = PRE_TRIAGE_MAX_AGE):
+        """
+        Args:
+            state_file: 状态文件路径，为None时只保存在内存中
+            max_age: 分析结果最长沿用的秒数，超过后即使数据未变化也重新分析，0表示不限
+        """
+        self.state_file = state_file
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._state = None
+        # 部门 -> 本轮收集工具登记的数据
+        self._observed = {}
+
+    def _load(self):
+        if self._state is not None:
+            return
+        self._state = {}
+        if not self.state_file:
+            return
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._state = data
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"读取预分诊状态失败: {str(e)}")
+
+    def _save(self):
+        if not self.state_file:
+            return
+        try:
+            directory = os.path.dirname(self.state_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_file = f"{self.state_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, ensure_ascii=False)
+            os.replace(tmp_file, self.state_file)
+        except OSError as e:
+            logger.error(f"保存预分诊状态失败: {str(e)}")
+
+    @staticmethod
+    def _hash(value: Any) -> str:
+        data = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def observe(self, department: str, data):
+        """
+        数据收集工具登记本轮收集的数据，覆盖之前登记的数据
+
+        Args:
+            department: 部门key（process/service/network）
+            data: 进程快照、服务记录列表或连接记录列表，计算摘要时才规范化
+        """
+        if department not in DEPARTMENT_STATES:
+            return
+        with self._lock:
+            self._observed[department] = data
+
+    def digest(self, department: str, collected=None) -> str:
+        """
+        部门本轮数据的摘要，使用并清除收集工具登记的数据，不会再次收集
+
+        Args:
+            department: 部门key（process/log/service/network）
+            collected: 数据收集员的输出，本轮没有登记数据时使用
+        """
+        with self._lock:
+            observed = self._observed.pop(department, None)
+        state = None
+        if observed is not None:
+            try:
+                state = DEPARTMENT_STATES[department](observed)
+            except Exception as e:
+                logger.warning(f"规范化{department}部门的收集数据失败，改用数据收集结果: {str(e)}")
+        config = config_signature()
+        if state is None:
+            return self._hash(["collected", normalize_text(collected), config])
+        return self._hash(["collector", state, config])
+
+    def cached(self, department: str, digest: str) -> Optional[Dict]:
+        """摘要与上一次已分析的数据相同时返回 {"result", "analyzed_at"}，否则返回None"""
+        with self._lock:
+            self._load()
+            entry = self._state.get(department)
+        if not entry or entry.get("digest") != digest:
+            return None
+        if self.max_age and time.time() - entry.get("analyzed_at", 0) > self.max_age:
+            return None
+        return entry
+
+    def record(self, department: str, digest: str, result):
+        """记录完成分析时的数据摘要和分析结果"""
+        with self._lock:
+            self._load()
+            self._state[department] = {"digest": digest, "result": str(result), "analyzed_at": time.time()}
+            self._save()
+
+    def reset(self, department: Optional[str] = None):
+        """丢弃一个（或全部）部门的记录，下一轮重新分析"""
+        with self._lock:
+            self._load()
+            if department is None:
+                self._state.clear()
+            else:
+                self._state.pop(department, None)
+            self._save()
+
+
+# 全局实例
+pre_triage = PreTriage()
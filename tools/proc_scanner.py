@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+/proc 进程快速扫描
+直接读取 /proc/<pid>/stat 和 cmdline，每个文件一次 open/read/close，
+uid 默认从 status 的 Uid: 行读取真实uid（与 psutil 一致），也可以改用 stat 文件的属主（有效uid）；
+comm 被内核截断为15个字符时，按 psutil 的做法从 cmdline 的程序名恢复完整进程名；
+结果按列保存在 array 中；用户名通过缓存的 /etc/passwd 映射批量解析，
+避免 psutil 为每个进程单独查询属性和处理 AccessDenied 异常
+"""
+
+import os
+import logging
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_READ_SIZE = 4096
+# 内核 comm 字段的最大长度（TASK_COMM_LEN - 1）
+_COMM_LEN = 15
+
+
+def _read_file(path: str, with_owner: bool = False):
+    """
+    读取整个文件，进程已退出或无权限时返回None
+
+    with_owner 为True时返回 (内容, 文件属主uid)，属主通过已打开的文件描述符获取，不需要额外的路径查找
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        owner = os.fstat(fd).st_uid if with_owner else None
+        chunks = []
+        while True:
+            chunk = os.read(fd, _READ_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if len(chunk) < _READ_SIZE:
+                break
+        data = b"".join(chunks)
+        return (data, owner) if with_owner else data
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+class PasswdMap:
+    """
+    uid -> 用户名映射
+    一次读取 /etc/passwd 并缓存，文件修改后重新加载；
+    passwd 中没有的 uid（LDAP 等）再通过 pwd 模块查询并缓存
+    """
+
+    def __init__(self, passwd_file: str = "/etc/passwd"):
+        self.passwd_file = passwd_file
+        self._mtime = None
+        self._names = {}
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.passwd_file).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        names = {}
+        try:
+            with open(self.passwd_file, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    parts = line.split(":")
+                    if len(parts) > 2 and parts[2].isdigit():
+                        names.setdefault(int(parts[2]), parts[0])
+        except OSError as e:
+            logger.error(f"读取passwd失败: {str(e)}")
+            return
+        self._names = names
+        self._mtime = mtime
+
+    def resolve_many(self, uids: Iterable[int]) -> Dict[int, str]:
+        """批量解析 uid，返回 {uid: 用户名}"""
+        self._reload()
+        result = {}
+        for uid in set(uids):
+            name = self._names.get(uid)
+            if name is None:
+                try:
+                    import pwd
+                    name = pwd.getpwuid(uid).pw_name
+                except (ImportError, KeyError):
+                    name = str(uid)
+                self._names[uid] = name
+            result[uid] = name
+        return result
+
+
+class ProcColumns:
+    """
+    按列保存的进程扫描结果
+    pid/ppid/uid/create_time 为 array，name/cmdline 为列表，第 i 行对应同一个进程
+    """
+
+    __slots__ = ("pid", "ppid", "uid", "create_time", "name", "cmdline", "usernames")
+
+    def __init__(self):
+        self.pid = array("i")
+        self.ppid = array("i")
+        self.uid = array("I")
+        self.create_time = array("d")
+        self.name = []
+        self.cmdline = []
+        self.usernames = {}
+
+    def __len__(self) -> int:
+        return len(self.pid)
+
+    def username(self, index: int) -> str:
+        uid = self.uid[index]
+        return self.usernames.get(uid, str(uid))
+
+    def records(self) -> List[Dict]:
+        """转换为收集器的进程记录（cmdline 为参数列表）"""
+        usernames = self.usernames
+        return [{
+            "pid": self.pid[i],
+            "ppid": self.ppid[i],
+            "name": self.name[i],
+            "username": usernames.get(self.uid[i], str(self.uid[i])),
+            "cmdline": self.cmdline[i].split("\0") if self.cmdline[i] else [],
+            "create_time": self.create_time[i],
+        } for i in range(len(self.pid))]
+
+
+class ProcScanner:
+    """/proc 快速扫描器（仅 Linux）"""
+
+    def __init__(self, proc_root: str = "/proc", passwd_map: Optional[PasswdMap] = None):
+        self.proc_root = proc_root
+        self.passwd_map = passwd_map or PasswdMap()
+        self._boot_time = None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    @staticmethod
+    def available(proc_root: str = "/proc") -> bool:
+        return os.path.exists(os.path.join(proc_root, "self", "stat"))
+
+    def boot_time(self) -> float:
+        if self._boot_time is None:
+            data = _read_file(os.path.join(self.proc_root, "stat")) or b""
+            self._boot_time = 0.0
+            for line in data.split(b"\n"):
+                if line.startswith(b"btime "):
+                    self._boot_time = float(line.split()[1])
+                    break
+        return self._boot_time
+
+    def scan(self, with_cmdline: bool = True, real_uid: bool = True) -> ProcColumns:
+        """
+        扫描全部进程
+
+        Args:
+            with_cmdline: 是否读取命令行（不需要时每个进程少读一个文件，但被截断的进程名无法恢复）
+            real_uid: 为True时从 status 读取真实uid，与 psutil 的用户名一致；
+                为False时使用 stat 文件的属主，省去读取 status（开销约为 stat 的1.5倍），
+                但不可转储（setuid 等）进程的用户会变为有效uid（通常为root）
+        """
+        columns = ProcColumns()
+        boot_time, ticks = self.boot_time(), self._ticks
+        root = self.proc_root
+
+        for entry in os.listdir(root):
+            if not entry.isdigit():
+                continue
+            base = f"{root}/{entry}/"
+            result = _read_file(base + "stat", with_owner=True)
+            if not result:
+                continue
+            stat, uid = result
+            try:
+                # comm 可能包含空格和括号，以最后一个 ")" 分隔
+                close = stat.rindex(b")")
+                name = stat[stat.index(b"(") + 1:close].decode("utf-8", "replace")
+                fields = stat[close + 2:].split(b" ", 20)
+                ppid = int(fields[1])
+                start_ticks = int(fields[19])
+                if real_uid:
+                    status = _read_file(base + "status")
+                    if not status:
+                        continue
+                    uid_at = status.index(b"\nUid:") + 5
+                    uid = int(status[uid_at:status.index(b"\t", uid_at + 1)].strip())
+            except (ValueError, IndexError):
+                continue
+
+            cmdline = ""
+            if with_cmdline:
+                raw = _read_file(base + "cmdline")
+                if raw:
+                    cmdline = raw.rstrip(b"\0").decode("utf-8", "replace")
+                    if len(name) == _COMM_LEN:
+                        name = self._full_name(name, cmdline)
+
+            columns.pid.append(int(entry))
+            columns.ppid.append(ppid)
+            columns.uid.append(uid)
+            columns.create_time.append(boot_time + start_ticks / ticks)
+            columns.name.append(name)
+            columns.cmdline.append(cmdline)
+
+        columns.usernames = self.passwd_map.resolve_many(columns.uid)
+        return columns
+
+    @staticmethod
+    def _full_name(comm: str, cmdline: str) -> str:
+        """comm 被截断时，cmdline 第一个参数的文件名以 comm 开头则使用该文件名"""
+        program = os.path.basename(cmdline.split("\0", 1)[0])
+        return program if program.startswith(comm) else comm
+
+
+# 全局实例
+proc_scanner = ProcScanner()
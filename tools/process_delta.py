@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+进程快照差异
+以 (pid, 创建时间) 标识进程，保存上一次的进程快照，只返回新启动、已退出和属性变化的进程
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config.constants import PROCESS_SNAPSHOT_FILE
+
+logger = logging.getLogger(__name__)
+
+# 参与变化比较的进程属性
+TRACKED_FIELDS = ("name", "username", "cmdline")
+
+
+def process_key(pid: int, create_time: float) -> str:
+    """进程标识：PID可能被复用，加上创建时间区分不同进程"""
+    return f"{pid}:{create_time:.2f}"
+
+
+class ProcessDeltaTracker:
+    """
+    进程快照差异跟踪器
+    - 快照保存在内存中，并写入 snapshot_file，程序重启后可继续计算差异
+    - 每次 update() 都以本次快照替换上一次快照
+    """
+
+    def __init__(self, snapshot_file: Optional[str] = PROCESS_SNAPSHOT_FILE):
+        """
+        Args:
+            snapshot_file: 快照文件路径，为None时只保存在内存中
+        """
+        self.snapshot_file = snapshot_file
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._snapshot_time = None
+
+    def _load(self):
+        if self._snapshot is not None or not self.snapshot_file:
+            return
+        try:
+            with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._snapshot = data.get("processes", {})
+            self._snapshot_time = data.get("time")
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"读取进程快照失败: {str(e)}")
+
+    def _save(self):
+        if not self.snapshot_file:
+            return
+        try:
+            directory = os.path.dirname(self.snapshot_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_file = f"{self.snapshot_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"time": self._snapshot_time, "processes": self._snapshot},
+                          f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_file, self.snapshot_file)
+        except OSError as e:
+            logger.error(f"保存进程快照失败: {str(e)}")
+
+    def update(self, processes: List[Tuple[str, Dict]]) -> Dict:
+        """
+        用新的快照替换上一次快照并返回差异
+
+        Args:
+            processes: [(进程标识, 进程信息字典)]
+
+        Returns:
+            {"summary": {...}, "started": [...], "exited": [...], "changed": [...]}
+        """
+        current = dict(processes)
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+
+        with self._lock:
+            self._load()
+            previous = self._snapshot
+            previous_time = self._snapshot_time
+            self._snapshot = current
+            self._snapshot_time = now
+            self._save()
+
+        if previous is None:
+            # 没有上一次快照时，全部进程视为新启动
+            previous = {}
+
+        started_keys = current.keys() - previous.keys()
+        exited_keys = previous.keys() - current.keys()
+
+        changed = []
+        for key in current.keys() & previous.keys():
+            old, new = previous[key], current[key]
+            changes = {field: [old.get(field), new.get(field)]
+                       for field in TRACKED_FIELDS if old.get(field) != new.get(field)}
+            if changes:
+                changed.append({"pid": new.get("pid"), "name": new.get("name"), "changes": changes})
+
+        by_pid = lambda item: item.get("pid") or 0
+        return {
+            "summary": {
+                "total": len(current),
+                "started": len(started_keys),
+                "exited": len(exited_keys),
+                "changed": len(changed),
+                "unchanged": len(current) - len(started_keys) - len(changed),
+                "previous_snapshot": previous_time,
+                "current_snapshot": now,
+            },
+            "started": sorted((current[key] for key in started_keys), key=by_pid),
+            "exited": sorted((previous[key] for key in exited_keys), key=by_pid),
+            "changed": sorted(changed, key=by_pid),
+        }
+
+    def reset(self):
+        """丢弃上一次快照"""
+        with self._lock:
+            self._snapshot = None
+            self._snapshot_time = None
+            if self.snapshot_file and os.path.exists(self.snapshot_file):
+                os.remove(self.snapshot_file)
+
+
+# 全局实例
+process_delta_tracker = ProcessDeltaTracker()
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+列式进程快照
+进程数据按列保存（pid/ppid/创建时间为 array，进程名、用户名、命令行为去重后的字符串表加 array 下标），
+过滤只生成共享列数据的视图（下标数组），JSON 只在交给 LLM 时渲染一次并缓存；
+渲染结果登记在 snapshot_registry 中，工具之间传回同一段文本时直接取回视图，不再 json.loads
+"""
+
+import sys
+import time
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from tools.output_encoder import encode_tool_output, decode_output
+
+# 输出中进程创建时间的格式（与原来的 GetProcessDetails 输出一致）
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _epoch(value) -> float:
+    """把记录中的创建时间（epoch 或 TIME_FORMAT 字符串）转换为epoch秒，无法解析时为0"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.strptime(value, TIME_FORMAT).timestamp()
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+class ProcessSnapshot:
+    """
+    列式进程快照
+    第 i 个进程: pid[i]、ppid[i]、create_time[i]，
+    进程名 names[name_id[i]]、用户名 users[user_id[i]]、命令行 cmdlines[cmdline_id[i]]
+    """
+
+    __slots__ = ("pid", "ppid", "create_time", "name_id", "user_id", "cmdline_id",
+                 "names", "users", "cmdlines", "taken_at", "_tables", "_time_order")
+
+    def __init__(self, taken_at: Optional[float] = None):
+        self.pid = array("i")
+        self.ppid = array("i")
+        self.create_time = array("d")
+        self.name_id = array("I")
+        self.user_id = array("I")
+        self.cmdline_id = array("I")
+        self.names = []
+        self.users = []
+        self.cmdlines = []
+        self.taken_at = taken_at if taken_at is not None else time.time()
+        # 构建时使用的 字符串 -> 下标 索引
+        self._tables = ({}, {}, {})
+        # 按创建时间排序的 (下标数组, 时间数组)，首次按时间过滤时生成
+        self._time_order = None
+
+    @staticmethod
+    def _intern(value: str, table: List[str], index: Dict[str, int]) -> int:
+        position = index.get(value)
+        if position is None:
+            position = len(table)
+            table.append(sys.intern(value) if len(value) < 256 else value)
+            index[value] = position
+        return position
+
+    def append(self, pid: int, ppid: int, name: str, username: str, cmdline: str, create_time: float):
+        names, users, cmdlines = self._tables
+        self.pid.append(pid)
+        self.ppid.append(ppid)
+        self.create_time.append(create_time)
+        self.name_id.append(self._intern(name or "", self.names, names))
+        self.user_id.append(self._intern(username or "", self.users, users))
+        self.cmdline_id.append(self._intern(cmdline or "", self.cmdlines, cmdlines))
+        self._time_order = None
+
+    @classmethod
+    def from_columns(cls, columns) -> "ProcessSnapshot":
+        """由 /proc 扫描结果（ProcColumns）构建"""
+        snapshot = cls()
+        usernames = columns.usernames
+        for i in range(len(columns)):
+            uid = columns.uid[i]
+            snapshot.append(columns.pid[i], columns.ppid[i], columns.name[i],
+                            usernames.get(uid, str(uid)), columns.cmdline[i].replace("\0", " "),
+                            columns.create_time[i])
+        return snapshot
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "ProcessSnapshot":
+        """由进程字典构建（收集器记录或解析后的工具输出），cmdline 可以是列表或字符串"""
+        snapshot = cls()
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            cmdline = record.get("cmdline") or ""
+            if isinstance(cmdline, list):
+                cmdline = " ".join(cmdline)
+            snapshot.append(int(record.get("pid") or 0), int(record.get("ppid") or 0),
+                            record.get("name") or "", record.get("username") or "",
+                            cmdline, _epoch(record.get("create_time")))
+        return snapshot
+
+    @classmethod
+    def from_output(cls, text) -> "ProcessSnapshot":
+        """由进程工具的输出文本（任意输出格式）构建，snapshot_registry 取不回视图时使用"""
+        data = decode_output(text)
+        if isinstance(data, dict):
+            data = data.get("processes", [])
+        if not isinstance(data, list):
+            raise ValueError("进程数据格式错误，期望列表格式")
+        return cls.from_records(data)
+
+    def __len__(self) -> int:
+        return len(self.pid)
+
+    def name(self, index: int) -> str:
+        return self.names[self.name_id[index]]
+
+    def record(self, index: int) -> Dict:
+        """第 index 个进程的字典（GetProcessDetails 的输出格式）"""
+        return {
+            'pid': self.pid[index],
+            'ppid': self.ppid[index],
+            'name': self.names[self.name_id[index]],
+            'username': self.users[self.user_id[index]] or None,
+            'cmdline': self.cmdlines[self.cmdline_id[index]],
+            'create_time': time.strftime(TIME_FORMAT, time.localtime(self.create_time[index])),
+        }
+
+    def time_order(self):
+        """按创建时间排序的下标和对应的时间，用于二分查找时间范围"""
+        if self._time_order is None:
+            create_time = self.create_time
+            order = array("I", sorted(range(len(create_time)), key=create_time.__getitem__))
+            self._time_order = (order, array("d", (create_time[i] for i in order)))
+        return self._time_order
+
+    def created_between(self, since: Optional[float] = None, until: Optional[float] = None,
+                        keep_unknown: bool = True) -> array:
+        """
+        创建时间在 [since, until] 内的进程下标（按原顺序），对排序后的时间二分查找
+
+        Args:
+            keep_unknown: 是否保留没有创建时间（为0）的进程
+        """
+        order, times = self.time_order()
+        unknown = bisect.bisect_right(times, 0.0)
+        low = bisect.bisect_left(times, since, unknown) if since is not None else unknown
+        high = bisect.bisect_right(times, until, low) if until is not None else len(times)
+        selected = list(order[low:high])
+        if keep_unknown:
+            selected.extend(order[:unknown])
+        selected.sort()
+        return array("I", selected)
+
+    def view(self, indices: Optional[array] = None) -> "ProcessView":
+        """全部进程（或指定下标）的视图"""
+        if indices is None:
+            indices = array("I", range(len(self.pid)))
+        return ProcessView(self, indices)
+
+
+class ProcessView:
+    """
+    快照的视图：只保存下标数组，列数据与快照共享
+    渲染结果按 (格式, token预算) 缓存
+    """
+
+    __slots__ = ("snapshot", "indices", "_rendered")
+
+    def __init__(self, snapshot: ProcessSnapshot, indices: array):
+        self.snapshot = snapshot
+        self.indices = indices
+        self._rendered = {}
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def created_between(self, since: Optional[float] = None, until: Optional[float] = None) -> "ProcessView":
+        """按epoch时间窗口过滤，没有创建时间的进程保留"""
+        snapshot = self.snapshot
+        if len(self.indices) == len(snapshot):
+            # 全量视图直接二分查找
+            return ProcessView(snapshot, snapshot.created_between(since, until))
+        low = since if since is not None else float("-inf")
+        high = until if until is not None else float("inf")
+        create_time = snapshot.create_time
+        return ProcessView(snapshot, array("I", (i for i in self.indices
+                                                 if not create_time[i] or low <= create_time[i] <= high)))
+
+    def where(self, predicate) -> "ProcessView":
+        """按下标过滤，predicate(snapshot, index) 为True的进程保留"""
+        snapshot = self.snapshot
+        return ProcessView(snapshot, array("I", (i for i in self.indices if predicate(snapshot, i))))
+
+    def records(self) -> List[Dict]:
+        record = self.snapshot.record
+        return [record(i) for i in self.indices]
+
+    def names(self) -> List[str]:
+        """视图中的进程名（去重）"""
+        snapshot = self.snapshot
+        return [snapshot.names[name_id] for name_id in {snapshot.name_id[i] for i in self.indices}]
+
+    def render(self, tool_name: str = "GetProcessDetails", output_format: Optional[str] = None,
+               token_budget: Optional[int] = None, records: Optional[List[Dict]] = None) -> str:
+        """
+        渲染为工具输出文本，同一视图相同参数只渲染一次，并登记到 snapshot_registry
+
+        Args:
+            records: 已经生成的 records()，传入时不再重复生成
+        """
+        key = (tool_name, output_format, token_budget)
+        text = self._rendered.get(key)
+        if text is None:
+            text = encode_tool_output(tool_name, records if records is not None else self.records(),
+                                      output_format, token_budget)
+            self._rendered[key] = text
+            snapshot_registry.remember(text, self)
+        return text
+
+
+class SnapshotRegistry:
+    """
+    最近渲染过的视图
+    工具的输出经由 LLM 原样传给下一个工具时，按文本取回视图，避免重新解析JSON
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def remember(self, text: str, view: ProcessView):
+        with self._lock:
+            self._entries[text] = view
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resolve(self, text) -> Optional[ProcessView]:
+        """文本与某次渲染结果完全一致时返回对应视图"""
+        if not isinstance(text, str):
+            return None
+        with self._lock:
+            return self._entries.get(text)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 全局实例
+snapshot_registry = SnapshotRegistry()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+进程树
+由一次进程快照在 O(n) 时间内建立 父进程 -> 子进程 索引，计算每个进程的特征：
+- 深度
+- 已知程序的父进程异常（例如 lsass.exe 不是由 wininit.exe 启动，Office/Web 服务进程启动了 shell）
+- 孤儿 shell（父进程已不存在，或被 init/systemd 收养）
+只把被标记的进程子树交给 LLM，减少提示词长度
+"""
+
+from array import array
+from typing import Dict, List, Optional
+
+from tools.process_snapshot import ProcessSnapshot
+
+# 已知程序的正常父进程（小写进程名）
+EXPECTED_PARENTS = {
+    "smss.exe": {"system", "smss.exe"},
+    "csrss.exe": {"smss.exe"},
+    "wininit.exe": {"smss.exe"},
+    "winlogon.exe": {"smss.exe"},
+    "services.exe": {"wininit.exe"},
+    "lsass.exe": {"wininit.exe"},
+    "lsaiso.exe": {"wininit.exe"},
+    "svchost.exe": {"services.exe", "msmpeng.exe"},
+    "taskhostw.exe": {"svchost.exe"},
+    "runtimebroker.exe": {"svchost.exe"},
+    "userinit.exe": {"winlogon.exe"},
+    "explorer.exe": {"userinit.exe", "winlogon.exe"},
+    "sshd": {"sshd", "systemd", "init"},
+    "cron": {"systemd", "init"},
+    "crond": {"systemd", "init"},
+    "systemd-journald": {"systemd"},
+    "systemd-logind": {"systemd"},
+}
+
+# 命令解释器
+SHELL_NAMES = {
+    "cmd.exe", "powershell.exe", "pwsh.exe", "wscript.exe", "cscript.exe", "mshta.exe",
+    "bash", "sh", "dash", "zsh", "ksh", "csh", "tcsh", "fish", "pwsh",
+}
+
+# 正常情况下不应该启动 shell 的父进程（文档、浏览器、Web/数据库服务）
+SHELL_SUSPICIOUS_PARENTS = {
+    "winword.exe", "excel.exe", "powerpnt.exe", "outlook.exe", "acrord32.exe", "w3wp.exe",
+    "sqlservr.exe", "chrome.exe", "msedge.exe", "firefox.exe",
+    "httpd", "apache2", "nginx", "php-fpm", "lighttpd", "mysqld", "postgres", "tomcat",
+}
+
+# 收养孤儿进程的 init 进程
+INIT_NAMES = {"systemd", "init"}
+
+# 每个被标记子树最多输出的进程数和深度
+MAX_SUBTREE_NODES = 50
+MAX_SUBTREE_DEPTH = 6
+# 祖先链最多输出的层数
+MAX_ANCESTRY = 8
+# 子树中命令行的最大长度
+MAX_CMDLINE_LENGTH = 200
+
+
+class ProcessTree:
+    """
+    快照的进程树
+    第 i 个进程的父进程下标为 parent[i]（-1 表示父进程不在快照中），
+    子进程下标为 child_index[child_start[i]:child_start[i + 1]]；
+    树始终由完整快照建立，selected 只决定检查和报告哪些进程
+    """
+
+    def __init__(self, snapshot: ProcessSnapshot, indices: Optional[array] = None, partial: bool = False):
+        """
+        Args:
+            snapshot: 进程快照
+            indices: 要检查的进程下标（过滤后的视图），为None时检查全部进程
+            partial: 快照本身只含部分进程（例如解析自过滤后的工具输出）时为True，
+                父进程不在快照中不再视为已退出
+        """
+        self.snapshot = snapshot
+        self.partial = partial
+        count = len(snapshot)
+        self.selected = range(count) if indices is None else indices
+        position = {pid: i for i, pid in enumerate(snapshot.pid)}
+
+        self.parent = array("i", [-1]) * count
+        child_count = array("I", [0]) * (count + 1)
+        for i in range(count):
+            ppid = snapshot.ppid[i]
+            j = position.get(ppid, -1) if ppid != snapshot.pid[i] else -1
+            self.parent[i] = j
+            if j >= 0:
+                child_count[j + 1] += 1
+
+        # 按父进程分组的子进程下标（计数排序）
+        for i in range(count):
+            child_count[i + 1] += child_count[i]
+        self.child_start = child_count
+        self.child_index = array("I", [0]) * child_count[count]
+        fill = array("I", child_count[:count])
+        for i in range(count):
+            j = self.parent[i]
+            if j >= 0:
+                self.child_index[fill[j]] = i
+                fill[j] += 1
+
+        self.roots = [i for i in range(count) if self.parent[i] < 0]
+        self.depth = array("I", [0]) * count
+        stack = list(self.roots)
+        while stack:
+            i = stack.pop()
+            for child in self.children(i):
+                self.depth[child] = self.depth[i] + 1
+                stack.append(child)
+
+    def children(self, index: int) -> array:
+        return self.child_index[self.child_start[index]:self.child_start[index + 1]]
+
+    def _name(self, index: int) -> str:
+        return self.snapshot.name(index).lower()
+
+    def reasons(self, index: int) -> List[str]:
+        """进程被标记的原因，没有异常时为空列表"""
+        name = self._name(index)
+        parent = self.parent[index]
+        parent_name = self._name(parent) if parent >= 0 else None
+        reasons = []
+
+        expected = EXPECTED_PARENTS.get(name)
+        if expected is not None and parent_name is not None and parent_name not in expected:
+            reasons.append(f"父进程异常: {name} 通常由 {'/'.join(sorted(expected))} 启动，实际为 {parent_name}")
+
+        if name in SHELL_NAMES:
+            if parent_name in SHELL_SUSPICIOUS_PARENTS:
+                reasons.append(f"{parent_name} 启动了命令解释器")
+            elif self.snapshot.ppid[index] > 0 and (parent_name in INIT_NAMES or (parent < 0 and not self.partial)):
+                reasons.append("孤儿shell: 父进程已退出")
+        return reasons
+
+    def _ancestry(self, index: int) -> List[str]:
+        chain = []
+        parent = self.parent[index]
+        while parent >= 0 and len(chain) < MAX_ANCESTRY:
+            chain.append(f"{self.snapshot.name(parent)}({self.snapshot.pid[parent]})")
+            parent = self.parent[parent]
+        return chain[::-1]
+
+    def _subtree(self, index: int, flags: Dict[int, List[str]], budget: List[int], depth: int = 0) -> Dict:
+        snapshot = self.snapshot
+        budget[0] -= 1
+        node = {
+            "pid": snapshot.pid[index],
+            "name": snapshot.name(index),
+            "user": snapshot.users[snapshot.user_id[index]] or None,
+            "cmdline": snapshot.cmdlines[snapshot.cmdline_id[index]][:MAX_CMDLINE_LENGTH],
+        }
+        if index in flags:
+            node["reasons"] = flags[index]
+        children = self.children(index)
+        if children:
+            if depth >= MAX_SUBTREE_DEPTH:
+                node["omitted_children"] = len(children)
+                return node
+            node["children"] = []
+            for n, child in enumerate(children):
+                if budget[0] <= 0:
+                    node["omitted_children"] = len(children) - n
+                    break
+                node["children"].append(self._subtree(child, flags, budget, depth + 1))
+        return node
+
+    def analyze(self) -> Dict:
+        """
+        返回摘要和被标记的子树
+
+        被标记进程的祖先中已有被标记进程时，它只出现在祖先的子树中
+        """
+        flags = {}
+        for i in self.selected:
+            reasons = self.reasons(i)
+            if reasons:
+                flags[i] = reasons
+
+        flagged = []
+        for index in sorted(flags, key=lambda i: self.depth[i]):
+            parent = self.parent[index]
+            nested = False
+            while parent >= 0:
+                if parent in flags:
+                    nested = True
+                    break
+                parent = self.parent[parent]
+            if nested:
+                continue
+            flagged.append({
+                "pid": self.snapshot.pid[index],
+                "name": self.snapshot.name(index),
+                "depth": self.depth[index],
+                "reasons": flags[index],
+                "ancestry": self._ancestry(index),
+                "subtree": self._subtree(index, flags, [MAX_SUBTREE_NODES]),
+            })
+
+        return {
+            "summary": {
+                "total": len(self.selected),
+                "roots": len(self.roots),
+                "max_depth": max((self.depth[i] for i in self.selected), default=0),
+                "flagged": len(flags),
+                "flagged_subtrees": len(flagged),
+            },
+            "flagged": flagged,
+        }
+
+
+def build_tree(snapshot: ProcessSnapshot, indices: Optional[array] = None, partial: bool = False) -> ProcessTree:
+    """
+    由快照建立进程树，indices 为过滤后的进程下标时只检查这些进程；
+    父子关系和父进程是否存在始终按完整快照判断，过滤掉的父进程不会让子进程被误判为孤儿
+    """
+    if indices is not None and len(indices) == len(snapshot):
+        indices = None
+    return ProcessTree(snapshot, indices, partial)
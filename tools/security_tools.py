@@ -11,7 +11,29 @@ from crewai.tools import tool
 from config import logger
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from tools.whitelist_store import WHITELIST_SECTIONS, whitelist_store
+from tools.baseline_diff import diff_processes
+from tools.process_delta import process_delta_tracker, process_key
+from tools.process_snapshot import ProcessSnapshot, snapshot_registry
+from tools.process_tree import build_tree
+from tools.output_encoder import encode_tool_output, decode_output
+from tools.history_store import history_store
+from tools.history_db import history_db, parse_epoch_bound
+from tools.log_ingest import log_ingestor, filter_log_text
+from tools.collectors import system_collector
+from tools.service_snapshot import ServiceSnapshot, service_tracker, CRITICAL_SERVICES
+from tools.connection_table import aggregate_connections, summarize_groups, load_connection_groups
+from tools.ip_classifier import ip_classifier, DENY
+from tools.threat_intel import threat_intel
+from tools.detection_rules import detection_rules
+from tools.pre_triage import pre_triage
+from config.constants import (
+    DEPARTMENT_HISTORY_PAGE_SIZE, LOG_INGEST_MAX_EVENTS, BASELINE_REPORT_MAX_ITEMS,
+    HISTORY_SUMMARY_ITEMS, HISTORY_SUMMARY_CONTENT_CHARS
+)
+from typing import Optional
 
 # -------------------------------
 # 安全工具实现
@@ -25,29 +47,38 @@ except ImportError:
 
 # 修改 GetProcessDetails 工具
 @tool("GetProcessDetails")
-def get_process_details() -> str:
-    """获取当前系统进程详情"""
+def get_process_details(mode: str = "full", output_format: Optional[str] = None,
+                        token_budget: Optional[int] = None) -> str:
+    """
+    获取当前系统进程详情
+    
+    参数:
+        mode: "full" 返回全部进程（默认）；"delta" 只返回自上次调用以来新启动、已退出和
+              属性变化的进程，以及数量摘要
+        output_format: 输出格式 "json"/"compact"/"columnar"/"csv"，默认使用工具配置
+        token_budget: token预算，超出时截断并标注省略的行数，默认使用工具配置
+    """
     _log_tool_output("正在获取系统进程详情...")
     try:
-        if psutil is None:
-            return "获取进程详情时出错: psutil 库未安装"
-        
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'username', 'cmdline', 'create_time']):
-            try:
-                pinfo = proc.info
-                processes.append({
-                    'pid': pinfo['pid'],
-                    'name': pinfo['name'],
-                    'username': pinfo['username'],
-                    'cmdline': ' '.join(pinfo['cmdline']) if pinfo['cmdline'] else '',
-                    'create_time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(pinfo['create_time']))
-                })
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
+        view = system_collector.snapshot().view()
+        processes = view.records()
+        snapshot = view.snapshot
+        # 预分诊按本次收集的快照计算进程部门的数据摘要
+        pre_triage.observe("process", snapshot)
+        
+        # 两种模式都刷新快照，下一次 delta 调用与本次结果比较
+        delta = process_delta_tracker.update(
+            [(process_key(snapshot.pid[i], snapshot.create_time[i]), processes[n])
+             for n, i in enumerate(view.indices)])
+        
+        if mode == "delta":
+            summary = delta["summary"]
+            _log_tool_output(f"进程变化: 新启动 {summary['started']} 个，已退出 {summary['exited']} 个，"
+                             f"属性变化 {summary['changed']} 个（共 {summary['total']} 个进程）")
+            return encode_tool_output("GetProcessDetails", delta, output_format, token_budget)
         
         _log_tool_output(f"成功获取到 {len(processes)} 个进程信息")
-        return json.dumps(processes, ensure_ascii=False, indent=2)
+        return view.render("GetProcessDetails", output_format, token_budget, records=processes)
     except Exception as e:
         error_msg = f"获取进程详情时出错: {str(e)}"
         _log_tool_output(error_msg)
@@ -74,28 +105,114 @@ def get_process_details() -> str:
         logger.error(f"获取进程详情失败: {str(e)}")
         return f"错误: {str(e)}"
 
+@tool("BuildProcessTree")
+def build_process_tree(processes_data: str = "", output_format: Optional[str] = None,
+                       token_budget: Optional[int] = None) -> str:
+    """
+    建立进程树并只返回被标记的进程子树：已知系统程序的父进程异常、
+    文档/Web服务进程启动的命令解释器、父进程已退出的孤儿shell
+    
+    参数:
+        processes_data: GetProcessDetails/FilterProcessesByTime 的输出，为空时获取当前进程
+        output_format: 输出格式 "json"/"compact"/"columnar"/"csv"，默认使用工具配置
+        token_budget: token预算，超出时截断并标注省略的行数，默认使用工具配置
+    """
+    _log_tool_output("正在建立进程树...")
+    try:
+        partial = False
+        if processes_data:
+            view = snapshot_registry.resolve(processes_data)
+            if view is None:
+                # 重新解析的进程列表可能已经过滤，父进程不在列表中不能判断为已退出；
+                # 没有 ppid 字段时无法还原父子关系，全部视为根进程
+                view = ProcessSnapshot.from_output(processes_data).view()
+                partial = True
+        else:
+            view = system_collector.snapshot().view()
+        
+        result = build_tree(view.snapshot, view.indices, partial).analyze()
+        summary = result["summary"]
+        _log_tool_output(f"进程树: 共 {summary['total']} 个进程，最大深度 {summary['max_depth']}，"
+                         f"标记 {summary['flagged']} 个进程")
+        return encode_tool_output("BuildProcessTree", result, output_format, token_budget)
+    except Exception as e:
+        logger.error(f"建立进程树失败: {str(e)}")
+        return f"建立进程树失败: {str(e)}"
+
 @tool("GetWindowsLogs")
-def get_windows_logs() -> str:
-    """获取Windows安全事件日志，包括登录失败、权限提升和进程创建事件"""
-    logs = []
-    event_ids = ["4625", "4672", "4688"]  # 关注的事件ID
+def get_windows_logs(incremental: bool = True) -> str:
+    """
+    获取系统安全事件日志：Windows 上为登录失败、权限提升和进程创建事件，
+    Linux 上为 sshd、sudo 等认证程序的日志
     
-    for event_id in event_ids:
-        cmd = f'powershell -Command "Get-WinEvent -FilterHashtable @{{LogName=\'Security\';ID=\'{event_id}\'}} -MaxEvents 5 | Format-List"'
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
-            logs.append(result.stdout)
-        except Exception as e:
-            logger.error(f"获取事件日志失败: {str(e)}")
+    参数:
+        incremental: 为True时只获取上次读取之后的新事件；
+                     为False时获取最近的事件（Windows 每个事件ID 5条，Linux 最近24小时）
+    """
+    try:
+        return system_collector.security_events(incremental)
+    except Exception as e:
+        logger.error(f"获取事件日志失败: {str(e)}")
+        return f"错误: {str(e)}"
+
+@tool("ReadNewLogEvents")
+def read_new_log_events(hours_back: int = 24, source: str = "", max_events: int = LOG_INGEST_MAX_EVENTS,
+                        output_format: Optional[str] = None, token_budget: Optional[int] = None) -> str:
+    """
+    增量读取本地日志（syslog、journal JSON导出、Windows事件日志JSON导出）
+    只返回上次读取之后新增、且在时间窗口内的事件
     
-    return "\n".join(logs)
+    参数:
+        hours_back: 只返回最近多少小时内的事件
+        source: 只读取指定的日志来源（见 LOG_INGEST_SOURCES），为空时读取全部来源
+        max_events: 最多返回的事件数（游标停在最后一个返回的事件之后，其余事件在下一次调用返回）
+        output_format: 输出格式 "json"/"compact"/"columnar"/"csv"，默认使用工具配置
+        token_budget: token预算，超出时截断并标注省略的行数，默认使用工具配置
+    """
+    _log_tool_output("正在读取新增日志事件...")
+    try:
+        since = time.time() - hours_back * 3600
+        events = []
+        for event in log_ingestor.iter_new_events(since=since, source_name=source or None, max_events=max_events):
+            event.pop("epoch", None)
+            events.append(event)
+        
+        result = {
+            "summary": {
+                "sources": [s.name for s in log_ingestor.available_sources()],
+                "returned": len(events),
+                # 达到 max_events 时可能还有未返回的新事件，再次调用继续读取
+                "has_more": len(events) >= max_events,
+            },
+            "events": events,
+        }
+        return encode_tool_output("ReadNewLogEvents", result, output_format, token_budget)
+    except Exception as e:
+        logger.error(f"读取新增日志事件失败: {str(e)}")
+        return f"读取新增日志事件失败: {str(e)}"
 
 @tool("GetServices")
-def get_services() -> str:
-    """获取当前系统中运行的服务列表"""
+def get_services(mode: str = "full", output_format: Optional[str] = None,
+                 token_budget: Optional[int] = None) -> str:
+    """
+    获取当前系统中的服务列表（名称、显示名、状态、PID、程序路径、启动类型）
+    
+    参数:
+        mode: "full" 返回全部服务（默认）；"delta" 只返回自上一次分析以来新增、删除和
+              属性变化的服务，以及数量摘要
+        output_format: 输出格式 "json"/"compact"/"columnar"/"csv"，默认使用工具配置
+        token_budget: token预算，超出时截断并标注省略的行数，默认使用工具配置
+    """
     try:
-        result = subprocess.run(["sc", "query"], capture_output=True, text=True, encoding="utf-8", errors="ignore")
-        return result.stdout
+        snapshot = ServiceSnapshot(system_collector.services())
+        pre_triage.observe("service", snapshot.services)
+        # 两种模式都记录待确认的快照，经过服务分析工具分析（或服务部门分析完成）后才成为下一次 delta 的比较基准
+        delta = service_tracker.update(snapshot)
+        result = delta if mode == "delta" else snapshot.services
+        text = encode_tool_output("GetServices", result, output_format, token_budget)
+        # 分析工具收到这段输出时直接取回快照（delta 输出对应完整快照）
+        service_tracker.remember(text, snapshot)
+        return text
     except Exception as e:
         logger.error(f"获取服务列表失败: {str(e)}")
         return f"错误: {str(e)}"
@@ -134,23 +251,16 @@ def load_baseline_processes() -> str:
 def terminate_process(process_name: str) -> str:
     """终止指定的进程"""
     try:
-        subprocess.run(["taskkill", "/F", "/IM", process_name])
-        return f"已尝试终止进程: {process_name}"
+        return system_collector.terminate_process(process_name)
     except Exception as e:
         logger.error(f"终止进程失败: {str(e)}")
         return f"错误: {str(e)}"
 
 @tool("BlockIP")
 def block_ip(ip_address: str) -> str:
-    """在Windows防火墙中阻止指定的IP地址"""
+    """在系统防火墙中阻止指定的IP地址（Windows 防火墙或 iptables/nftables）"""
     try:
-        rule_name = f"Block_{ip_address}"
-        subprocess.run([
-            "netsh", "advfirewall", "firewall", "add", "rule",
-            f"name={rule_name}", "dir=in", "action=block", 
-            f"remoteip={ip_address}"
-        ])
-        return f"已在防火墙中阻止IP: {ip_address}"
+        return system_collector.block_ip(ip_address)
     except Exception as e:
         logger.error(f"阻止IP失败: {str(e)}")
         return f"错误: {str(e)}"
@@ -309,11 +419,7 @@ def generate_security_report(threat_info: str, response_info: str) -> str:
 def FindNetstate() -> str:
     """获取当前系统中网络连接的详细信息"""
     try:
-        result = subprocess.run(
-            ['netstat', '-ano'],
-            capture_output=True, text=True, encoding="utf-8", errors="ignore"
-        )
-        return str(result.stdout)
+        return system_collector.connections_text()
     except Exception as e:
         logger.error(f"获取网络连接信息失败: {str(e)}")
         return f"错误: {str(e)}"
@@ -322,24 +428,13 @@ def FindNetstate() -> str:
 @tool("ReadWhitelist")
 def read_whitelist() -> str:
     """读取白名单文件，获取已记录的安全项目"""
-    if os.path.exists(WHITELIST_FILE):
-        try:
-            with open(WHITELIST_FILE, "r", encoding="utf-8") as f:
-                whitelist = json.load(f)
-                return json.dumps(whitelist, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"读取白名单失败: {str(e)}")
-            return json.dumps({"status": "error", "message": f"读取白名单失败: {str(e)}", "items": []})
-    else:
+    try:
         # 如果文件不存在，创建一个空白名单
-        try:
-            with open(WHITELIST_FILE, "w", encoding="utf-8") as f:
-                empty_whitelist = {"processes": [], "ips": [], "services": []}
-                json.dump(empty_whitelist, f, ensure_ascii=False, indent=2)
-            return json.dumps(empty_whitelist, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"创建白名单失败: {str(e)}")
-            return json.dumps({"status": "error", "message": f"创建白名单失败: {str(e)}", "items": []})
+        whitelist = whitelist_store.read(create=True)
+        return json.dumps(whitelist, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.error(f"读取白名单失败: {str(e)}")
+        return json.dumps({"status": "error", "message": f"读取白名单失败: {str(e)}", "items": []})
 
 @tool("AddToWhitelist")
 def add_to_whitelist(item_type: str, item_name: str, reason: str, response_time: str = None) -> str:
@@ -355,65 +450,21 @@ def add_to_whitelist(item_type: str, item_name: str, reason: str, response_time:
     返回:
         添加结果
     """
-    # 确保白名单文件存在
-    if not os.path.exists(WHITELIST_FILE):
-        with open(WHITELIST_FILE, "w", encoding="utf-8") as f:
-            json.dump({"processes": [], "ips": [], "services": []}, f, ensure_ascii=False, indent=2)
+    if item_type not in WHITELIST_SECTIONS:
+        return json.dumps({"status": "error", "message": f"未知的项目类型: {item_type}"})
     
     try:
-        # 读取现有白名单
-        with open(WHITELIST_FILE, "r", encoding="utf-8") as f:
-            whitelist = json.load(f)
-        
-        # 确保所有必要的键存在
-        if "processes" not in whitelist:
-            whitelist["processes"] = []
-        if "ips" not in whitelist:
-            whitelist["ips"] = []
-        if "services" not in whitelist:
-            whitelist["services"] = []
-        
-        # 根据项目类型添加到相应列表
-        if item_type == "process":
-            target_list = whitelist["processes"]
-            item_key = "name"
-        elif item_type == "ip":
-            target_list = whitelist["ips"]
-            item_key = "address"
-        elif item_type == "service":
-            target_list = whitelist["services"]
-            item_key = "name"
-        else:
-            return json.dumps({"status": "error", "message": f"未知的项目类型: {item_type}"})
+        status, item = whitelist_store.add(item_type, item_name, reason, response_time)
         
         # 检查项目是否已存在
-        for item in target_list:
-            if item.get(item_key) == item_name:
-                return json.dumps({"status": "exists", "message": f"{item_type} '{item_name}' 已在白名单中"})
-        
-        # 设置响应时间和记录时间
-        current_time = time.strftime("%Y-%m-%d %H:%M:%S")
-        if response_time is None:
-            response_time = current_time
-            
-        # 添加新项目
-        new_item = {
-            item_key: item_name,
-            "reason": reason,
-            "response_time": response_time,  # 响应时间
-            "record_time": current_time      # 记录时间
-        }
-        target_list.append(new_item)
-        
-        # 保存更新后的白名单
-        with open(WHITELIST_FILE, "w", encoding="utf-8") as f:
-            json.dump(whitelist, f, ensure_ascii=False, indent=2)
+        if status == "exists":
+            return json.dumps({"status": "exists", "message": f"{item_type} '{item_name}' 已在白名单中"})
         
         return json.dumps({
             "status": "success", 
             "message": f"已将 {item_type} '{item_name}' 添加到白名单",
-            "response_time": response_time,
-            "record_time": current_time
+            "response_time": item["response_time"],
+            "record_time": item["record_time"]
         })
         
     except Exception as e:
@@ -432,35 +483,20 @@ def check_whitelist(item_type: str, item_name: str) -> str:
     返回:
         检查结果
     """
-    if not os.path.exists(WHITELIST_FILE):  # 修改这里
+    if not whitelist_store.exists():
         return json.dumps({"status": "not_found", "message": "白名单文件不存在"})
     
+    if item_type not in WHITELIST_SECTIONS:
+        return json.dumps({"status": "error", "message": f"未知的项目类型: {item_type}"})
+    
     try:
-        # 读取白名单
-        with open(WHITELIST_FILE, "r", encoding="utf-8") as f:  # 修改这里
-            whitelist = json.load(f)
-        
-        # 根据项目类型选择相应列表
-        if item_type == "process":
-            target_list = whitelist.get("processes", [])
-            item_key = "name"
-        elif item_type == "ip":
-            target_list = whitelist.get("ips", [])
-            item_key = "address"
-        elif item_type == "service":
-            target_list = whitelist.get("services", [])
-            item_key = "name"
-        else:
-            return json.dumps({"status": "error", "message": f"未知的项目类型: {item_type}"})
-        
-        # 检查项目是否存在
-        for item in target_list:
-            if item.get(item_key) == item_name:
-                return json.dumps({
-                    "status": "found", 
-                    "message": f"{item_type} '{item_name}' 在白名单中",
-                    "details": item
-                })
+        item = whitelist_store.check(item_type, item_name)
+        if item is not None:
+            return json.dumps({
+                "status": "found", 
+                "message": f"{item_type} '{item_name}' 在白名单中",
+                "details": item
+            })
         
         return json.dumps({"status": "not_found", "message": f"{item_type} '{item_name}' 不在白名单中"})
         
@@ -468,6 +504,40 @@ def check_whitelist(item_type: str, item_name: str) -> str:
         logger.error(f"检查白名单失败: {str(e)}")
         return json.dumps({"status": "error", "message": f"检查白名单失败: {str(e)}"})
 
+@tool("CheckWhitelistBatch")
+def check_whitelist_batch(item_type: str, item_names: str) -> str:
+    """
+    批量检查多个项目是否在白名单中
+    
+    参数:
+        item_type: 项目类型，可以是 'process', 'ip', 或 'service'
+        item_names: 项目名称的JSON数组字符串，或以逗号分隔的名称
+        
+    返回:
+        检查结果，包含在白名单中的项目和不在白名单中的项目
+    """
+    if item_type not in WHITELIST_SECTIONS:
+        return json.dumps({"status": "error", "message": f"未知的项目类型: {item_type}"})
+    
+    try:
+        try:
+            names = json.loads(item_names)
+        except json.JSONDecodeError:
+            names = [name.strip() for name in item_names.split(",") if name.strip()]
+        if not isinstance(names, list):
+            names = [names]
+        
+        matches = whitelist_store.check_many(item_type, [str(name) for name in names])
+        return json.dumps({
+            "status": "success",
+            "found": {name: item for name, item in matches.items() if item is not None},
+            "not_found": [name for name, item in matches.items() if item is None]
+        }, ensure_ascii=False)
+        
+    except Exception as e:
+        logger.error(f"批量检查白名单失败: {str(e)}")
+        return json.dumps({"status": "error", "message": f"批量检查白名单失败: {str(e)}"})
+
 @tool("AddSuggestionNote")
 def add_suggestion_note(suggestion: str, source: str = "系统", response_time: str = None) -> str:
     """
@@ -758,27 +828,29 @@ def _log_tool_output(message):
     logging.info(f"[工具输出] {message}")
 
 @tool("CompareWithBaseline")
-def compare_with_baseline(process_list: str = None) -> str:
+def compare_with_baseline(process_list: str = None, output_format: str = "text") -> str:
     """
     将当前进程与基线进程进行比较，识别异常进程
     
     参数:
         process_list: 当前进程列表的JSON字符串，如果为None则自动获取
+        output_format: 输出格式，"text" 为摘要文本报告，"json" 为结构化结果
         
     返回:
         比较结果的字符串描述
     """
     try:
-        # 如果没有提供进程列表，则获取当前进程
-        if not process_list:
-            process_list = get_process_details()
+        # 如果没有提供进程列表，则获取当前进程；GetProcessDetails/FilterProcessesByTime 的输出直接取回快照视图
+        view = system_collector.snapshot().view() if not process_list else snapshot_registry.resolve(process_list)
         
         # 解析进程列表
-        if isinstance(process_list, str):
+        if view is not None:
+            current_processes = view.records()
+        elif isinstance(process_list, str):
             try:
-                current_processes = json.loads(process_list)
-            except json.JSONDecodeError as e:
-                return f"进程数据JSON解析失败: {str(e)}。原始数据: {process_list[:100]}..."
+                current_processes = decode_output(process_list)
+            except ValueError as e:
+                return f"进程数据解析失败: {str(e)}。原始数据: {process_list[:100]}..."
         else:
             current_processes = process_list
         
@@ -797,72 +869,25 @@ def compare_with_baseline(process_list: str = None) -> str:
         else:
             return "基线进程文件不存在，无法进行比较"
         
-        # 将基线进程转换为字典，便于查找
-        baseline_dict = {}
-        for p in baseline_processes:
-            if isinstance(p, dict) and 'name' in p:
-                baseline_dict[p['name'].lower()] = p
-        
-        # 比较进程
-        suspicious_processes = []
-        for process in current_processes:
-            # 检查process是否为字典类型
-            if isinstance(process, str):
-                # 如果是字符串，跳过或尝试解析
-                continue
-            if not isinstance(process, dict) or 'name' not in process:
-                # 如果不是字典或没有name字段，跳过
-                continue
-            process_name = process['name'].lower()
-            
-            # 检查进程是否在白名单中
-            whitelist_result = check_whitelist("process", process_name)
-            try:
-                whitelist_status = json.loads(whitelist_result).get("status")
-                if whitelist_status == "found":
-                    continue
-            except:
-                pass
-                
-            # 检查进程是否在基线中
-            if process_name not in baseline_dict:
-                suspicious_processes.append({
-                    'name': process['name'],
-                    'pid': process['pid'],
-                    'reason': '不在基线中的进程',
-                    'details': process
-                })
-                continue
-                
-            # 检查进程路径是否与基线一致
-            baseline_process = baseline_dict[process_name]
-            if 'path' in process and 'path' in baseline_process:
-                if process['path'].lower() != baseline_process['path'].lower():
-                    suspicious_processes.append({
-                        'name': process['name'],
-                        'pid': process['pid'],
-                        'reason': '进程路径与基线不一致',
-                        'baseline_path': baseline_process['path'],
-                        'current_path': process['path'],
-                        'details': process
-                    })
+        if not isinstance(baseline_processes, list):
+            baseline_processes = []
         
-        # 生成报告
-        if not suspicious_processes:
-            return "未发现异常进程，所有进程均符合基线要求"
+        # 一次性批量检查白名单
+        process_names = {p['name'].lower() for p in current_processes
+                         if isinstance(p, dict) and p.get('name')}
+        try:
+            whitelist_matches = whitelist_store.check_many("process", process_names)
+            whitelisted = {name for name, item in whitelist_matches.items() if item is not None}
+        except Exception as e:
+            logger.error(f"检查白名单失败: {str(e)}")
+            whitelisted = set()
         
-        report = f"发现 {len(suspicious_processes)} 个异常进程:\n\n"
-        for i, proc in enumerate(suspicious_processes, 1):
-            report += f"{i}. 进程名: {proc['name']} (PID: {proc['pid']})\n"
-            report += f"   原因: {proc['reason']}\n"
-            
-            if 'baseline_path' in proc:
-                report += f"   基线路径: {proc['baseline_path']}\n"
-                report += f"   当前路径: {proc['current_path']}\n"
-            
-            report += f"   详情: {json.dumps(proc['details'], ensure_ascii=False, indent=2)}\n\n"
+        # 基于集合运算计算差异
+        diff = diff_processes(current_processes, baseline_processes, whitelisted)
         
-        return report
+        if output_format == "json":
+            return json.dumps(diff.to_dict(BASELINE_REPORT_MAX_ITEMS), ensure_ascii=False)
+        return diff.render(BASELINE_REPORT_MAX_ITEMS)
         
     except Exception as e:
         import traceback
@@ -874,86 +899,183 @@ def compare_with_baseline(process_list: str = None) -> str:
 # 部门历史管理工具
 # -------------------------------
 
-# 部门历史文件路径
-DEPARTMENT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                     "data", "department_history")
+# 部门历史保存在分段存储中（data/department_history/<部门>/），
+# 旧的 analysis_history.json 在首次访问时自动迁移
 
-def _get_department_history_file(department: str) -> str:
-    """获取部门历史文件路径"""
-    return os.path.join(DEPARTMENT_HISTORY_DIR, department, "analysis_history.json")
+# 有历史记录的部门
+HISTORY_DEPARTMENTS = ["process_department", "log_department", "service_department",
+                       "network_department", "response_department", "coordination_department"]
 
 def _load_department_history(department: str) -> list:
-    """加载部门历史记录"""
-    history_file = _get_department_history_file(department)
-    if os.path.exists(history_file):
-        try:
-            with open(history_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"加载部门历史失败: {str(e)}")
-            return []
-    return []
+    """加载部门保留范围内的全部历史记录"""
+    try:
+        return history_store.read_recent(department)
+    except Exception as e:
+        logger.error(f"加载部门历史失败: {str(e)}")
+        return []
 
-def _save_department_history(department: str, history: list) -> bool:
-    """保存部门历史记录"""
+def _append_department_history(department: str, record: dict) -> bool:
+    """追加一条部门历史记录，同时写入分段存储和查询库"""
     try:
-        history_file = _get_department_history_file(department)
-        os.makedirs(os.path.dirname(history_file), exist_ok=True)
-        with open(history_file, "w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
-        return True
+        history_store.append(department, record)
     except Exception as e:
         logger.error(f"保存部门历史失败: {str(e)}")
         return False
+    try:
+        history_db.insert(department, record)
+    except Exception as e:
+        # 查询库只是索引，写入失败不影响保存结果，下次查询时会从分段存储补齐
+        logger.error(f"写入部门历史查询库失败: {str(e)}")
+        history_db.mark_unsynced(department)
+    return True
+
+def _load_department_history_page(department: str, limit: int, offset: int) -> str:
+    """分页读取部门历史，offset 从最新的记录开始计数"""
+    if limit <= 0:
+        limit = DEPARTMENT_HISTORY_PAGE_SIZE
+    return json.dumps(history_store.page(department, limit, max(0, offset)), ensure_ascii=False, indent=2)
 
 @tool("LoadProcessHistory")
-def load_process_history() -> str:
-    """加载进程部门历史记录"""
+def load_process_history(limit: int = DEPARTMENT_HISTORY_PAGE_SIZE, offset: int = 0) -> str:
+    """
+    分页加载进程部门最近的历史记录（按时间从旧到新排列），返回记录总数和是否还有更早的记录
+    
+    参数:
+        limit: 每页记录数
+        offset: 跳过最新的 offset 条记录，用于向前翻页
+    """
     try:
-        history = _load_department_history("process_department")
-        return json.dumps(history, ensure_ascii=False, indent=2)
+        return _load_department_history_page("process_department", limit, offset)
     except Exception as e:
         return f"加载进程历史失败: {str(e)}"
 
 @tool("LoadLogHistory")
-def load_log_history() -> str:
-    """加载日志部门历史记录"""
+def load_log_history(limit: int = DEPARTMENT_HISTORY_PAGE_SIZE, offset: int = 0) -> str:
+    """
+    分页加载日志部门最近的历史记录（按时间从旧到新排列），返回记录总数和是否还有更早的记录
+    
+    参数:
+        limit: 每页记录数
+        offset: 跳过最新的 offset 条记录，用于向前翻页
+    """
     try:
-        history = _load_department_history("log_department")
-        return json.dumps(history, ensure_ascii=False, indent=2)
+        return _load_department_history_page("log_department", limit, offset)
     except Exception as e:
         return f"加载日志历史失败: {str(e)}"
 
 @tool("LoadServiceHistory")
-def load_service_history() -> str:
-    """加载服务部门历史记录"""
+def load_service_history(limit: int = DEPARTMENT_HISTORY_PAGE_SIZE, offset: int = 0) -> str:
+    """
+    分页加载服务部门最近的历史记录（按时间从旧到新排列），返回记录总数和是否还有更早的记录
+    
+    参数:
+        limit: 每页记录数
+        offset: 跳过最新的 offset 条记录，用于向前翻页
+    """
     try:
-        history = _load_department_history("service_department")
-        return json.dumps(history, ensure_ascii=False, indent=2)
+        return _load_department_history_page("service_department", limit, offset)
     except Exception as e:
         return f"加载服务历史失败: {str(e)}"
 
 @tool("LoadNetworkHistory")
-def load_network_history() -> str:
-    """加载网络部门历史记录"""
+def load_network_history(limit: int = DEPARTMENT_HISTORY_PAGE_SIZE, offset: int = 0) -> str:
+    """
+    分页加载网络部门最近的历史记录（按时间从旧到新排列），返回记录总数和是否还有更早的记录
+    
+    参数:
+        limit: 每页记录数
+        offset: 跳过最新的 offset 条记录，用于向前翻页
+    """
     try:
-        history = _load_department_history("network_department")
-        return json.dumps(history, ensure_ascii=False, indent=2)
+        return _load_department_history_page("network_department", limit, offset)
     except Exception as e:
         return f"加载网络历史失败: {str(e)}"
 
+@tool("QueryDepartmentHistory")
+def query_department_history(department: str = "", since: str = "", limit: int = 20,
+                             match: str = "", record_type: str = "", until: str = "") -> str:
+    """
+    按条件查询部门历史记录，只返回相关的记录（最新的在前）
+    
+    参数:
+        department: 部门名称，例如 process_department、log_department，为空时查询全部部门
+        since: 起始时间，支持相对时间（30m、6h、2d、1w）或 "YYYY-MM-DD HH:MM:SS"
+        limit: 最多返回的记录数，默认20
+        match: 内容关键字（全文检索）
+        record_type: 记录类型，例如 process_analysis
+        until: 结束时间，格式同 since
+    """
+    try:
+        departments = [department] if department else HISTORY_DEPARTMENTS
+        for dept in departments:
+            history_db.sync_department(dept, lambda dept=dept: history_store.read_recent(dept))
+        
+        records = history_db.query(department or None, since or None, until or None,
+                                   match or None, record_type or None, limit)
+        return json.dumps({"count": len(records), "records": records}, ensure_ascii=False, indent=2)
+    except ValueError as e:
+        return json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False)
+    except Exception as e:
+        logger.error(f"查询部门历史失败: {str(e)}")
+        return json.dumps({"status": "error", "message": f"查询部门历史失败: {str(e)}"}, ensure_ascii=False)
+
+def _summarize_department_history(department: str, recent_items: int) -> dict:
+    """部门历史摘要：记录数、最新时间、类型分布和最近几条记录（内容截断）"""
+    records = history_store.read_recent(department, max(0, recent_items))
+    recent = []
+    for record in records:
+        item = dict(record)
+        content = item.get("content")
+        if isinstance(content, str) and len(content) > HISTORY_SUMMARY_CONTENT_CHARS:
+            item["content"] = content[:HISTORY_SUMMARY_CONTENT_CHARS] + f"...（共 {len(content)} 字）"
+        recent.append(item)
+    
+    types = {}
+    for record in records:
+        record_type = record.get("type", "unknown")
+        types[record_type] = types.get(record_type, 0) + 1
+    
+    return {
+        "count": history_store.count(department),
+        "newest_timestamp": records[-1].get("timestamp") if records else None,
+        "recent_types": types,
+        "recent": recent
+    }
+
 @tool("LoadAllDepartmentHistory")
-def load_all_department_history() -> str:
-    """加载所有部门历史记录"""
+def load_all_department_history(full_content: bool = False, recent_items: int = HISTORY_SUMMARY_ITEMS,
+                                output_format: Optional[str] = None,
+                                token_budget: Optional[int] = None) -> str:
+    """
+    并发加载所有部门的历史记录，默认只返回每个部门的摘要
+    （记录数、最新时间、最近几条记录，内容截断）
+    
+    参数:
+        full_content: 为True时返回各部门保留范围内的全部完整记录
+        recent_items: 摘要中每个部门返回的最近记录数
+        output_format: 输出格式 "json"/"compact"/"columnar"/"csv"，默认使用工具配置
+        token_budget: token预算，超出时截断并标注省略的行数，默认使用工具配置
+    """
     try:
-        all_history = {}
-        departments = ["process_department", "log_department", "service_department", 
-                      "network_department", "response_department", "coordination_department"]
+        if full_content:
+            load = _load_department_history
+        else:
+            load = lambda dept: _summarize_department_history(dept, recent_items)
         
-        for dept in departments:
-            all_history[dept] = _load_department_history(dept)
+        # 各部门的历史互不依赖，并发读取
+        with ThreadPoolExecutor(max_workers=len(HISTORY_DEPARTMENTS),
+                                thread_name_prefix="history") as executor:
+            futures = {dept: executor.submit(load, dept) for dept in HISTORY_DEPARTMENTS}
         
-        return json.dumps(all_history, ensure_ascii=False, indent=2)
+        all_history = {}
+        for dept, future in futures.items():
+            try:
+                all_history[dept] = future.result()
+            except Exception as e:
+                logger.error(f"加载部门历史失败 {dept}: {str(e)}")
+                all_history[dept] = {"status": "error", "message": str(e)}
+        
+        return encode_tool_output("LoadAllDepartmentHistory", all_history, output_format, token_budget)
     except Exception as e:
         return f"加载所有部门历史失败: {str(e)}"
 
@@ -961,8 +1083,6 @@ def load_all_department_history() -> str:
 def save_process_analysis(analysis_result: str) -> str:
     """保存进程分析结果到部门历史"""
     try:
-        history = _load_department_history("process_department")
-        
         # 创建新的历史记录
         new_record = {
             "timestamp": datetime.now().isoformat(),
@@ -971,13 +1091,7 @@ def save_process_analysis(analysis_result: str) -> str:
             "content": analysis_result
         }
         
-        history.append(new_record)
-        
-        # 保持历史记录数量在合理范围内（最多保留1000条）
-        if len(history) > 1000:
-            history = history[-1000:]
-        
-        if _save_department_history("process_department", history):
+        if _append_department_history("process_department", new_record):
             return f"成功保存进程分析结果，记录ID: {new_record['analysis_id']}"
         else:
             return "保存进程分析结果失败"
@@ -988,8 +1102,6 @@ def save_process_analysis(analysis_result: str) -> str:
 def save_log_analysis(analysis_result: str) -> str:
     """保存日志分析结果到部门历史"""
     try:
-        history = _load_department_history("log_department")
-        
         new_record = {
             "timestamp": datetime.now().isoformat(),
             "analysis_id": str(uuid.uuid4()),
@@ -997,12 +1109,7 @@ def save_log_analysis(analysis_result: str) -> str:
             "content": analysis_result
         }
         
-        history.append(new_record)
-        
-        if len(history) > 1000:
-            history = history[-1000:]
-        
-        if _save_department_history("log_department", history):
+        if _append_department_history("log_department", new_record):
             return f"成功保存日志分析结果，记录ID: {new_record['analysis_id']}"
         else:
             return "保存日志分析结果失败"
@@ -1013,8 +1120,6 @@ def save_log_analysis(analysis_result: str) -> str:
 def save_service_analysis(analysis_result: str) -> str:
     """保存服务分析结果到部门历史"""
     try:
-        history = _load_department_history("service_department")
-        
         new_record = {
             "timestamp": datetime.now().isoformat(),
             "analysis_id": str(uuid.uuid4()),
@@ -1022,12 +1127,7 @@ def save_service_analysis(analysis_result: str) -> str:
             "content": analysis_result
         }
         
-        history.append(new_record)
-        
-        if len(history) > 1000:
-            history = history[-1000:]
-        
-        if _save_department_history("service_department", history):
+        if _append_department_history("service_department", new_record):
             return f"成功保存服务分析结果，记录ID: {new_record['analysis_id']}"
         else:
             return "保存服务分析结果失败"
@@ -1038,8 +1138,6 @@ def save_service_analysis(analysis_result: str) -> str:
 def save_network_analysis(analysis_result: str) -> str:
     """保存网络分析结果到部门历史"""
     try:
-        history = _load_department_history("network_department")
-        
         new_record = {
             "timestamp": datetime.now().isoformat(),
             "analysis_id": str(uuid.uuid4()),
@@ -1047,12 +1145,7 @@ def save_network_analysis(analysis_result: str) -> str:
             "content": analysis_result
         }
         
-        history.append(new_record)
-        
-        if len(history) > 1000:
-            history = history[-1000:]
-        
-        if _save_department_history("network_department", history):
+        if _append_department_history("network_department", new_record):
             return f"成功保存网络分析结果，记录ID: {new_record['analysis_id']}"
         else:
             return "保存网络分析结果失败"
@@ -1063,44 +1156,50 @@ def save_network_analysis(analysis_result: str) -> str:
 # 时间过滤工具
 # -------------------------------
 
+def _time_window(hours_back: int, since: str = "", until: str = "") -> tuple:
+    """时间过滤工具的窗口 (起始epoch, 结束epoch)，未指定 since 时取最近 hours_back 小时"""
+    window_start = parse_epoch_bound(since)
+    if window_start is None:
+        window_start = time.time() - hours_back * 3600
+    return window_start, parse_epoch_bound(until)
+
 @tool("FilterProcessesByTime")
-def filter_processes_by_time(processes_data: str, hours_back: int = 24) -> str:
-    """根据时间过滤进程数据，只返回指定时间内创建的进程"""
+def filter_processes_by_time(processes_data: str, hours_back: int = 24, since: str = "", until: str = "") -> str:
+    """
+    根据时间过滤进程数据，只返回指定时间内创建的进程
+    
+    参数:
+        processes_data: GetProcessDetails 的输出（或进程JSON列表，create_time 可以是epoch秒）
+        hours_back: 只保留最近多少小时内创建的进程（未指定 since 时使用）
+        since/until: 时间窗口，支持相对时间（30m、6h、2d）、ISO 时间或epoch秒
+    """
     try:
-        processes = json.loads(processes_data)
-        cutoff_time = datetime.now() - timedelta(hours=hours_back)
-        
-        filtered_processes = []
-        for process in processes:
-            if 'create_time' in process:
-                try:
-                    # 解析进程创建时间
-                    proc_time = datetime.strptime(process['create_time'], '%Y-%m-%d %H:%M:%S')
-                    if proc_time >= cutoff_time:
-                        filtered_processes.append(process)
-                except ValueError:
-                    # 如果时间格式解析失败，保留该进程
-                    filtered_processes.append(process)
-            else:
-                # 如果没有创建时间信息，保留该进程
-                filtered_processes.append(process)
-        
-        return json.dumps(filtered_processes, ensure_ascii=False, indent=2)
+        # GetProcessDetails 的输出原样传入时直接使用快照视图，不需要重新解析
+        view = snapshot_registry.resolve(processes_data)
+        if view is None:
+            view = ProcessSnapshot.from_output(processes_data).view()
+        window_start, window_end = _time_window(hours_back, since, until)
+        
+        # 没有创建时间的进程保留
+        return view.created_between(window_start, window_end).render("FilterProcessesByTime")
     except Exception as e:
         return f"过滤进程数据失败: {str(e)}"
 
 @tool("FilterLogsByTime")
-def filter_logs_by_time(logs_data: str, hours_back: int = 24) -> str:
-    """根据时间过滤日志数据，只返回指定时间内的日志"""
+def filter_logs_by_time(logs_data: str, hours_back: int = 24, since: str = "", until: str = "") -> str:
+    """
+    根据时间过滤日志数据，只返回指定时间内的日志
+    
+    支持 PowerShell Format-List 输出（按 TimeCreated 过滤）、事件JSON列表和 syslog 文本；
+    无法解析时间的条目保留
+    
+    参数:
+        hours_back: 只保留最近多少小时内的日志（未指定 since 时使用）
+        since/until: 时间窗口，支持相对时间（30m、6h、2d）、ISO 时间或epoch秒
+    """
     try:
-        # 简单的时间过滤，实际实现可能需要根据日志格式调整
-        cutoff_time = datetime.now() - timedelta(hours=hours_back)
-        
-        # 这里简化处理，实际应该解析日志中的时间戳
-        # 由于Windows事件日志格式复杂，这里返回原始数据
-        # 在实际应用中，应该解析PowerShell返回的日志格式
-        
-        return logs_data  # 暂时返回原始数据
+        window_start, window_end = _time_window(hours_back, since, until)
+        return filter_log_text(logs_data, window_start, window_end)
     except Exception as e:
         return f"过滤日志数据失败: {str(e)}"
 
@@ -1127,46 +1226,63 @@ def filter_connections_by_time(connections_data: str, hours_back: int = 24) -> s
 # -------------------------------
 
 @tool("GetNetworkConnections")
-def get_network_connections() -> str:
-    """获取当前系统网络连接信息"""
+def get_network_connections(view: str = "aggregated", output_format: Optional[str] = None,
+                            token_budget: Optional[int] = None) -> str:
+    """
+    获取当前系统网络连接信息
+    
+    参数:
+        view: "aggregated"（默认）按 (pid, 远程IP, 远程端口, 状态) 聚合并给出连接数；
+              "raw" 每个套接字一条记录
+        output_format: 输出格式 "json"/"compact"/"columnar"/"csv"，默认使用工具配置
+        token_budget: token预算，超出时截断并标注省略的行数，默认使用工具配置
+    """
     try:
-        if psutil is None:
-            return "获取网络连接时出错: psutil 库未安装"
-        
-        connections = []
-        for conn in psutil.net_connections(kind='inet'):
-            try:
-                connections.append({
-                    'family': conn.family.name if hasattr(conn.family, 'name') else str(conn.family),
-                    'type': conn.type.name if hasattr(conn.type, 'name') else str(conn.type),
-                    'local_address': f"{conn.laddr.ip}:{conn.laddr.port}" if conn.laddr else "N/A",
-                    'remote_address': f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else "N/A",
-                    'status': conn.status,
-                    'pid': conn.pid
-                })
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-        
-        return json.dumps(connections, ensure_ascii=False, indent=2)
+        connections = system_collector.connections()
+        pre_triage.observe("network", connections)
+        if view == "raw":
+            return encode_tool_output("GetNetworkConnections", connections, output_format, token_budget)
+        
+        groups = aggregate_connections(connections)
+        result = {"summary": summarize_groups(groups), "groups": groups}
+        return encode_tool_output("GetNetworkConnections", result, output_format, token_budget)
     except Exception as e:
         return f"获取网络连接失败: {str(e)}"
 
 @tool("AnalyzeNetworkTraffic")
 def analyze_network_traffic(connections_data: str) -> str:
-    """分析网络流量，识别可疑连接"""
+    """分析网络流量，识别可疑连接（远程地址和端口与离线威胁情报批量比对，常见后门端口等按检测规则匹配）"""
     try:
-        connections = json.loads(connections_data)
         suspicious_connections = []
-        
-        for conn in connections:
-            # 检查可疑端口
-            if 'remote_address' in conn and conn['remote_address'] != "N/A":
-                remote_port = conn['remote_address'].split(':')[-1]
-                if remote_port in ['4444', '5555', '6666', '7777', '8888', '9999']:  # 常见后门端口
-                    suspicious_connections.append({
-                        'connection': conn,
-                        'reason': f'连接到可疑端口: {remote_port}'
-                    })
+        groups = [group for group in load_connection_groups(connections_data) if group.get('remote_ip')]
+        ip_hits = threat_intel.lookup('ip', {group['remote_ip'] for group in groups})
+        port_hits = threat_intel.lookup('port', {group['remote_port'] for group in groups
+                                                 if group.get('remote_port') is not None})
+        ruleset = detection_rules.ruleset()
+        memo = {}
+        
+        for group in groups:
+            remote_ip = group['remote_ip']
+            remote_port = group.get('remote_port')
+            if remote_ip in ip_hits:
+                suspicious_connections.append({
+                    'connection': group,
+                    'reason': f'远程地址命中威胁情报: {remote_ip}',
+                    'intel': ip_hits[remote_ip]
+                })
+            if remote_port in port_hits:
+                suspicious_connections.append({
+                    'connection': group,
+                    'reason': f'远程端口命中威胁情报: {remote_port}',
+                    'intel': port_hits[remote_port]
+                })
+            # 连接规则（例如 NET-PORT-001 常见后门端口）
+            for match in ruleset.match_records('connection', [group], memo):
+                suspicious_connections.append({
+                    'connection': group,
+                    'reason': '命中检测规则: ' + '；'.join(
+                        f"{rule_id} {ruleset.rules[rule_id].get('description', '')}" for rule_id in match['rules'])
+                })
         
         if not suspicious_connections:
             return "未发现可疑网络连接"
@@ -1175,56 +1291,122 @@ def analyze_network_traffic(connections_data: str) -> str:
     except Exception as e:
         return f"分析网络流量失败: {str(e)}"
 
+@tool("LookupThreatIndicators")
+def lookup_threat_indicators(indicator_type: str, values: str) -> str:
+    """
+    在离线威胁情报中批量查询指标（情报源为 data/threat_intel 下的 CSV 和 STIX-lite JSON 文件）
+    
+    参数:
+        indicator_type: 指标类型 "ip"/"port"/"process"/"hash"/"domain"
+        values: 要查询的值，JSON列表或以逗号、换行分隔的文本
+    """
+    try:
+        try:
+            items = json.loads(values)
+        except (TypeError, ValueError):
+            items = None
+        if not isinstance(items, list):
+            items = [item for item in re.split(r'[,\n]', str(values)) if item.strip()]
+        items = [str(item).strip() for item in items]
+        hits = threat_intel.lookup(indicator_type.strip().lower(), items)
+        return json.dumps({
+            'summary': {'queried': len(set(items)), 'matched': len(hits),
+                        'indicators': threat_intel.stats()['indicators']},
+            'matches': hits,
+        }, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.error(f"查询威胁情报失败: {str(e)}")
+        return f"查询威胁情报失败: {str(e)}"
+
 @tool("DetectSuspiciousConnections")
 def detect_suspicious_connections(connections_data: str) -> str:
     """检测可疑网络连接"""
     try:
-        connections = json.loads(connections_data)
         alerts = []
-        
-        for conn in connections:
-            # 检查外部连接
-            if 'remote_address' in conn and conn['remote_address'] != "N/A":
-                remote_ip = conn['remote_address'].split(':')[0]
-                # 简单的IP检查（实际应该使用更复杂的威胁情报）
-                if not (remote_ip.startswith('192.168.') or 
-                       remote_ip.startswith('10.') or 
-                       remote_ip.startswith('172.') or
-                       remote_ip == '127.0.0.1'):
-                    alerts.append({
-                        'type': 'external_connection',
-                        'connection': conn,
-                        'message': f'检测到外部连接: {remote_ip}'
-                    })
+        groups = load_connection_groups(connections_data)
+        # 每个远程地址只分类一次（私有/保留地址段和 ip_lists.json 中的允许/拒绝列表）
+        categories = ip_classifier.classify_many(group['remote_ip'] for group in groups if group.get('remote_ip'))
+        
+        for group in groups:
+            remote_ip = group.get('remote_ip')
+            category = categories.get(remote_ip)
+            if category == DENY:
+                alerts.append({
+                    'type': 'denied_address',
+                    'connection': group,
+                    'message': f'检测到与拒绝列表中地址的连接: {remote_ip}（{group["count"]} 个连接）'
+                })
+            elif ip_classifier.is_external(category):
+                alerts.append({
+                    'type': 'external_connection',
+                    'connection': group,
+                    'message': f'检测到外部连接: {remote_ip}（{group["count"]} 个连接）'
+                })
         
         return json.dumps(alerts, ensure_ascii=False, indent=2)
     except Exception as e:
         return f"检测可疑连接失败: {str(e)}"
 
+@tool("MatchDetectionRules")
+def match_detection_rules(processes_data: str = "", services_data: str = "", connections_data: str = "") -> str:
+    """
+    用检测规则（config/json/detection_rules.json）一次匹配进程、服务和网络连接，返回命中的规则ID
+    
+    参数:
+        processes_data: GetProcessDetails 的输出（可为空）
+        services_data: GetServices 的输出（可为空）
+        connections_data: GetNetworkConnections 的输出（可为空）
+    """
+    try:
+        processes = []
+        if processes_data:
+            view = snapshot_registry.resolve(processes_data)
+            if view is not None:
+                processes = view.records()
+            else:
+                processes = ProcessSnapshot.from_output(processes_data).view().records()
+        service_snapshot = service_tracker.load(services_data) if services_data else None
+        services = service_snapshot.services if service_snapshot is not None else []
+        connections = load_connection_groups(connections_data) if connections_data else []
+        
+        result = detection_rules.scan(processes=[p for p in processes if isinstance(p, dict)],
+                                      services=services, connections=connections)
+        if service_snapshot is not None:
+            service_tracker.commit(service_snapshot)
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.error(f"匹配检测规则失败: {str(e)}")
+        return f"匹配检测规则失败: {str(e)}"
+
 @tool("AnalyzeServiceSecurity")
 def analyze_service_security(services_data: str) -> str:
     """分析服务安全性"""
     try:
-        # 解析服务数据并检查可疑服务
+        # 服务名、显示名和程序路径一次匹配全部检测规则（detection_rules.json）
         suspicious_services = []
+        snapshot = service_tracker.load(services_data)
+        result = detection_rules.scan(services=snapshot.services)
+        rules = {rule['id']: rule for rule in result['rules']}
+        # 收集到的快照已经分析，下一次 delta 以它为比较基准
+        service_tracker.commit(snapshot)
+        
+        for match in result['matches']:
+            for rule_id in match['rules']:
+                suspicious_services.append({
+                    'service_name': match['item']['name'],
+                    'rule_id': rule_id,
+                    'severity': rules[rule_id]['severity'],
+                    'reason': rules[rule_id]['description']
+                })
         
-        # 简单的服务名检查
-        suspicious_names = ['backdoor', 'trojan', 'malware', 'hack']
-        
-        lines = services_data.split('\n')
-        for line in lines:
-            if 'SERVICE_NAME:' in line:
-                service_name = line.split('SERVICE_NAME:')[1].strip()
-                for suspicious in suspicious_names:
-                    if suspicious.lower() in service_name.lower():
-                        suspicious_services.append({
-                            'service_name': service_name,
-                            'reason': f'服务名包含可疑关键词: {suspicious}'
-                        })
-        
+        # 规则文件不可用时只检查了内置的服务名和程序路径规则，需要在结果中说明
+        warning = "检测规则文件缺失或无效，仅使用内置默认规则" if detection_rules.using_defaults else None
         if not suspicious_services:
-            return "未发现可疑服务"
+            return f"未发现可疑服务（警告: {warning}）" if warning else "未发现可疑服务"
         
+        if warning:
+            return json.dumps({'warning': warning, 'suspicious_services': suspicious_services},
+                              ensure_ascii=False, indent=2)
         return json.dumps(suspicious_services, ensure_ascii=False, indent=2)
     except Exception as e:
         return f"分析服务安全性失败: {str(e)}"
@@ -1233,34 +1415,13 @@ def analyze_service_security(services_data: str) -> str:
 def check_service_integrity(services_data: str) -> str:
     """检查服务完整性"""
     try:
-        # 检查关键系统服务是否正常运行
-        critical_services = ['Winlogon', 'csrss', 'lsass', 'services', 'winlogon']
-        running_services = []
-        
-        lines = services_data.split('\n')
-        current_service = {}
-        
-        for line in lines:
-            if 'SERVICE_NAME:' in line:
-                if current_service:
-                    running_services.append(current_service)
-                current_service = {'name': line.split('SERVICE_NAME:')[1].strip()}
-            elif 'STATE' in line and 'RUNNING' in line:
-                current_service['status'] = 'RUNNING'
-        
-        if current_service:
-            running_services.append(current_service)
-        
-        # 检查关键服务状态
+        # 检查当前平台的关键系统服务是否正常运行（按服务名直接查找）
+        snapshot = service_tracker.load(services_data)
         missing_services = []
-        for critical in critical_services:
-            found = False
-            for service in running_services:
-                if critical.lower() in service.get('name', '').lower() and service.get('status') == 'RUNNING':
-                    found = True
-                    break
-            if not found:
-                missing_services.append(critical)
+        for alternatives in CRITICAL_SERVICES.get(system_collector.platform, []):
+            if not any(snapshot.is_running(name) for name in alternatives):
+                missing_services.append('/'.join(alternatives))
+        service_tracker.commit(snapshot)
         
         if missing_services:
             return f"警告: 以下关键服务未运行: {', '.join(missing_services)}"
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+服务快照
+服务数据统一解析为 {"name", "display_name", "state", "pid", "binary_path", "start_type"} 记录，只解析一次：
+- ServiceSnapshot 按服务名（小写）建立索引，分析工具按名称直接查找，不再逐行扫描 sc 输出
+- ServiceTracker 保存上一次已分析的快照，只返回新增、删除和属性变化的服务，未变化的服务不再交给 LLM；
+  新快照经过分析后才成为比较基准（服务分析工具分析完该快照，或部门流水线的分析完成），
+  收集后没有分析（重试、分析员失败）时下一次仍返回同样的变化，与调用方（main 或工作流引擎）无关
+- GetServices 的输出文本登记在 ServiceTracker 中，分析工具收到同一段文本时直接取回快照
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from config.constants import SERVICE_SNAPSHOT_FILE
+from tools.output_encoder import decode_output
+
+logger = logging.getLogger(__name__)
+
+SERVICE_FIELDS = ("name", "display_name", "state", "pid", "binary_path", "start_type")
+# 参与变化比较的服务属性
+TRACKED_FIELDS = ("display_name", "state", "pid", "binary_path", "start_type")
+
+# 关键系统服务（按平台），每一项为可以互相替代的服务名
+# 原来的列表（Winlogon、csrss、lsass、services）是进程名而不是服务名，按服务名查找时总是报告未运行
+CRITICAL_SERVICES = {
+    "windows": [("EventLog",), ("RpcSs",), ("DcomLaunch",), ("SamSs",), ("Schedule",), ("mpssvc",)],
+    "linux": [("systemd-journald",), ("systemd-logind",), ("cron", "crond", "cronie")],
+}
+
+# sc query/queryex/qc 输出中的 "字段 : 值" 行
+_SC_FIELD = re.compile(r"^\s*(?P<key>[A-Z_]+)\s*:\s*(?P<value>.*?)\s*$")
+_SC_KEYS = {"SERVICE_NAME": "name", "DISPLAY_NAME": "display_name", "STATE": "state", "PID": "pid",
+            "BINARY_PATH_NAME": "binary_path", "START_TYPE": "start_type"}
+
+# 各种来源的启动类型（sc qc、Win32_Service.StartMode、systemd）统一为 auto/manual/disabled/boot/system
+_START_TYPES = {
+    "AUTO_START": "auto", "AUTO": "auto", "AUTOMATIC": "auto", "ENABLED": "auto",
+    "DEMAND_START": "manual", "MANUAL": "manual", "STATIC": "manual",
+    "DISABLED": "disabled", "MASKED": "disabled",
+    "BOOT_START": "boot", "BOOT": "boot", "SYSTEM_START": "system", "SYSTEM": "system",
+}
+
+# 记录字段在 Win32_Service（Get-CimInstance）输出中的名称
+_CIM_KEYS = {"Name": "name", "DisplayName": "display_name", "State": "state", "ProcessId": "pid",
+             "PathName": "binary_path", "StartMode": "start_type"}
+
+
+def _state_word(value) -> str:
+    """"4  RUNNING" / "Running" -> "RUNNING" """
+    text = str(value or "").upper()
+    words = re.findall(r"[A-Z_]{3,}", text)
+    return words[0] if words else text.strip()
+
+
+def normalize_service(record: Dict) -> Dict:
+    """把一条服务记录（收集器、sc 输出或 Win32_Service 字段）统一为 SERVICE_FIELDS"""
+    record = {_CIM_KEYS.get(key, key): value for key, value in record.items()}
+    try:
+        pid = int(record.get("pid") or 0) or None
+    except (TypeError, ValueError):
+        pid = None
+    start_type = _state_word(record.get("start_type"))
+    return {
+        "name": str(record.get("name") or ""),
+        "display_name": str(record.get("display_name") or ""),
+        "state": _state_word(record.get("state")),
+        "pid": pid,
+        "binary_path": str(record.get("binary_path") or "") or None,
+        "start_type": _START_TYPES.get(start_type, start_type.lower()) or None,
+    }
+
+
+def parse_services(services_data) -> List[Dict]:
+    """
+    把服务数据统一解析为 SERVICE_FIELDS 记录
+
+    支持收集器返回的服务列表、GetServices 的任意输出格式（decode_output）、
+    ConvertTo-Json 的输出和 sc query/queryex/qc 的文本输出；缺少的字段为空，无法识别的行忽略
+    """
+    if isinstance(services_data, list):
+        return [normalize_service(item) for item in services_data if isinstance(item, dict)]
+    text = (services_data or "").strip()
+    try:
+        data = decode_output(text)
+    except ValueError:
+        data = None
+    if data is not None:
+        if isinstance(data, dict):
+            data = decode_output(data.get("services", data))
+            if isinstance(data, dict):
+                # ConvertTo-Json 只有一个服务时输出单个对象
+                data = [data] if "name" in data or "Name" in data else []
+        if isinstance(data, list):
+            return [normalize_service(item) for item in data if isinstance(item, dict)]
+        return []
+
+    services, current = [], None
+    for line in text.splitlines():
+        match = _SC_FIELD.match(line)
+        if not match:
+            continue
+        field = _SC_KEYS.get(match.group("key"))
+        if field == "name":
+            current = {"name": match.group("value")}
+            services.append(current)
+        elif field is not None and current is not None:
+            current[field] = match.group("value")
+    return [normalize_service(item) for item in services]
+
+
+class ServiceSnapshot:
+    """一次服务快照，services 为 normalize_service 格式的记录，by_name 为 小写服务名 -> 记录"""
+
+    def __init__(self, services: Iterable[Dict], taken_at: Optional[str] = None):
+        self.services = list(services)
+        self.by_name = {service["name"].lower(): service for service in self.services}
+        self.taken_at = taken_at or time.strftime("%Y-%m-%d %H:%M:%S")
+
+    @classmethod
+    def from_data(cls, services_data) -> "ServiceSnapshot":
+        return cls(parse_services(services_data))
+
+    def __len__(self) -> int:
+        return len(self.services)
+
+    def get(self, name: str) -> Optional[Dict]:
+        return self.by_name.get(name.lower())
+
+    def is_running(self, name: str) -> bool:
+        service = self.get(name)
+        return service is not None and service["state"] == "RUNNING"
+
+    def diff(self, previous: Optional["ServiceSnapshot"]) -> Dict:
+        """与上一次快照比较，没有上一次快照时全部服务视为新增"""
+        old_index = previous.by_name if previous is not None else {}
+        added = [self.by_name[key] for key in self.by_name.keys() - old_index.keys()]
+        removed = [old_index[key] for key in old_index.keys() - self.by_name.keys()]
+        changed = []
+        for key in self.by_name.keys() & old_index.keys():
+            old, new = old_index[key], self.by_name[key]
+            changes = {field: [old.get(field), new.get(field)]
+                       for field in TRACKED_FIELDS if old.get(field) != new.get(field)}
+            if changes:
+                changed.append({"name": new["name"], "changes": changes})
+
+        by_name = lambda item: item["name"].lower()
+        return {
+            "summary": {
+                "total": len(self.services),
+                "added": len(added),
+                "removed": len(removed),
+                "changed": len(changed),
+                "unchanged": len(self.services) - len(added) - len(changed),
+                "previous_snapshot": previous.taken_at if previous is not None else None,
+                "current_snapshot": self.taken_at,
+            },
+            "added": sorted(added, key=by_name),
+            "removed": sorted(removed, key=by_name),
+            "changed": sorted(changed, key=by_name),
+        }
+
+
+class ServiceTracker:
+    """
+    服务快照跟踪器
+    - 比较基准（上一次已分析的快照）保存在内存中，并写入 snapshot_file，程序重启后可继续计算差异
+    - update() 只记录待确认的快照，commit() 把它设为新的比较基准：
+      服务分析工具分析完待确认的快照后调用，部门流水线的分析完成后也会调用
+    - 最近的工具输出文本 -> 快照，分析工具按文本取回快照（差异输出也对应完整快照）
+    """
+
+    def __init__(self, snapshot_file: Optional[str] = SERVICE_SNAPSHOT_FILE, max_texts: int = 8):
+        """
+        Args:
+            snapshot_file: 快照文件路径，为None时只保存在内存中
+            max_texts: 登记的输出文本数
+        """
+        self.snapshot_file = snapshot_file
+        self.max_texts = max_texts
+        self._lock = threading.Lock()
+        self._snapshot = None
+        # 已收集、尚未分析完成的快照
+        self._pending = None
+        self._loaded = False
+        self._texts = OrderedDict()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.snapshot_file:
+            return
+        try:
+            with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._snapshot = ServiceSnapshot([normalize_service(service) for service in data.get("services", [])],
+                                             data.get("time"))
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError, AttributeError, TypeError) as e:
+            logger.error(f"读取服务快照失败: {str(e)}")
+
+    def _save(self):
+        if not self.snapshot_file:
+            return
+        try:
+            directory = os.path.dirname(self.snapshot_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_file = f"{self.snapshot_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"time": self._snapshot.taken_at, "services": self._snapshot.services},
+                          f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_file, self.snapshot_file)
+        except OSError as e:
+            logger.error(f"保存服务快照失败: {str(e)}")
+
+    def current(self) -> Optional[ServiceSnapshot]:
+        """最近一次收集的快照（尚未分析完成时为待确认的快照）"""
+        with self._lock:
+            self._load()
+            return self._pending or self._snapshot
+
+    def update(self, snapshot: ServiceSnapshot) -> Dict:
+        """
+        返回新快照与比较基准的差异，新快照记为待确认
+        比较基准不变，同一轮内多次调用（例如重试）得到相同的变化
+        """
+        with self._lock:
+            self._load()
+            previous = self._snapshot
+            self._pending = snapshot
+        return snapshot.diff(previous)
+
+    def commit(self, snapshot: Optional[ServiceSnapshot] = None):
+        """
+        待确认的快照成为新的比较基准
+
+        Args:
+            snapshot: 已分析的快照，不是待确认的快照（例如分析的是旧数据或其他来源的数据）时不提交；
+                为None时提交当前待确认的快照
+        """
+        with self._lock:
+            if self._pending is None or (snapshot is not None and snapshot is not self._pending):
+                return
+            self._load()
+            self._snapshot, self._pending = self._pending, None
+            self._save()
+
+    def remember(self, text: str, snapshot: ServiceSnapshot):
+        with self._lock:
+            self._texts[text] = snapshot
+            self._texts.move_to_end(text)
+            while len(self._texts) > self.max_texts:
+                self._texts.popitem(last=False)
+
+    def load(self, services_data) -> ServiceSnapshot:
+        """
+        分析工具的输入 -> 快照
+        登记过的工具输出直接取回；差异输出（不含未变化的服务）使用最近一次完整快照；其他数据解析一次
+        """
+        if isinstance(services_data, str):
+            with self._lock:
+                snapshot = self._texts.get(services_data)
+            if snapshot is not None:
+                return snapshot
+            text = services_data.strip()
+            if text.startswith("{") and '"summary"' in text and '"unchanged"' in text:
+                current = self.current()
+                if current is not None:
+                    return current
+        return ServiceSnapshot.from_data(services_data)
+
+    def reset(self):
+        """丢弃上一次快照"""
+        with self._lock:
+            self._snapshot = self._pending = None
+            self._texts.clear()
+            if self.snapshot_file and os.path.exists(self.snapshot_file):
+                os.remove(self.snapshot_file)
+
+
+# 全局实例
+service_tracker = ServiceTracker()
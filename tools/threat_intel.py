@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+离线威胁情报
+从本地情报源文件（CSV 或 STIX-lite JSON）读取 IP、端口、进程名、文件哈希、域名等指标，
+建立索引文件：按64位哈希排序的定长记录表 + 布隆过滤器 + 指标详情，查询时通过 mmap 直接访问：
+- 布隆过滤器先排除绝大多数未命中的值（不需要二分查找）
+- 可能命中的值在排序表中二分查找，再核对指标原值，排除哈希冲突
+情报源文件变化后自动重建索引（每 THREAT_INTEL_CHECK_INTERVAL 秒最多检查一次），全程不需要网络
+常见后门端口等与情报源无关的检查由检测规则（detection_rules.json）完成
+"""
+
+import os
+import re
+import csv
+import json
+import mmap
+import socket
+import time
+import struct
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config.constants import THREAT_INTEL_FEED_DIR, THREAT_INTEL_INDEX_FILE, THREAT_INTEL_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# 指标类型
+INDICATOR_TYPES = ("ip", "port", "process", "hash", "domain")
+
+_MAGIC = b"TIIDX002"
+# 文件头: 魔数, 记录数, 布隆过滤器位数, 哈希函数个数, 情报源签名
+_HEADER = struct.Struct("<8sQQI32s")
+# 记录: 指标哈希, 详情偏移, 详情长度
+_RECORD = struct.Struct("<QQI")
+_KEY = struct.Struct("<QQ")
+
+# 布隆过滤器每个指标的位数和哈希函数个数（误判率约1%）
+BLOOM_BITS_PER_ENTRY = 10
+BLOOM_HASHES = 7
+
+# STIX 模式中的指标，例如 [ipv4-addr:value = '1.2.3.4']
+_STIX_PATTERN = re.compile(
+    r"(ipv4-addr|ipv6-addr|domain-name|process|network-traffic|file):"
+    r"(value|name|dst_port|hashes\.'?[\w-]+'?)\s*=\s*'?([^'\]]+)'?")
+_STIX_TYPES = {"ipv4-addr": "ip", "ipv6-addr": "ip", "domain-name": "domain", "process": "process",
+               "network-traffic": "port", "file": "hash"}
+_HEX = re.compile(r"^[0-9a-fA-F]+$")
+# ::ffff:0:0/96 的前12个字节
+_IPV4_MAPPED_PREFIX = b"\0" * 10 + b"\xff\xff"
+
+# 查询结果中每条情报的字段
+DETAIL_FIELDS = ("type", "value", "source", "severity", "description")
+
+
+def normalize_indicator(indicator_type: str, value) -> Optional[str]:
+    """
+    规范化指标值（IP转为标准写法，名称、哈希、域名转小写），无效值返回None
+    IPv4 映射的 IPv6 地址（::ffff:a.b.c.d，双栈套接字上的 IPv4 对端）转为 IPv4，与 ip_classifier 一致
+    """
+    text = str(value).strip()
+    if not text:
+        return None
+    if indicator_type == "ip":
+        text = text.split("%", 1)[0]
+        try:
+            return socket.inet_ntop(socket.AF_INET, socket.inet_pton(socket.AF_INET, text))
+        except OSError:
+            pass
+        try:
+            packed = socket.inet_pton(socket.AF_INET6, text)
+        except OSError:
+            return None
+        if packed[:12] == _IPV4_MAPPED_PREFIX:
+            return socket.inet_ntop(socket.AF_INET, packed[12:])
+        return socket.inet_ntop(socket.AF_INET6, packed)
+    if indicator_type == "port":
+        return str(int(text)) if text.isdigit() and 0 < int(text) < 65536 else None
+    if indicator_type == "domain":
+        return text.lower().rstrip(".")
+    return text.lower()
+
+
+def guess_indicator_type(value: str) -> Optional[str]:
+    """情报源没有给出类型时按值推断"""
+    text = value.strip()
+    if normalize_indicator("ip", text):
+        return "ip"
+    if text.isdigit():
+        return "port"
+    if _HEX.match(text) and len(text) in (32, 40, 64, 128):
+        return "hash"
+    if "." in text and not text.lower().endswith((".exe", ".dll", ".sh", ".bat", ".ps1")):
+        return "domain"
+    return "process" if text else None
+
+
+def _clean(field) -> str:
+    """详情字段中不能包含制表符和换行"""
+    return str(field).replace("\t", " ").replace("\n", " ") if field else ""
+
+
+def _key_hash(indicator_type: str, value: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(f"{indicator_type}:{value}".encode("utf-8"), digest_size=16).digest()
+    return _KEY.unpack(digest)
+
+
+def _bloom_positions(h1: int, h2: int, bits: int, hashes: int) -> Iterator[int]:
+    for i in range(hashes):
+        yield (h1 + i * h2) % bits
+
+
+def read_feed(path: str) -> Iterator[Tuple]:
+    """
+    读取情报源文件，生成 (类型, 值, 来源, 严重程度, 描述)，类型、严重程度、描述可能为None
+
+    - CSV: 表头包含 value/indicator 列，可选 type、severity、description 列；没有表头时第一列为指标值
+    - JSON: STIX bundle（indicator 对象的 pattern）或 [{"type", "value", ...}] 列表
+    """
+    source = os.path.basename(path)
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+            rows = csv.reader(row for row in f if row.strip() and not row.lstrip().startswith("#"))
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [column.strip().lower() for column in header]
+            if "value" in columns or "indicator" in columns:
+                value_at = columns.index("value") if "value" in columns else columns.index("indicator")
+            else:
+                columns, value_at = [], 0
+                rows = iter([header] + list(rows))
+            for row in rows:
+                if len(row) <= value_at:
+                    continue
+                fields = dict(zip(columns, row)) if columns else {}
+                yield (fields.get("type"), row[value_at], source, fields.get("severity"), fields.get("description"))
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    objects = data.get("objects", []) if isinstance(data, dict) else data
+    for item in objects:
+        if not isinstance(item, dict):
+            continue
+        if "pattern" in item:
+            for stix_type, _, value in _STIX_PATTERN.findall(item["pattern"]):
+                yield (_STIX_TYPES[stix_type], value, source,
+                       item.get("severity") or ",".join(item.get("labels", [])) or None,
+                       item.get("name") or item.get("description"))
+        elif "value" in item:
+            yield (item.get("type"), item["value"], source, item.get("severity"), item.get("description"))
+
+
+class ThreatIntelIndex:
+    """离线威胁情报索引"""
+
+    def __init__(self, feed_dir: str = THREAT_INTEL_FEED_DIR, index_file: str = THREAT_INTEL_INDEX_FILE,
+                 check_interval: float = THREAT_INTEL_CHECK_INTERVAL):
+        """
+        Args:
+            check_interval: 检查情报源文件是否变化的最短间隔（秒），间隔内的查询复用上一次的签名
+        """
+        self.feed_dir = feed_dir
+        self.index_file = index_file
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._count = 0
+        self._bloom_bits = 0
+        self._hashes = 0
+        self._signature = None
+        # 最近一次计算的情报源签名和计算时间
+        self._feed_checked = None
+        self._feed_checked_at = 0.0
+
+    def feed_files(self) -> List[str]:
+        try:
+            names = sorted(os.listdir(self.feed_dir))
+        except OSError:
+            return []
+        return [os.path.join(self.feed_dir, name) for name in names
+                if name.lower().endswith((".csv", ".json"))]
+
+    def _feed_signature(self) -> bytes:
+        """情报源文件名、大小和修改时间的摘要，用于判断索引是否需要重建"""
+        digest = hashlib.sha256()
+        for path in self.feed_files():
+            stat = os.stat(path)
+            digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+        return digest.digest()
+
+    def _checked_signature(self) -> bytes:
+        """情报源签名，check_interval 秒内复用上一次的结果，调用方持有 _lock"""
+        now = time.monotonic()
+        if self._feed_checked is None or now - self._feed_checked_at >= self.check_interval:
+            self._feed_checked = self._feed_signature()
+            self._feed_checked_at = now
+        return self._feed_checked
+
+    def signature(self) -> str:
+        """情报源签名（十六进制），情报源文件增删或修改后（最迟 check_interval 秒后）改变"""
+        with self._lock:
+            return self._checked_signature().hex()
+
+    def rebuild(self) -> int:
+        """从情报源重建索引文件，返回指标数"""
+        with self._lock:
+            self._feed_checked = None
+            return self._write_index()
+
+    def _write_index(self) -> int:
+        entries = {}
+        for path in self.feed_files():
+            try:
+                for indicator_type, value, source, severity, description in read_feed(path):
+                    value = str(value or "")
+                    indicator_type = (indicator_type or guess_indicator_type(value) or "").strip().lower()
+                    if indicator_type not in INDICATOR_TYPES:
+                        continue
+                    value = normalize_indicator(indicator_type, value)
+                    if value is None:
+                        continue
+                    # 详情为一行以制表符分隔的字段，同一指标的多条情报各占一行
+                    line = f"{indicator_type}\t{_clean(value)}\t{source}\t{_clean(severity)}\t{_clean(description)}"
+                    key = (indicator_type, value)
+                    entries[key] = f"{entries[key]}\n{line}" if key in entries else line
+            except (OSError, ValueError, json.JSONDecodeError) as e:
+                logger.error(f"读取威胁情报源失败 {path}: {str(e)}")
+
+        records, details = [], bytearray()
+        bloom_bits = max(64, len(entries) * BLOOM_BITS_PER_ENTRY)
+        bloom = bytearray((bloom_bits + 7) // 8)
+        for (indicator_type, value), lines in entries.items():
+            h1, h2 = _key_hash(indicator_type, value)
+            for i in range(BLOOM_HASHES):
+                position = (h1 + i * h2) % bloom_bits
+                bloom[position >> 3] |= 1 << (position & 7)
+            data = lines.encode("utf-8")
+            records.append((h1, len(details), len(data)))
+            details += data
+        records.sort()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_file)), exist_ok=True)
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(records), bloom_bits, BLOOM_HASHES, self._feed_signature()))
+            f.write(bloom)
+            f.write(b"".join(_RECORD.pack(*record) for record in records))
+            f.write(details)
+        self._close()
+        os.replace(tmp_file, self.index_file)
+        logger.info(f"已重建威胁情报索引: {len(records)} 个指标")
+        return len(records)
+
+    def _close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._map = self._file = None
+
+    def _open(self) -> bool:
+        """映射索引文件，情报源变化或索引不存在时先重建"""
+        signature = self._checked_signature()
+        if self._map is not None and signature == self._signature:
+            return True
+        self._close()
+        valid = False
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "rb") as f:
+                header = f.read(_HEADER.size)
+            valid = (len(header) == _HEADER.size and header[:8] == _MAGIC and
+                     _HEADER.unpack(header)[4] == signature)
+        if not valid:
+            if not self.feed_files():
+                return False
+            self._write_index()
+
+        self._file = open(self.index_file, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        _, self._count, self._bloom_bits, self._hashes, self._signature = _HEADER.unpack_from(self._map, 0)
+        return True
+
+    def _find(self, indicator_type: str, value: str) -> List[Dict]:
+        h1, h2 = _key_hash(indicator_type, value)
+        mm = self._map
+        for position in _bloom_positions(h1, h2, self._bloom_bits, self._hashes):
+            if not mm[_HEADER.size + (position >> 3)] & (1 << (position & 7)):
+                return []
+
+        table = _HEADER.size + (self._bloom_bits + 7) // 8
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from("<Q", mm, table + middle * _RECORD.size)[0] < h1:
+                low = middle + 1
+            else:
+                high = middle
+        details = table + self._count * _RECORD.size
+        matches = []
+        while low < self._count:
+            key, offset, length = _RECORD.unpack_from(mm, table + low * _RECORD.size)
+            if key != h1:
+                break
+            for line in mm[details + offset:details + offset + length].decode("utf-8").split("\n"):
+                fields = line.split("\t")
+                # 核对原值，排除64位哈希冲突
+                if fields[0] == indicator_type and fields[1] == value:
+                    matches.append({name: field for name, field in zip(DETAIL_FIELDS, fields) if field})
+            low += 1
+        return matches
+
+    def lookup(self, indicator_type: str, values: Iterable) -> Dict[str, List[Dict]]:
+        """
+        批量查询
+
+        Args:
+            indicator_type: ip/port/process/hash/domain
+            values: 要查询的值
+
+        Returns:
+            {命中的原始值: [情报条目]}，未命中的值不出现在结果中
+        """
+        if indicator_type not in INDICATOR_TYPES:
+            raise ValueError(f"不支持的指标类型: {indicator_type}")
+        with self._lock:
+            if not self._open():
+                return {}
+            hits = {}
+            for value in set(values):
+                normalized = normalize_indicator(indicator_type, value) if value is not None else None
+                if normalized is None:
+                    continue
+                matches = self._find(indicator_type, normalized)
+                if matches:
+                    hits[value] = matches
+            return hits
+
+    def stats(self) -> Dict:
+        with self._lock:
+            loaded = self._open()
+            return {
+                "feeds": [os.path.basename(path) for path in self.feed_files()],
+                "indicators": self._count if loaded else 0,
+                "bloom_bits": self._bloom_bits if loaded else 0,
+                "index_file": self.index_file,
+            }
+
+
+# 全局实例
+threat_intel = ThreatIntelIndex()
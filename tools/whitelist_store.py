@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+白名单索引服务
+白名单文件只加载一次并按类型建立哈希索引，文件的修改时间或大小变化时才重新加载
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from config.constants import WHITELIST_FILE
+
+logger = logging.getLogger(__name__)
+
+# 项目类型 -> (白名单中的列表字段, 项目标识字段)
+WHITELIST_SECTIONS = {
+    "process": ("processes", "name"),
+    "ip": ("ips", "address"),
+    "service": ("services", "name"),
+}
+
+
+class WhitelistStore:
+    """
+    白名单索引服务
+    - 按类型（process/ip/service）把白名单项目加载到字典中，查找为O(1)
+    - 通过文件的 mtime/size 判断是否需要重新加载
+    - 所有读写都经过同一把锁，可在多个Agent线程中共享
+    """
+
+    def __init__(self, whitelist_file: str = WHITELIST_FILE):
+        """
+        初始化白名单索引服务
+
+        Args:
+            whitelist_file: 白名单文件路径
+        """
+        self.whitelist_file = whitelist_file
+        self._lock = threading.RLock()
+        self._signature = None
+        self._whitelist = self._empty_whitelist()
+        self._index = {item_type: {} for item_type in WHITELIST_SECTIONS}
+
+    @staticmethod
+    def _empty_whitelist() -> Dict:
+        return {section: [] for section, _ in WHITELIST_SECTIONS.values()}
+
+    @staticmethod
+    def _section_for(item_type: str) -> Tuple[str, str]:
+        if item_type not in WHITELIST_SECTIONS:
+            raise ValueError(f"未知的项目类型: {item_type}")
+        return WHITELIST_SECTIONS[item_type]
+
+    def exists(self) -> bool:
+        """白名单文件是否存在"""
+        return os.path.exists(self.whitelist_file)
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.whitelist_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _ensure_loaded(self):
+        """文件发生变化时重新加载并重建索引"""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+
+        whitelist = self._empty_whitelist()
+        if signature is not None:
+            with open(self.whitelist_file, "r", encoding="utf-8") as f:
+                whitelist.update(json.load(f))
+
+        self._rebuild_index(whitelist)
+        self._signature = signature
+
+    def _rebuild_index(self, whitelist: Dict):
+        index = {}
+        for item_type, (section, item_key) in WHITELIST_SECTIONS.items():
+            items = whitelist.setdefault(section, [])
+            index[item_type] = {item.get(item_key): item for item in items if isinstance(item, dict)}
+        self._whitelist = whitelist
+        self._index = index
+
+    def _write(self, whitelist: Dict):
+        """原子写入白名单文件并更新签名"""
+        directory = os.path.dirname(self.whitelist_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_file = f"{self.whitelist_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(whitelist, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.whitelist_file)
+        self._rebuild_index(whitelist)
+        self._signature = self._file_signature()
+
+    def read(self, create: bool = True) -> Dict:
+        """
+        读取完整白名单
+
+        Args:
+            create: 文件不存在时是否创建空白名单文件
+        """
+        with self._lock:
+            if create and not self.exists():
+                self._write(self._empty_whitelist())
+            self._ensure_loaded()
+            return json.loads(json.dumps(self._whitelist))
+
+    def check(self, item_type: str, item_name: str) -> Optional[Dict]:
+        """
+        检查单个项目是否在白名单中
+
+        Returns:
+            白名单中的项目记录，不存在时返回None
+        """
+        self._section_for(item_type)
+        with self._lock:
+            self._ensure_loaded()
+            return self._index[item_type].get(item_name)
+
+    def check_many(self, item_type: str, item_names: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """
+        批量检查项目是否在白名单中
+
+        Returns:
+            {项目名称: 白名单记录或None}
+        """
+        self._section_for(item_type)
+        with self._lock:
+            self._ensure_loaded()
+            index = self._index[item_type]
+            return {name: index.get(name) for name in item_names}
+
+    def whitelisted_names(self, item_type: str) -> frozenset:
+        """返回某类型全部白名单项目名称的集合"""
+        self._section_for(item_type)
+        with self._lock:
+            self._ensure_loaded()
+            return frozenset(self._index[item_type])
+
+    def add(self, item_type: str, item_name: str, reason: str,
+            response_time: str = None) -> Tuple[str, Dict]:
+        """
+        添加项目到白名单
+
+        Returns:
+            (状态, 项目记录)，状态为 "success" 或 "exists"
+        """
+        section, item_key = self._section_for(item_type)
+        with self._lock:
+            self._ensure_loaded()
+            existing = self._index[item_type].get(item_name)
+            if existing is not None:
+                return "exists", existing
+
+            current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+            if response_time is None:
+                response_time = current_time
+
+            new_item = {
+                item_key: item_name,
+                "reason": reason,
+                "response_time": response_time,  # 响应时间
+                "record_time": current_time      # 记录时间
+            }
+            whitelist = json.loads(json.dumps(self._whitelist))
+            whitelist[section].append(new_item)
+            self._write(whitelist)
+            return "success", new_item
+
+
+# 全局实例
+whitelist_store = WhitelistStore()
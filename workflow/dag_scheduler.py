@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+工作流依赖图调度器 - 根据模块的 dependencies/outputs 构建DAG并并发执行
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Callable, Any, Optional
+
+logger = logging.getLogger("workflow_dag")
+
+
+class WorkflowGraphError(Exception):
+    """工作流依赖图配置错误（重复输出、循环依赖等）"""
+
+
+class ModuleNode:
+    """依赖图中的一个模块节点"""
+
+    def __init__(self, key: str, index: int, module: Dict):
+        self.key = key
+        self.index = index
+        self.module = module
+        self.name = module.get("name", key)
+        self.dependencies = list(module.get("dependencies", []))
+        self.outputs = list(module.get("outputs", []))
+        # 上游/下游节点的key
+        self.upstream = set()
+        self.downstream = set()
+
+    def __repr__(self):
+        return f"ModuleNode({self.key!r}, {self.name!r})"
+
+
+def build_module_graph(modules: List[Dict]) -> Dict[str, ModuleNode]:
+    """
+    根据模块配置构建依赖图
+
+    参数:
+        modules: 工作流模块列表，每个模块可声明 dependencies 和 outputs
+
+    返回:
+        以 module_{i} 为key的节点字典（保持配置顺序）
+
+    如果所有模块都没有声明 dependencies 字段（旧格式），则按配置顺序串联，
+    保持与原来线性执行一致的行为。
+    """
+    nodes = {}
+    for i, module in enumerate(modules):
+        key = f"module_{i}"
+        nodes[key] = ModuleNode(key, i, module)
+
+    declared = any("dependencies" in module for module in modules)
+    if not declared:
+        keys = list(nodes.keys())
+        for prev_key, key in zip(keys, keys[1:]):
+            nodes[key].upstream.add(prev_key)
+            nodes[prev_key].downstream.add(key)
+        return nodes
+
+    # 输出名 -> 产出该输出的模块
+    producers = {}
+    for node in nodes.values():
+        for output in node.outputs:
+            if output in producers:
+                raise WorkflowGraphError(
+                    f"输出 {output} 同时由 {nodes[producers[output]].name} 和 {node.name} 产生"
+                )
+            producers[output] = node.key
+
+    for node in nodes.values():
+        for dependency in node.dependencies:
+            producer = producers.get(dependency)
+            if producer is None:
+                raise WorkflowGraphError(f"模块 {node.name} 依赖的输出 {dependency} 没有模块产生")
+            if producer == node.key:
+                raise WorkflowGraphError(f"模块 {node.name} 依赖了自身的输出 {dependency}")
+            node.upstream.add(producer)
+            nodes[producer].downstream.add(node.key)
+
+    _check_acyclic(nodes)
+    return nodes
+
+
+def _check_acyclic(nodes: Dict[str, ModuleNode]):
+    """使用Kahn算法检测循环依赖"""
+    in_degree = {key: len(node.upstream) for key, node in nodes.items()}
+    ready = [key for key, degree in in_degree.items() if degree == 0]
+    visited = 0
+    while ready:
+        key = ready.pop()
+        visited += 1
+        for child in nodes[key].downstream:
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                ready.append(child)
+
+    if visited != len(nodes):
+        cyclic = [nodes[key].name for key, degree in in_degree.items() if degree > 0]
+        raise WorkflowGraphError(f"工作流存在循环依赖: {', '.join(cyclic)}")
+
+
+class DagScheduler:
+    """
+    依赖图调度器
+
+    - 所有依赖已满足的模块同时提交到有界线程池执行
+    - 每个模块只接收它声明依赖的命名输出；没有声明依赖的旧格式工作流接收上游模块的结果（以模块名为key）
+    - 模块失败时跳过其所有下游模块，互不依赖的分支继续执行
+    """
+
+    def __init__(self, nodes: Dict[str, ModuleNode], max_workers: int = 4):
+        self.nodes = nodes
+        self.max_workers = max(1, int(max_workers))
+        self._lock = threading.Lock()
+
+    def run(self,
+            execute_fn: Callable[[ModuleNode, Dict[str, Any]], Optional[Dict]],
+            on_skip: Optional[Callable[[ModuleNode, str], None]] = None) -> Dict[str, Dict]:
+        """
+        执行整个依赖图
+
+        参数:
+            execute_fn: 执行单个模块的函数，参数为 (节点, {输出名或上游模块名: 上游结果})，
+                        返回包含 status 字段的结果字典，返回None表示模块被跳过
+            on_skip: 模块因上游失败被跳过时的回调，参数为 (节点, 原因)
+
+        返回:
+            {module_key: 结果字典}，被跳过的模块不在其中
+        """
+        results = {}
+        outputs = {}
+        remaining = {key: len(node.upstream) for key, node in self.nodes.items()}
+        blocked = set()
+
+        # 按配置顺序提交，保证同一批次内的执行顺序稳定
+        ready = [key for key in self.nodes if remaining[key] == 0]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix="workflow-module") as executor:
+            running = {}
+
+            def submit_ready():
+                while ready:
+                    key = ready.pop(0)
+                    node = self.nodes[key]
+                    if node.dependencies:
+                        inputs = {dep: outputs[dep] for dep in node.dependencies if dep in outputs}
+                    else:
+                        # 旧格式工作流按顺序串联，把上游模块的结果传给下一个模块
+                        inputs = {self.nodes[up].name: results[up]
+                                  for up in sorted(node.upstream, key=lambda k: self.nodes[k].index)
+                                  if up in results}
+                    future = executor.submit(execute_fn, node, inputs)
+                    running[future] = key
+
+            submit_ready()
+            while running:
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    node = self.nodes[key]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"执行模块 {node.name} 时出错: {str(e)}")
+                        result = {"status": "error", "result": None, "error": str(e)}
+
+                    if result is None:
+                        # 模块被跳过（例如未找到Agent），视为失败处理下游
+                        self._block_downstream(key, blocked, f"上游模块 {node.name} 未执行", on_skip)
+                        continue
+
+                    results[key] = result
+                    if result.get("status") != "completed":
+                        self._block_downstream(key, blocked, f"上游模块 {node.name} 执行失败", on_skip)
+                        continue
+
+                    with self._lock:
+                        for output in node.outputs:
+                            outputs[output] = result
+
+                    for child in sorted(node.downstream, key=lambda k: self.nodes[k].index):
+                        remaining[child] -= 1
+                        if remaining[child] == 0 and child not in blocked:
+                            ready.append(child)
+
+                submit_ready()
+
+        return results
+
+    def _block_downstream(self, key: str, blocked: set, reason: str,
+                          on_skip: Optional[Callable[[ModuleNode, str], None]]):
+        """将失败模块的所有下游模块标记为跳过"""
+        stack = list(self.nodes[key].downstream)
+        while stack:
+            child = stack.pop()
+            if child in blocked:
+                continue
+            blocked.add(child)
+            if on_skip:
+                on_skip(self.nodes[child], reason)
+            stack.extend(self.nodes[child].downstream)
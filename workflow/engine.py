@@ -9,13 +9,15 @@ import os
 import json
 import time
 import logging
+import threading
 import traceback
 from typing import Dict, List, Callable, Any, Optional
 
 # 导入必要的模块
 from models import setup_llm
 from agents import create_agents
-from config.constants import DECISION_TIMEOUT, ERROR_RETRY_INTERVAL
+from config.constants import DECISION_TIMEOUT, ERROR_RETRY_INTERVAL, WORKFLOW_MAX_WORKERS
+from workflow.dag_scheduler import DagScheduler, WorkflowGraphError, build_module_graph
 
 # 设置日志
 logger = logging.getLogger("workflow_engine")
@@ -41,6 +43,9 @@ class WorkflowEngine:
         self.role_callback = None
         self.decision_callback = None
         self.completion_callback = None
+        
+        # 并发执行的模块共用一个决策入口，审批需要逐个进行
+        self._decision_lock = threading.Lock()
     
     def _load_json_config(self, filename: str) -> Dict:
         """加载JSON配置文件"""
@@ -88,106 +93,36 @@ class WorkflowEngine:
         if not secretary_agent and self.log_callback:
             self.log_callback("警告: 未找到秘书Agent，某些功能可能受限")
         
-        # 执行工作流程中的每个模块
-        results = {}
-        previous_results = {}
-        
         # 检查workflow是列表还是字典
         if isinstance(workflow, list):
             # 如果是列表（当前格式），直接遍历
             modules_to_execute = workflow
+            max_workers = WORKFLOW_MAX_WORKERS
         else:
             # 如果是字典（旧格式），使用modules字段
             modules_to_execute = workflow.get("modules", [])
+            max_workers = workflow.get("max_workers", WORKFLOW_MAX_WORKERS)
         
-        for i, module in enumerate(modules_to_execute):
-            module_name = f"module_{i}"
-            
-            # 更新角色
-            if self.role_callback:
-                self.role_callback(module.get("name", module_name))
-            
+        # 根据模块的 dependencies/outputs 构建依赖图
+        try:
+            nodes = build_module_graph(modules_to_execute)
+        except WorkflowGraphError as e:
+            error_msg = f"工作流程 {workflow_name} 配置错误: {str(e)}"
+            logger.error(error_msg)
             if self.log_callback:
-                self.log_callback(f"正在执行模块: {module.get('name', module_name)}...")
-            
-            # 准备模块输入数据
-            input_data = None
-            if i > 0:  # 如果不是第一个模块，使用前一个模块的结果
-                input_data = self._prepare_input_data([f"module_{i-1}"], previous_results)
-            
-            # 执行模块
-            try:
-                from main import execute_agent_with_approval
-                
-                agent_key = module.get("agent")
-                if not agent_key or agent_key not in agents:
-                    if self.log_callback:
-                        self.log_callback(f"警告: 未找到Agent {agent_key}，跳过模块 {module.get('name', module_name)}")
-                    continue
-                
-                # 修改：移除timeout参数，或者检查函数定义是否接受该参数
-                try:
-                    # 尝试获取函数签名
-                    import inspect
-                    sig = inspect.signature(execute_agent_with_approval)
-                    
-                    # 检查是否有timeout参数
-                    if 'timeout' in sig.parameters:
-                        # 如果有timeout参数，正常传递
-                        result = execute_agent_with_approval(
-                            agents[agent_key],
-                            module.get("description", ""),
-                            self.llm_for_direct,
-                            secretary_agent,
-                            raw_data=input_data,
-                            get_decision_func=self._create_decision_adapter(module.get("name", module_name)),
-                            timeout=module.get("timeout", DECISION_TIMEOUT)
-                        )
-                    else:
-                        # 如果没有timeout参数，不传递
-                        result = execute_agent_with_approval(
-                            agents[agent_key],
-                            module.get("description", ""),
-                            self.llm_for_direct,
-                            secretary_agent,
-                            raw_data=input_data,
-                            get_decision_func=self._create_decision_adapter(module.get("name", module_name))
-                        )
-                except Exception as e:
-                    # 如果检查失败，尝试不带timeout参数调用
-                    logger.warning(f"检查函数签名失败，尝试不带timeout参数调用: {str(e)}")
-                    result = execute_agent_with_approval(
-                        agents[agent_key],
-                        module.get("description", ""),
-                        self.llm_for_direct,
-                        secretary_agent,
-                        raw_data=input_data,
-                        get_decision_func=self._create_decision_adapter(module.get("name", module_name))
-                    )
-                
-                # 保存结果
-                results[module_name] = result
-                
-                # 如果模块执行失败，根据工作流配置决定是否继续
-                if result["status"] != "completed":
-                    if self.log_callback:
-                        self.log_callback(f"模块 {module.get('name', module_name)} 执行失败，中断工作流程")
-                    break
-                
-                # 更新previous_results，用于后续模块
-                if result["status"] == "completed":
-                    previous_results[module_name] = result
-            
-            except Exception as e:
-                error_msg = f"执行模块 {module.get('name', module_name)} 时出错: {str(e)}"
-                logger.error(error_msg)
-                logger.error(traceback.format_exc())
-                
-                if self.log_callback:
-                    self.log_callback(f"错误: {error_msg}")
-                
-                # 中断工作流程
-                break
+                self.log_callback(f"错误: {error_msg}")
+            return {"status": "error", "message": error_msg}
+        
+        def on_skip(node, reason):
+            if self.log_callback:
+                self.log_callback(f"跳过模块 {node.name}: {reason}")
+        
+        # 依赖已满足的模块并发执行，每个模块只接收其依赖的输出
+        scheduler = DagScheduler(nodes, max_workers=max_workers)
+        results = scheduler.run(
+            lambda node, inputs: self._execute_module(node, inputs, agents, secretary_agent),
+            on_skip=on_skip
+        )
         
         # 工作流程完成
         if self.completion_callback:
@@ -216,22 +151,125 @@ class WorkflowEngine:
         
         return {"status": "completed", "results": results}
     
-    def _prepare_input_data(self, required_modules: List[str], previous_results: Dict) -> str:
-        """准备模块输入数据"""
+    def _execute_module(self, node, inputs: Dict, agents: Dict, secretary_agent) -> Optional[Dict]:
+        """执行单个模块，返回结果字典；未找到Agent时返回None"""
+        module = node.module
+        module_label = node.name
+        
+        # 更新角色
+        if self.role_callback:
+            self.role_callback(module_label)
+        
+        if self.log_callback:
+            self.log_callback(f"正在执行模块: {module_label}...")
+        
+        # 准备模块输入数据（只包含该模块依赖的输出，旧格式工作流为上一个模块的结果）
+        input_data = self._prepare_input_data(node.dependencies or list(inputs), inputs)
+        
+        try:
+            from main import execute_agent_with_approval, triage_department, record_department_analysis
+            
+            agent_key = module.get("agent")
+            if not agent_key or agent_key not in agents:
+                if self.log_callback:
+                    self.log_callback(f"警告: 未找到Agent {agent_key}，跳过模块 {module_label}")
+                return None
+            
+            # 部门分析模块与 run_department_pipeline 一样先做预分诊，数据未变化时沿用上一次的分析结果
+            triage_key = self._triage_key(node)
+            digest = None
+            if triage_key is not None:
+                digest, cached = triage_department(triage_key, input_data)
+                if cached is not None:
+                    if self.log_callback:
+                        self.log_callback(f"模块 {module_label} 的输入数据与上一次分析时相同，沿用上一次的分析结果")
+                    return cached
+            
+            # 修改：移除timeout参数，或者检查函数定义是否接受该参数
+            try:
+                # 尝试获取函数签名
+                import inspect
+                sig = inspect.signature(execute_agent_with_approval)
+                
+                # 检查是否有timeout参数
+                if 'timeout' in sig.parameters:
+                    # 如果有timeout参数，正常传递
+                    result = execute_agent_with_approval(
+                        agents[agent_key],
+                        module.get("description", ""),
+                        self.llm_for_direct,
+                        secretary_agent,
+                        raw_data=input_data,
+                        get_decision_func=self._create_decision_adapter(module_label),
+                        timeout=module.get("timeout", DECISION_TIMEOUT)
+                    )
+                else:
+                    # 如果没有timeout参数，不传递
+                    result = execute_agent_with_approval(
+                        agents[agent_key],
+                        module.get("description", ""),
+                        self.llm_for_direct,
+                        secretary_agent,
+                        raw_data=input_data,
+                        get_decision_func=self._create_decision_adapter(module_label)
+                    )
+            except Exception as e:
+                # 如果检查失败，尝试不带timeout参数调用
+                logger.warning(f"检查函数签名失败，尝试不带timeout参数调用: {str(e)}")
+                result = execute_agent_with_approval(
+                    agents[agent_key],
+                    module.get("description", ""),
+                    self.llm_for_direct,
+                    secretary_agent,
+                    raw_data=input_data,
+                    get_decision_func=self._create_decision_adapter(module_label)
+                )
+            
+            if triage_key is not None:
+                record_department_analysis(triage_key, digest, result)
+            
+            # 如果模块执行失败，其下游模块将被跳过
+            if result["status"] != "completed" and self.log_callback:
+                self.log_callback(f"模块 {module_label} 执行失败，跳过依赖它的模块")
+            
+            return result
+        
+        except Exception as e:
+            error_msg = f"执行模块 {module_label} 时出错: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            
+            if self.log_callback:
+                self.log_callback(f"错误: {error_msg}")
+            
+            return {"status": "error", "result": None, "error": str(e)}
+    
+    @staticmethod
+    def _triage_key(node) -> Optional[str]:
+        """部门分析模块（依赖数据收集输出的进程/日志/服务/网络部门模块）的部门key，其他模块返回None"""
+        from main import DEPARTMENT_PIPELINES
+        
+        department = str(node.module.get("department") or "")
+        key = department[:-len("_department")] if department.endswith("_department") else department
+        if not node.dependencies or key not in {pipeline["key"] for pipeline in DEPARTMENT_PIPELINES}:
+            return None
+        return key
+    
+    def _prepare_input_data(self, dependencies: List[str], inputs: Dict) -> Optional[str]:
+        """准备模块输入数据，按依赖声明（旧格式工作流为上游模块）的顺序拼接上游模块的结果"""
         input_data = ""
-        for module_name in required_modules:
-            if module_name in previous_results:
-                result = previous_results[module_name]
-                if "result" in result:
-                    input_data += f"\n\n--- {self.modules[module_name]['name']} 结果 ---\n"
-                    input_data += result["result"]
+        for output_name in dependencies:
+            result = inputs.get(output_name)
+            if result and result.get("result"):
+                input_data += f"\n\n--- {output_name} 结果 ---\n"
+                input_data += str(result["result"])
         
         return input_data if input_data else None
     
     def _create_decision_adapter(self, module_name: str) -> Callable:
         """创建决策适配器函数"""
-        def decision_adapter(report, stage, agent_name):
-            """决策适配器函数"""
+        def request_decision(report, stage, agent_name):
+            """向用户请求决策"""
             if self.log_callback:
                 self.log_callback(f"请求决策: {module_name} - {stage}")
             
@@ -260,6 +298,11 @@ class WorkflowEngine:
                 from main import get_user_decision
                 return get_user_decision(report, stage, agent_name)
         
+        def decision_adapter(report, stage, agent_name):
+            """决策适配器函数，并发执行的模块逐个获取审批"""
+            with self._decision_lock:
+                return request_decision(report, stage, agent_name)
+        
         return decision_adapter
 
     def _load_workflows(self):